@@ -0,0 +1,145 @@
+import os
+import sqlite3
+
+
+ARCHIVE_FILENAME = 'kodongo_archive.db'
+
+# Schema name the archive is attached under
+ARCHIVE_SCHEMA = 'archive'
+
+# Stored (non-generated) columns copied from the live tables
+LOAN_COLUMNS = (
+    'loan_id', 'customer_name', 'amount', 'payment_per_day', 'term_months',
+    'start_date', 'end_date', 'total_to_repay', 'status', 'created_by',
+    'remaining_balance', 'physical_address', 'national_id', 'phone_number',
+    'created_at', 'last_updated', 'customer_id',
+)
+PAYMENT_COLUMNS = ('payment_id', 'loan_id', 'date', 'amount', 'received_by', 'notes')
+
+
+def archive_path_for(db_path):
+    """The archive database lives next to the main database"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), ARCHIVE_FILENAME)
+
+
+def create_archive_tables(cursor):
+    """Create the archive tables (money in integer cents, as in the live tables)"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.loans (
+            loan_id INTEGER PRIMARY KEY,
+            customer_name TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            payment_per_day INTEGER NOT NULL,
+            term_months INTEGER NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            total_to_repay INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            created_by TEXT NOT NULL,
+            remaining_balance INTEGER NOT NULL,
+            physical_address TEXT,
+            national_id TEXT,
+            phone_number TEXT,
+            created_at TEXT,
+            last_updated TEXT,
+            customer_id INTEGER,
+            archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.payments (
+            payment_id INTEGER PRIMARY KEY,
+            loan_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            received_by TEXT NOT NULL,
+            notes TEXT
+        )
+    """)
+
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_loans_customer ON loans (customer_id)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_payments_loan_date ON payments (loan_id, date)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_payments_date ON payments (date)")
+
+
+def create_union_views(cursor):
+    """
+    Create TEMP views spanning live and archived rows.
+
+    all_loans and all_payments add an `archived` flag (0 live, 1 archived).
+    They have to be TEMP because views in the main schema cannot refer to an
+    attached database. They are created on first use rather than on attach,
+    because schema migrations that rebuild the live tables fail while a view
+    refers to them.
+    """
+    loan_columns = ', '.join(LOAN_COLUMNS)
+    payment_columns = ', '.join(PAYMENT_COLUMNS)
+
+    cursor.execute(f"""
+        CREATE TEMP VIEW IF NOT EXISTS all_loans AS
+        SELECT {loan_columns}, 0 AS archived FROM main.loans
+        UNION ALL
+        SELECT {loan_columns}, 1 AS archived FROM {ARCHIVE_SCHEMA}.loans
+    """)
+    cursor.execute(f"""
+        CREATE TEMP VIEW IF NOT EXISTS all_payments AS
+        SELECT {payment_columns}, 0 AS archived FROM main.payments
+        UNION ALL
+        SELECT {payment_columns}, 1 AS archived FROM {ARCHIVE_SCHEMA}.payments
+    """)
+
+
+def is_attached(conn):
+    """Check whether the archive is attached to a connection"""
+    rows = conn.execute("PRAGMA database_list").fetchall()
+    return any(row[1] == ARCHIVE_SCHEMA for row in rows)
+
+
+def attach_archive(conn, archive_path):
+    """
+    Attach the archive database to a connection and create its tables.
+
+    The archive uses the same journal mode as the main database.
+    """
+    if not is_attached(conn):
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path,))
+
+    journal_mode = conn.execute("PRAGMA main.journal_mode").fetchone()[0]
+    conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode = {journal_mode}")
+
+    create_archive_tables(conn.cursor())
+    conn.commit()
+
+
+def archive_loans(cursor, loan_ids):
+    """
+    Move loans and their payments into the archive.
+
+    Runs inside the caller's transaction. Rows are copied with INSERT OR
+    REPLACE, so repeating a batch after a partial failure is harmless.
+    """
+    if not loan_ids:
+        return
+    placeholders = ', '.join('?' * len(loan_ids))
+    loan_columns = ', '.join(LOAN_COLUMNS)
+    payment_columns = ', '.join(PAYMENT_COLUMNS)
+
+    cursor.execute(f"""
+        INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.loans ({loan_columns})
+        SELECT {loan_columns} FROM main.loans WHERE loan_id IN ({placeholders})
+    """, loan_ids)
+    cursor.execute(f"""
+        INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.payments ({payment_columns})
+        SELECT {payment_columns} FROM main.payments WHERE loan_id IN ({placeholders})
+    """, loan_ids)
+
+    # Payments first, while the loans they belong to still exist
+    cursor.execute(f"DELETE FROM main.payments WHERE loan_id IN ({placeholders})", loan_ids)
+    cursor.execute(f"DELETE FROM main.loans WHERE loan_id IN ({placeholders})", loan_ids)
+
+
+def require_archive(cursor):
+    """Raise if the archive is not attached, so nothing is deleted without a copy"""
+    if not is_attached(cursor.connection):
+        raise sqlite3.OperationalError("Archive database is not attached")
@@ -0,0 +1,175 @@
+# Tables kept in step between the network database and a local replica, in
+# the order parents must be applied (deletes are applied in reverse).
+SYNC_TABLES = {
+    'customers': 'customer_id',
+    'loans': 'loan_id',
+    'payments': 'payment_id',
+}
+
+# Customers' loan_cycles is kept by triggers on each side, so changing only it is not a change to sync
+TRACKED_UPDATE_COLUMNS = {
+    'customers': ('customer_id', 'customer_name', 'phone_number', 'national_id',
+                  'physical_address', 'phone_key', 'national_id_key'),
+}
+
+
+def create_sync_tables(cursor):
+    """
+    Create the change log, site identity, peer watermarks and conflict record.
+
+    Every database gets its own random site_id. change_log rows carry the
+    site the change came from (sync_state.origin, which a sync switches
+    while applying a peer's changes), so changes are never sent back to
+    where they came from.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            site_id TEXT NOT NULL,
+            origin TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO sync_state (id, site_id, origin)
+        SELECT 1, site, site FROM (SELECT lower(hex(randomblob(16))) AS site)
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            base_balance INTEGER,
+            origin TEXT NOT NULL,
+            changed_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_row ON change_log (table_name, row_id)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_peers (
+            peer_site_id TEXT PRIMARY KEY,
+            last_pushed INTEGER NOT NULL DEFAULT 0,
+            last_pulled INTEGER NOT NULL DEFAULT 0,
+            last_sync_at TEXT,
+            stats TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_conflicts (
+            conflict_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            kept TEXT,
+            discarded TEXT,
+            peer_site_id TEXT,
+            detected_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def create_sync_triggers(cursor):
+    """Log every insert, update and delete on the synced tables"""
+    origin = "(SELECT origin FROM sync_state WHERE id = 1)"
+
+    for table, key in SYNC_TABLES.items():
+        # The balance before the first offline change lets conflicting payments be merged
+        base_balance = "old.remaining_balance" if table == 'loans' else "NULL"
+        tracked = TRACKED_UPDATE_COLUMNS.get(table)
+        of_columns = f"OF {', '.join(tracked)} " if tracked else ""
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_sync_{table}_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, op, origin)
+                VALUES ('{table}', new.{key}, 'I', {origin});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_sync_{table}_update
+            AFTER UPDATE {of_columns}ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, op, origin)
+                SELECT '{table}', old.{key}, 'D', {origin} WHERE new.{key} IS NOT old.{key};
+                INSERT INTO change_log (table_name, row_id, op, base_balance, origin)
+                VALUES ('{table}', new.{key},
+                        CASE WHEN new.{key} IS NOT old.{key} THEN 'I' ELSE 'U' END,
+                        {base_balance}, {origin});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_sync_{table}_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, op, origin)
+                VALUES ('{table}', old.{key}, 'D', {origin});
+            END
+        """)
+
+
+def stored_columns(cursor, table):
+    """Stored columns of a table (generated columns are left out)"""
+    cursor.execute(f"PRAGMA table_xinfo({table})")
+    return [row[1] for row in cursor.fetchall() if row[6] == 0]
+
+
+def site_id(cursor):
+    """This database's sync identity"""
+    cursor.execute("SELECT site_id FROM sync_state WHERE id = 1")
+    return cursor.fetchone()[0]
+
+
+def set_origin(cursor, origin):
+    """Set the site that changes made from now on are logged as coming from"""
+    cursor.execute("UPDATE sync_state SET origin = ? WHERE id = 1", (origin,))
+
+
+def pending_changes(cursor, after_change_id, origin=None, exclude_origin=None):
+    """
+    Collapse the change log after a watermark to one net change per row.
+
+    Args:
+        after_change_id (int): Only changes with a larger change_id
+        origin (str): Only changes made at this site
+        exclude_origin (str): Leave out changes that came from this site
+
+    Returns:
+        tuple: ({(table, row_id): change}, last change_id read). Each change
+               has op ('insert', 'update' or 'delete'), base_balance and changed_at.
+    """
+    sql = "SELECT change_id, table_name, row_id, op, base_balance, changed_at FROM change_log WHERE change_id > ?"
+    params = [after_change_id]
+    if origin is not None:
+        sql += " AND origin = ?"
+        params.append(origin)
+    if exclude_origin is not None:
+        sql += " AND origin != ?"
+        params.append(exclude_origin)
+    cursor.execute(sql + " ORDER BY change_id", params)
+
+    changes, last_change_id = {}, after_change_id
+    for change_id, table, row_id, op, base_balance, changed_at in cursor.fetchall():
+        last_change_id = change_id
+        change = changes.setdefault((table, row_id), {
+            'first_op': op, 'last_op': op, 'base_balance': base_balance, 'changed_at': changed_at
+        })
+        change['last_op'] = op
+        change['changed_at'] = changed_at
+        if change['base_balance'] is None:
+            change['base_balance'] = base_balance
+
+    net = {}
+    for row_key, change in changes.items():
+        if change['last_op'] == 'D':
+            if change['first_op'] == 'I':
+                continue  # Created and removed since the last sync - nothing to send
+            op = 'delete'
+        else:
+            op = 'insert' if change['first_op'] == 'I' else 'update'
+        net[row_key] = {'op': op, 'base_balance': change['base_balance'], 'changed_at': change['changed_at']}
+
+    return net, last_change_id
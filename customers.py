@@ -0,0 +1,204 @@
+import re
+import sqlite3
+
+
+def normalize_phone(phone_number):
+    """
+    Reduce a phone number to a comparable key.
+
+    Keeps digits only and drops the 254 country code and leading zeros, so
+    "0712 345 678" and "+254712345678" both become "712345678".
+
+    Returns:
+        str: The key, or None if the number has no digits
+    """
+    digits = re.sub(r"\D", "", str(phone_number or ""))
+    if digits.startswith("254") and len(digits) == 12:
+        digits = digits[3:]
+    digits = digits.lstrip("0")
+    return digits or None
+
+
+def normalize_national_id(national_id):
+    """Reduce a national ID to upper-case letters and digits, or None if empty"""
+    key = re.sub(r"[^0-9A-Za-z]", "", str(national_id or "")).upper()
+    return key or None
+
+
+def create_customers_table(cursor):
+    """
+    Create the customers table and its identity indexes.
+
+    phone_key and national_id_key hold the normalized identifiers. Their
+    partial unique indexes make resolving a customer a single index probe
+    and stop the same person being stored twice.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customers (
+            customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name TEXT NOT NULL,
+            phone_number TEXT,
+            national_id TEXT,
+            physical_address TEXT,
+            phone_key TEXT,
+            national_id_key TEXT,
+            loan_cycles INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_customers_phone_key
+        ON customers (phone_key) WHERE phone_key IS NOT NULL
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_customers_national_id_key
+        ON customers (national_id_key) WHERE national_id_key IS NOT NULL
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_name ON customers (customer_name COLLATE NOCASE)")
+
+
+def create_customer_triggers(cursor):
+    """
+    Keep each customer's loan cycle count current.
+
+    A cycle is counted when a loan is issued and is not given back when the
+    loan is later cleaned up, so the count survives paid-loan deletion.
+    """
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_customers_loan_insert
+        AFTER INSERT ON loans
+        WHEN new.customer_id IS NOT NULL
+        BEGIN
+            UPDATE customers SET loan_cycles = loan_cycles + 1
+            WHERE customer_id = new.customer_id;
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_customers_loan_reassign
+        AFTER UPDATE OF customer_id ON loans
+        WHEN new.customer_id IS NOT old.customer_id
+        BEGIN
+            UPDATE customers SET loan_cycles = loan_cycles - 1
+            WHERE customer_id = old.customer_id;
+            UPDATE customers SET loan_cycles = loan_cycles + 1
+            WHERE customer_id = new.customer_id;
+        END
+    """)
+
+
+def find_customer(cursor, customer_name, national_id="", phone_number=""):
+    """
+    Look up a customer by phone number or national ID in one query.
+
+    A phone match wins over a national ID match. The name is only used when
+    neither identifier is given, and then only matches customers that have
+    no identifiers either.
+
+    Returns:
+        tuple: (customer_id, loan_cycles), or None if not found
+    """
+    phone_key = normalize_phone(phone_number)
+    national_id_key = normalize_national_id(national_id)
+
+    if phone_key or national_id_key:
+        cursor.execute("""
+            SELECT customer_id, loan_cycles FROM customers
+            WHERE phone_key = ? OR national_id_key = ?
+            ORDER BY phone_key IS ? DESC
+            LIMIT 1
+        """, (phone_key, national_id_key, phone_key))
+    else:
+        cursor.execute("""
+            SELECT customer_id, loan_cycles FROM customers
+            WHERE customer_name = ? COLLATE NOCASE
+              AND phone_key IS NULL AND national_id_key IS NULL
+            LIMIT 1
+        """, ((customer_name or "").strip(),))
+
+    return cursor.fetchone()
+
+
+def resolve_or_create_customer(cursor, customer_name, national_id="", phone_number="", physical_address=""):
+    """
+    Find the customer matching these details, creating one if needed.
+
+    An existing customer gets the latest name and address, plus any
+    identifier they were missing (unless it already belongs to someone else).
+
+    Returns:
+        int: customer_id
+    """
+    customer_name = (customer_name or "").strip()
+    phone_key = normalize_phone(phone_number)
+    national_id_key = normalize_national_id(national_id)
+
+    found = find_customer(cursor, customer_name, national_id, phone_number)
+    if found is None:
+        cursor.execute("""
+            INSERT INTO customers (
+                customer_name, phone_number, national_id, physical_address,
+                phone_key, national_id_key
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, (customer_name, phone_number or None, national_id or None,
+              physical_address or None, phone_key, national_id_key))
+        return cursor.lastrowid
+
+    customer_id = found[0]
+    cursor.execute("""
+        UPDATE customers
+        SET customer_name = COALESCE(NULLIF(?, ''), customer_name),
+            physical_address = COALESCE(NULLIF(?, ''), physical_address)
+        WHERE customer_id = ?
+    """, (customer_name, physical_address, customer_id))
+
+    for column, raw_column, key, raw in (
+        ('phone_key', 'phone_number', phone_key, phone_number),
+        ('national_id_key', 'national_id', national_id_key, national_id),
+    ):
+        if not key:
+            continue
+        try:
+            cursor.execute(f"""
+                UPDATE customers SET {column} = ?, {raw_column} = ?
+                WHERE customer_id = ? AND {column} IS NULL
+            """, (key, raw, customer_id))
+        except sqlite3.IntegrityError:
+            # Identifier is already on another customer record - leave both as they are
+            pass
+
+    return customer_id
+
+
+def backfill_customers(cursor):
+    """
+    Build customers from legacy loan_cycles records and existing loans.
+
+    Every loan gets a customer_id, and each customer's cycle count becomes
+    the larger of the legacy count and the number of loans on file.
+    """
+    legacy_cycles = {}
+    cursor.execute("SELECT customer_name, national_id, phone_number, loan_cycles FROM loan_cycles ORDER BY id")
+    for customer_name, national_id, phone_number, cycles in cursor.fetchall():
+        customer_id = resolve_or_create_customer(cursor, customer_name, national_id, phone_number)
+        legacy_cycles[customer_id] = max(legacy_cycles.get(customer_id, 0), cycles or 0)
+
+    cursor.execute("""
+        SELECT loan_id, customer_name, national_id, phone_number, physical_address
+        FROM loans ORDER BY loan_id
+    """)
+    assignments = [
+        (resolve_or_create_customer(cursor, name, national_id, phone, address), loan_id)
+        for loan_id, name, national_id, phone, address in cursor.fetchall()
+    ]
+    cursor.executemany("UPDATE loans SET customer_id = ? WHERE loan_id = ?", assignments)
+
+    cursor.execute("""
+        UPDATE customers
+        SET loan_cycles = (SELECT COUNT(*) FROM loans WHERE loans.customer_id = customers.customer_id)
+    """)
+    cursor.executemany(
+        "UPDATE customers SET loan_cycles = MAX(loan_cycles, ?) WHERE customer_id = ?",
+        [(cycles, customer_id) for customer_id, cycles in legacy_cycles.items()]
+    )
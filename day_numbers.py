@@ -0,0 +1,63 @@
+from datetime import date, datetime, timedelta
+
+
+# Day numbers count days since 1970-01-01, so 2026-10-18 is day 20744.
+# Julian day 2440587.5 is midnight at the start of that day.
+_JULIAN_EPOCH = 2440587.5
+_EPOCH = date(1970, 1, 1)
+
+# SQL expression for today's day number in local time
+TODAY_SQL = f"CAST(julianday('now', 'localtime') - {_JULIAN_EPOCH} AS INTEGER)"
+
+
+def day_number_sql(column):
+    """SQL expression turning a YYYY-MM-DD text column into a day number (NULL if unparseable)"""
+    return f"CAST(julianday({column}) - {_JULIAN_EPOCH} AS INTEGER)"
+
+
+def to_day_number(value=None):
+    """
+    Convert a date, datetime or YYYY-MM-DD string to a day number.
+
+    Args:
+        value: The date to convert (default today)
+
+    Returns:
+        int: Days since 1970-01-01
+    """
+    if value is None:
+        value = date.today()
+    elif isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value - _EPOCH).days
+
+
+def from_day_number(day):
+    """Convert a day number back to a date"""
+    return _EPOCH + timedelta(days=int(day))
+
+
+def add_day_columns(cursor):
+    """
+    Add generated day-number columns for loan and payment dates, with indexes.
+
+    The columns are VIRTUAL, so they cost no storage and can never disagree
+    with the text dates; the indexes hold the computed values, which turns
+    date filters into index range scans.
+    """
+    for table, column, source in (
+        ('loans', 'start_day', 'start_date'),
+        ('loans', 'end_day', 'end_date'),
+        ('payments', 'day', 'date'),
+    ):
+        cursor.execute(f"""
+            ALTER TABLE {table} ADD COLUMN {column} INTEGER
+            GENERATED ALWAYS AS ({day_number_sql(source)}) VIRTUAL
+        """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loans_status_end_day ON loans (status, end_day)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loans_start_day ON loans (start_day)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_day ON payments (day)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_loan_day ON payments (loan_id, day)")
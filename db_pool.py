@@ -0,0 +1,289 @@
+import os
+import time
+import sqlite3
+import threading
+import configparser
+from typing import Optional
+
+
+# PRAGMAs applied to every new connection. journal_mode is handled separately
+# because it is persistent and depends on what the filesystem supports.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'auto',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # Negative means KiB, so ~16 MB of page cache
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 30000,
+}
+
+
+def load_pool_config(config_path: str = 'config.ini') -> dict:
+    """Load connection pool settings from the [Database] section of config.ini"""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    pragmas = dict(DEFAULT_PRAGMAS)
+    if config.has_section('Database'):
+        for key in DEFAULT_PRAGMAS:
+            if config.has_option('Database', key):
+                pragmas[key] = config.get('Database', key)
+
+    return {
+        'pragmas': pragmas,
+        'health_check_interval': config.getfloat('Database', 'health_check_interval', fallback=30.0),
+        'max_reconnect_attempts': config.getint('Database', 'max_reconnect_attempts', fallback=3),
+        'reconnect_delay': config.getfloat('Database', 'reconnect_delay', fallback=0.5),
+    }
+
+
+def is_network_path(path: str) -> bool:
+    """Check whether a path points at a network share (UNC path)"""
+    path = str(path)
+    return path.startswith('\\\\') or path.startswith('//')
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection that runs the pool's commit hooks after a transaction that changed rows.
+
+    Both commit() and leaving a `with conn:` block count as a commit.
+    """
+
+    commit_hooks = ()
+
+    def commit(self):
+        super().commit()
+        self._after_commit()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        result = super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self._after_commit()
+        return result
+
+    def _after_commit(self):
+        changes = self.total_changes
+        if changes == getattr(self, '_committed_changes', 0):
+            return
+        self._committed_changes = changes
+        for hook in self.commit_hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"Error in commit hook: {str(e)}")
+
+
+class ConnectionPool:
+    """
+    A per-thread SQLite connection pool.
+
+    Each thread gets one long-lived connection that is reused across calls,
+    so the database file is opened and the schema parsed once per thread
+    rather than once per query. Connections are health-checked periodically
+    and transparently reopened if the underlying file (e.g. a network share)
+    went away.
+
+    Args:
+        db_path (str): Path to the SQLite database file
+        pragmas (dict): PRAGMA settings applied to each new connection
+        health_check_interval (float): Seconds between connection health checks
+        max_reconnect_attempts (int): Attempts made when (re)opening a connection
+        reconnect_delay (float): Initial delay between reconnect attempts (doubles each retry)
+        factory (type): sqlite3.Connection subclass to open connections with
+    """
+
+    def __init__(self, db_path: str, pragmas: Optional[dict] = None,
+                 health_check_interval: float = 30.0, max_reconnect_attempts: int = 3,
+                 reconnect_delay: float = 0.5, factory: type = sqlite3.Connection):
+        self.db_path = db_path
+        self.factory = factory
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        self.pragmas.update(pragmas or {})
+        self.health_check_interval = health_check_interval
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # thread ident -> connection
+        self._connect_hooks = []
+        self._commit_hooks = []
+        self._journal_mode = None
+        self._stats = {
+            'opened': 0,
+            'reused': 0,
+            'closed': 0,
+            'reconnects': 0,
+            'health_checks': 0,
+            'failed_health_checks': 0,
+        }
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening or repairing it if needed"""
+        conn = getattr(self._local, 'conn', None)
+
+        if conn is not None:
+            if time.monotonic() - self._local.last_check < self.health_check_interval:
+                self._bump('reused')
+                return conn
+
+            if self._is_healthy(conn):
+                self._local.last_check = time.monotonic()
+                self._bump('reused')
+                return conn
+
+            # Connection is broken (e.g. share dropped) - replace it
+            self._discard(conn)
+            self._bump('reconnects')
+
+        conn = self._open_with_retry()
+        self._local.conn = conn
+        self._local.last_check = time.monotonic()
+        return conn
+
+    def add_commit_hook(self, hook) -> None:
+        """Register hook(), run after any pooled connection commits changes (needs a PooledConnection factory)"""
+        self._commit_hooks.append(hook)
+
+    def add_connect_hook(self, hook) -> None:
+        """Register hook(conn), run on every connection opened from now on (e.g. to ATTACH databases)"""
+        self._connect_hooks.append(hook)
+
+    def close_thread_connection(self) -> None:
+        """Close the calling thread's connection, if any"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._discard(conn)
+
+    def close_all(self) -> None:
+        """Close every connection held by the pool"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            self._bump('closed')
+        self._local = threading.local()
+
+    def stats(self) -> dict:
+        """Get pool statistics"""
+        with self._lock:
+            self._prune_dead_threads()
+            stats = dict(self._stats)
+            stats['open_connections'] = len(self._connections)
+
+        stats['journal_mode'] = self._journal_mode
+        stats['db_path'] = self.db_path
+        return stats
+
+    def _open_with_retry(self) -> sqlite3.Connection:
+        """Open a new connection, retrying with backoff while the file is unreachable"""
+        delay = self.reconnect_delay
+        last_error = None
+
+        for attempt in range(max(1, self.max_reconnect_attempts)):
+            try:
+                conn = self._open()
+                break
+            except sqlite3.Error as e:
+                last_error = e
+                if attempt + 1 < self.max_reconnect_attempts:
+                    time.sleep(delay)
+                    delay *= 2
+        else:
+            raise sqlite3.OperationalError(
+                f"Could not open database at {self.db_path}: {last_error}"
+            )
+
+        with self._lock:
+            self._prune_dead_threads()
+            self._connections[threading.get_ident()] = conn
+            self._stats['opened'] += 1
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        """Open and configure a single connection"""
+        busy_timeout = int(self.pragmas.get('busy_timeout', 30000))
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=busy_timeout / 1000.0,
+            check_same_thread=False,  # Lets close_all() run from any thread
+            factory=self.factory
+        )
+
+        try:
+            self._apply_pragmas(conn)
+            for hook in self._connect_hooks:
+                hook(conn)
+        except sqlite3.Error:
+            conn.close()
+            raise
+
+        if isinstance(conn, PooledConnection):
+            # Shared list, so hooks added later reach connections opened earlier
+            conn.commit_hooks = self._commit_hooks
+            conn._committed_changes = conn.total_changes
+        return conn
+
+    def _apply_pragmas(self, conn: sqlite3.Connection) -> None:
+        """Apply configured PRAGMAs to a connection"""
+        network = is_network_path(self.db_path)
+
+        journal_mode = str(self.pragmas.get('journal_mode', 'auto')).upper()
+        if journal_mode == 'AUTO':
+            # WAL needs shared memory, which SMB shares do not reliably provide
+            journal_mode = 'DELETE' if network else 'WAL'
+        self._journal_mode = conn.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+
+        conn.execute(f"PRAGMA synchronous = {self.pragmas['synchronous']}")
+        conn.execute(f"PRAGMA cache_size = {int(self.pragmas['cache_size'])}")
+        conn.execute(f"PRAGMA temp_store = {self.pragmas['temp_store']}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.pragmas['busy_timeout'])}")
+
+        # Memory-mapped I/O over a network filesystem risks corruption
+        mmap_size = 0 if network else int(self.pragmas['mmap_size'])
+        conn.execute(f"PRAGMA mmap_size = {mmap_size}")
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        """Check that a connection can still read the database file"""
+        self._bump('health_checks')
+        try:
+            # schema_version reads the file header, so it fails if the share is gone
+            conn.execute("PRAGMA schema_version").fetchone()
+            return os.path.exists(self.db_path)
+        except sqlite3.Error:
+            self._bump('failed_health_checks')
+            return False
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        """Close a connection and forget it"""
+        with self._lock:
+            for ident, pooled in list(self._connections.items()):
+                if pooled is conn:
+                    del self._connections[ident]
+            self._stats['closed'] += 1
+
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        self._local.conn = None
+
+    def _prune_dead_threads(self) -> None:
+        """Close connections owned by threads that have exited (lock must be held)"""
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._connections if i not in alive]:
+            try:
+                self._connections.pop(ident).close()
+            except sqlite3.Error:
+                pass
+            self._stats['closed'] += 1
+
+    def _bump(self, counter: str) -> None:
+        with self._lock:
+            self._stats[counter] += 1
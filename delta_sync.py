@@ -0,0 +1,741 @@
+import os
+import json
+import time
+import sqlite3
+from datetime import datetime
+
+import archive
+import ledger
+import outbox
+import search_index
+from migrations import migrate
+from change_log import SYNC_TABLES, pending_changes, set_origin, site_id, stored_columns
+from db_pool import is_network_path
+from sql_metrics import InstrumentedConnection
+
+
+# Foreign keys rewritten when the hub gives a replica's new row another id
+_REFERENCES = {
+    'loans': {'customer_id': 'customers'},
+    'payments': {'loan_id': 'loans'},
+}
+
+# Tables that hold a loan_id besides loans itself, updated when a loan is re-keyed locally
+_LOAN_ID_TABLES = ('payments', 'loan_ledger', 'balance_snapshots')
+
+
+def _read_rows(cursor, table, ids):
+    """Current rows of a table by key, as dicts"""
+    key = SYNC_TABLES[table]
+    columns = stored_columns(cursor, table)
+    rows = {}
+    ids = list(ids)
+    # Stay under SQLite's bound-parameter limit
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        cursor.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE {key} IN ({', '.join('?' * len(batch))})",
+            batch
+        )
+        for row in cursor.fetchall():
+            record = dict(zip(columns, row))
+            rows[record[key]] = record
+    return rows
+
+
+def _upsert(cursor, table, row, keep_columns=()):
+    """Insert a row, or overwrite the existing one except for keep_columns"""
+    key = SYNC_TABLES[table]
+    columns = list(row)
+    assignments = ', '.join(
+        f"{column} = excluded.{column}" for column in columns
+        if column != key and column not in keep_columns
+    )
+    cursor.execute(f"""
+        INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT({key}) DO UPDATE SET {assignments}
+    """, [row[column] for column in columns])
+
+
+def build_payload(cursor, changes):
+    """Attach the current row to each non-delete change"""
+    payload = []
+    for table in SYNC_TABLES:
+        ids = [row_id for (t, row_id), change in changes.items() if t == table and change['op'] != 'delete']
+        rows = _read_rows(cursor, table, ids)
+        vectors = outbox.row_vectors(cursor, table, ids)
+        for (t, row_id), change in changes.items():
+            if t != table:
+                continue
+            row = rows.get(row_id)
+            op = change['op'] if row is not None or change['op'] == 'delete' else 'delete'
+            payload.append(dict(change, table=table, row_id=row_id, op=op, row=row, vector=vectors.get(row_id)))
+    return payload
+
+
+def full_changes(cursor):
+    """
+    Every row of the synced tables as an insert, for a replica starting from scratch.
+
+    Returns:
+        tuple: (changes in the form pending_changes returns, the hub's current last change_id)
+    """
+    cursor.execute("SELECT COALESCE(MAX(change_id), 0) FROM change_log")
+    last_change_id = cursor.fetchone()[0]
+
+    changes = {}
+    for table, key in SYNC_TABLES.items():
+        cursor.execute(f"SELECT {key} FROM {table}")
+        for (row_id,) in cursor.fetchall():
+            changes[(table, row_id)] = {'op': 'insert', 'base_balance': None, 'changed_at': None}
+    return changes, last_change_id
+
+
+def _missing_from_hub(cursor, changes):
+    """Deletes for the replica's rows the hub does not have, completing a full pull"""
+    deletes = []
+    for table, key in SYNC_TABLES.items():
+        cursor.execute(f"SELECT {key} FROM {table}")
+        for (row_id,) in cursor.fetchall():
+            if (table, row_id) not in changes:
+                deletes.append({'table': table, 'row_id': row_id, 'op': 'delete', 'row': None, 'vector': None})
+    return deletes
+
+
+def _remove_loans(cursor, loan_ids):
+    """Remove loans, keeping a copy in the archive when it is attached"""
+    if not loan_ids:
+        return
+    if archive.is_attached(cursor.connection):
+        archive.archive_loans(cursor, loan_ids)
+    else:
+        placeholders = ', '.join('?' * len(loan_ids))
+        cursor.execute(f"DELETE FROM payments WHERE loan_id IN ({placeholders})", loan_ids)
+        cursor.execute(f"DELETE FROM loans WHERE loan_id IN ({placeholders})", loan_ids)
+
+
+def _record_conflict(cursor, table, row_id, kind, kept, discarded, peer, operations=()):
+    cursor.execute("""
+        INSERT INTO sync_conflicts (table_name, row_id, kind, kept, discarded, peer_site_id, operations)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (table, row_id, kind, json.dumps(kept), json.dumps(discarded), peer, ', '.join(operations)))
+
+
+def _translate(table, row, mapping):
+    """Point a row's foreign keys at re-keyed parents"""
+    for column, parent in _REFERENCES.get(table, {}).items():
+        if row.get(column) in mapping[parent]:
+            row[column] = mapping[parent][row[column]]
+    return row
+
+
+# Bookkeeping columns where, when both sides changed them, the later value wins
+_LATEST_WINS_COLUMNS = ('last_updated',)
+
+
+def replay_outbox(cursor, changes, replica_site, hub_site):
+    """
+    Replay a replica's outbox against the hub, merging with the hub's own edits.
+
+    Runs inside the caller's transaction with sync_state.origin set to the
+    replica. Version vectors tell whether the hub changed a row since the
+    replica last saw it. If not, the replica's change applies as it is. If
+    both sides changed the row, the edit is merged column by column against
+    the values the replica started from: a column only one side changed
+    takes that side's value, loan balances add both sides' changes so every
+    payment counts, and last_updated takes the later time. A column both
+    sides set to different values is a real conflict - the hub keeps its
+    value and the conflict is recorded in sync_conflicts with the operations
+    that lost. Merged rows are logged as hub changes so the replica pulls
+    them back. Changes the hub has already seen (a replay cut off before the
+    replica cleared its outbox) are skipped, and new rows whose id is taken
+    on the hub are inserted under a fresh id.
+
+    Args:
+        cursor: Hub cursor
+        changes (list): Net row changes from outbox.pending_rows()
+        replica_site (str): Site the changes come from
+        hub_site (str): The hub's own site id
+
+    Returns:
+        tuple: (rows applied, conflicts, {table: {replica id: hub id}})
+    """
+    mapping = {table: {} for table in SYNC_TABLES}
+    applied = conflicts = 0
+    # Loans are written before their payments; the ledger catches up at the end
+    ledger.set_paused(cursor, True)
+    balanced = set()
+
+    for table, key in SYNC_TABLES.items():
+        upserts = [change for change in changes if change['table'] == table and change['kind'] != 'delete']
+        ids = [change['row_id'] for change in upserts]
+        existing = _read_rows(cursor, table, ids)
+        vectors = outbox.row_vectors(cursor, table, ids)
+        # Customers count their loans through triggers; never take the replica's count
+        keep_columns = ('loan_cycles',) if table == 'customers' else ()
+        settled = {}
+
+        # Inserts that keep their id first, so re-keyed ones land above all of them
+        upserts.sort(key=lambda change: change['kind'] == 'insert' and change['row_id'] in existing)
+
+        for change in upserts:
+            row_id = change['row_id']
+            row = _translate(table, dict(change['after']), mapping)
+            hub_row = existing.get(row_id)
+            hub_vector = vectors.get(row_id, {})
+
+            if hub_row is not None and outbox.dominates(hub_vector, change['vector']):
+                continue
+
+            if change['kind'] == 'insert':
+                if table == 'customers':
+                    row['loan_cycles'] = 0
+                    # The same person may have been added on both sides
+                    match = _matching_customer(cursor, row)
+                    if match is not None and match != row_id:
+                        mapping[table][row_id] = match
+                        _touch(cursor, table, match, hub_site)
+                        continue
+                    if match == row_id:
+                        hub_row = None
+
+                if hub_row is None:
+                    if table == 'loans':
+                        ledger.forget_loans(cursor, [row_id])
+                    _upsert(cursor, table, row, keep_columns)
+                    settled[row_id] = outbox.merge_vectors(hub_vector, change['vector'])
+                    balanced.update(_balanced_loans(table, row_id, row))
+                else:
+                    # Same id was used on both sides for different rows
+                    columns = [column for column in row if column != key]
+                    cursor.execute(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        [row[column] for column in columns]
+                    )
+                    mapping[table][row_id] = cursor.lastrowid
+                    settled[cursor.lastrowid] = change['vector']
+                    balanced.update(_balanced_loans(table, cursor.lastrowid, row))
+                    # The replica re-keys its copy, then takes the hub's version of it
+                    _touch(cursor, table, cursor.lastrowid, hub_site)
+                applied += 1
+                continue
+
+            # Update
+            if hub_row is None:
+                conflicts += 1
+                _record_conflict(cursor, table, row_id, 'update_of_deleted', None, row,
+                                 replica_site, change['operations'])
+                continue
+
+            before = change['before']
+            changed = [
+                column for column in row
+                if column != key and column not in keep_columns and row[column] != before.get(column)
+            ]
+
+            concurrent = not outbox.dominates(change['base_vector'], hub_vector)
+            if concurrent:
+                values, lost = _merge_columns(table, hub_row, before, row, changed)
+                vector = outbox.merge_vectors(hub_vector, change['vector'])
+                # The merged row is a new version neither side has seen
+                vector[hub_site] = vector.get(hub_site, 0) + 1
+                if lost:
+                    conflicts += 1
+                    _record_conflict(
+                        cursor, table, row_id, 'update_update',
+                        {column: hub_row[column] for column in lost}, lost,
+                        replica_site, change['operations']
+                    )
+            else:
+                values = {column: row[column] for column in changed}
+                vector = outbox.merge_vectors(hub_vector, change['vector'])
+
+            if values:
+                cursor.execute(
+                    f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in values)} WHERE {key} = ?",
+                    list(values.values()) + [row_id]
+                )
+            settled[row_id] = vector
+            balanced.update(_balanced_loans(table, row_id, {**hub_row, **values}))
+            if concurrent:
+                _touch(cursor, table, row_id, hub_site)
+            applied += 1
+
+        # After the writes above, whose triggers bumped the vectors one step at a time
+        outbox.set_row_vectors(cursor, table, settled)
+
+    # Deletes, children first
+    for table in reversed(list(SYNC_TABLES)):
+        key = SYNC_TABLES[table]
+        removals = [change for change in changes if change['table'] == table and change['kind'] == 'delete']
+        ids = [change['row_id'] for change in removals]
+        existing = _read_rows(cursor, table, ids)
+        vectors = outbox.row_vectors(cursor, table, ids)
+
+        deletes = []
+        for change in removals:
+            row_id = change['row_id']
+            if row_id not in existing:
+                continue
+            if not outbox.dominates(change['base_vector'], vectors.get(row_id, {})):
+                # The hub changed it since - keep it; the replica gets it back on pull
+                conflicts += 1
+                _record_conflict(cursor, table, row_id, 'delete_update', None, change['before'],
+                                 replica_site, change['operations'])
+                _touch(cursor, table, row_id, hub_site)
+                if table == 'loans' and existing[row_id]['customer_id'] is not None:
+                    # Restoring the loan counts it again on the replica; send the true count
+                    _touch(cursor, 'customers', existing[row_id]['customer_id'], hub_site)
+                continue
+            deletes.append(row_id)
+
+        if table == 'loans':
+            _remove_loans(cursor, deletes)
+        elif deletes:
+            cursor.executemany(f"DELETE FROM {table} WHERE {key} = ?", [(row_id,) for row_id in deletes])
+        applied += len(deletes)
+
+    ledger.set_paused(cursor, False)
+    ledger.reconcile_loans(cursor, balanced)
+    return applied, conflicts, mapping
+
+
+def _balanced_loans(table, row_id, row):
+    """The loans whose balance a written row can move"""
+    if table == 'loans':
+        return [row_id]
+    if table == 'payments' and row.get('loan_id') is not None:
+        return [row['loan_id']]
+    return []
+
+
+def _merge_columns(table, hub_row, before, after, changed):
+    """
+    Three-way merge of the columns a replica changed with the hub's row.
+
+    Returns:
+        tuple: ({column: value to write}, {column: replica value that lost})
+    """
+    values, lost = {}, {}
+    for column in changed:
+        ours, base, theirs = hub_row[column], before.get(column), after[column]
+        if ours == base:
+            values[column] = theirs
+        elif ours == theirs:
+            continue
+        elif table == 'loans' and column == 'remaining_balance':
+            values[column] = max(0, ours + theirs - base)
+        elif column in _LATEST_WINS_COLUMNS:
+            values[column] = max(ours or '', theirs or '')
+        else:
+            lost[column] = theirs
+
+    if table == 'loans' and 'remaining_balance' in values:
+        # Status follows the merged balance
+        status = values.get('status', hub_row['status'])
+        if values['remaining_balance'] <= 0:
+            values['status'] = 'Paid'
+        elif status == 'Paid':
+            values['status'] = 'Active'
+        lost.pop('status', None)
+
+    return values, lost
+
+
+def _touch(cursor, table, row_id, hub_site):
+    """Log a hub change for a row so the replica pulls it again"""
+    cursor.execute("""
+        INSERT INTO change_log (table_name, row_id, op, origin) VALUES (?, ?, 'U', ?)
+    """, (table, row_id, hub_site))
+
+
+def _matching_customer(cursor, row):
+    """Hub customer with the same phone or national ID key, if any"""
+    if not row.get('phone_key') and not row.get('national_id_key'):
+        return None
+    cursor.execute("""
+        SELECT customer_id FROM customers
+        WHERE phone_key = ? OR national_id_key = ?
+        LIMIT 1
+    """, (row.get('phone_key'), row.get('national_id_key')))
+    found = cursor.fetchone()
+    return found[0] if found else None
+
+
+def rekey_replica(cursor, mapping):
+    """
+    Move the replica's rows to the ids the hub gave them.
+
+    Rows are parked on negative ids first, so a move can never land on a
+    row that has not moved yet.
+
+    Returns:
+        int: Rows re-keyed
+    """
+    for old_id, new_id in mapping['customers'].items():
+        cursor.execute("SELECT COUNT(*) FROM loans WHERE customer_id = ?", (old_id,))
+        loan_count = cursor.fetchone()[0]
+        cursor.execute("SELECT 1 FROM customers WHERE customer_id = ?", (new_id,))
+        if cursor.fetchone():
+            # Merged into a customer the replica already has
+            cursor.execute("DELETE FROM customers WHERE customer_id = ?", (old_id,))
+            cursor.execute("UPDATE loans SET customer_id = ? WHERE customer_id = ?", (new_id, old_id))
+        else:
+            cursor.execute("UPDATE customers SET customer_id = ? WHERE customer_id = ?", (new_id, old_id))
+            cursor.execute("UPDATE loans SET customer_id = ? WHERE customer_id = ?", (new_id, old_id))
+            # The reassign trigger counted these loans a second time on the moved row
+            cursor.execute(
+                "UPDATE customers SET loan_cycles = loan_cycles - ? WHERE customer_id = ?",
+                (loan_count, new_id)
+            )
+
+    for table, references in (('loans', _LOAN_ID_TABLES), ('payments', ())):
+        moves = list(mapping[table].items())
+        for old_id, new_id in moves:
+            _move_row(cursor, table, references, old_id, -old_id)
+        for old_id, new_id in moves:
+            _move_row(cursor, table, references, -old_id, new_id)
+
+    moved = sum(len(ids) for ids in mapping.values())
+    if moved and search_index.search_index_exists(cursor):
+        search_index.rebuild_search_index(cursor)
+    return moved
+
+
+def _move_row(cursor, table, references, source, target):
+    key = SYNC_TABLES[table]
+    cursor.execute(f"UPDATE {table} SET {key} = ? WHERE {key} = ?", (target, source))
+    for other in references:
+        cursor.execute(f"UPDATE {other} SET loan_id = ? WHERE loan_id = ?", (target, source))
+
+
+def apply_to_replica(cursor, payload):
+    """
+    Apply the hub's changes to the replica. The hub has already resolved
+    conflicts, so its rows simply replace the replica's.
+
+    Returns:
+        int: Rows applied
+    """
+    applied = 0
+    loan_cycles = {}
+    # Loans are written before their payments; the ledger catches up at the end
+    ledger.set_paused(cursor, True)
+    balanced = set()
+
+    for table in SYNC_TABLES:
+        if table == 'loans':
+            ids = [entry['row_id'] for entry in payload if entry['table'] == table and entry['op'] != 'delete']
+            present = _read_rows(cursor, table, ids)
+            ledger.forget_loans(cursor, [loan_id for loan_id in ids if loan_id not in present])
+
+        vectors = {}
+        for entry in payload:
+            if entry['table'] == table and entry['op'] != 'delete':
+                _upsert(cursor, table, entry['row'])
+                applied += 1
+                vectors[entry['row_id']] = entry['vector'] or {}
+                balanced.update(_balanced_loans(table, entry['row_id'], entry['row']))
+                if table == 'customers':
+                    loan_cycles[entry['row_id']] = entry['row']['loan_cycles']
+        # Take the hub's versions, so later local edits are seen to follow these
+        outbox.set_row_vectors(cursor, table, vectors)
+
+    for table in reversed(list(SYNC_TABLES)):
+        key = SYNC_TABLES[table]
+        deletes = [entry['row_id'] for entry in payload if entry['table'] == table and entry['op'] == 'delete']
+        if table == 'loans':
+            _remove_loans(cursor, deletes)
+        elif deletes:
+            cursor.executemany(f"DELETE FROM {table} WHERE {key} = ?", [(row_id,) for row_id in deletes])
+        applied += len(deletes)
+
+    # Loan inserts above bumped the counts again; the hub's count is the true one
+    cursor.executemany(
+        "UPDATE customers SET loan_cycles = ? WHERE customer_id = ?",
+        [(cycles, customer_id) for customer_id, cycles in loan_cycles.items()]
+    )
+
+    ledger.set_paused(cursor, False)
+    ledger.reconcile_loans(cursor, balanced)
+    return applied
+
+
+class DeltaSync:
+    """
+    Keep a local replica in step with the network database by exchanging row changes.
+
+    The replica queues the operations made on it (typically while the share
+    was down) in its outbox; the hub logs its changes in change_log. A sync
+    replays the replica's outbox against the hub in one transaction, then
+    pulls the hub's changes since the last pull into the replica in another.
+    Only changed rows cross the share. A missing replica is seeded once
+    with a full copy through the backup API; an existing one with no
+    watermark for this hub takes all of the hub's rows in place instead,
+    as the app may have it open.
+
+    Args:
+        hub_path (str): The shared (network) database
+        replica_path (str): The local copy
+    """
+
+    def __init__(self, hub_path, replica_path):
+        self.hub_path = hub_path
+        self.replica_path = replica_path
+
+    def sync(self):
+        """
+        Run one sync.
+
+        Returns:
+            dict: mode ('seed', 'publish' or 'delta'), pushed, pulled, conflicts,
+                  remapped, bytes_sent, bytes_received and seconds
+        """
+        started = time.perf_counter()
+        if not os.path.exists(self.hub_path):
+            if not os.path.exists(self.replica_path):
+                raise FileNotFoundError(f"Neither {self.hub_path} nor {self.replica_path} exists")
+            stats = self._publish()
+            stats['seconds'] = round(time.perf_counter() - started, 3)
+            return stats
+
+        hub = self._connect(self.hub_path)
+        try:
+            migrate(hub)
+            hub_cursor = hub.cursor()
+            if outbox.is_recording(hub_cursor):
+                # The shared database has no one to replay to
+                outbox.set_recording(hub_cursor, False)
+                hub.commit()
+            if not os.path.exists(self.replica_path):
+                stats = self._seed(hub)
+            else:
+                replica = self._connect(self.replica_path)
+                try:
+                    migrate(replica)
+                    stats = self._exchange(hub, replica)
+                finally:
+                    replica.close()
+        finally:
+            hub.close()
+
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def _exchange(self, hub, replica):
+        hub_cursor, replica_cursor = hub.cursor(), replica.cursor()
+        hub_site, replica_site = site_id(hub_cursor), site_id(replica_cursor)
+        if replica_site == hub_site:
+            # A file copy of the hub: it needs its own identity, or the hub's
+            # changes would look like its own and never be pulled
+            replica_cursor.execute("UPDATE sync_state SET site_id = lower(hex(randomblob(16))) WHERE id = 1")
+            replica_cursor.execute("UPDATE sync_state SET origin = site_id WHERE id = 1")
+            replica.commit()
+            replica_site = site_id(replica_cursor)
+
+        replica_cursor.execute(
+            "SELECT last_pulled FROM sync_peers WHERE peer_site_id = ?", (hub_site,)
+        )
+        watermarks = replica_cursor.fetchone()
+
+        archive.attach_archive(hub, archive.archive_path_for(self.hub_path))
+        archive.attach_archive(replica, archive.archive_path_for(self.replica_path))
+
+        # Push: replay the operations queued on the replica
+        replica.execute("BEGIN")
+        try:
+            changes, replayed_to = outbox.pending_rows(replica_cursor)
+            replica_cursor.execute("SELECT COALESCE(MAX(change_id), 0) FROM change_log")
+            pushed_to = replica_cursor.fetchone()[0]
+        finally:
+            replica.commit()
+        bytes_sent = len(json.dumps(changes).encode('utf-8'))
+
+        hub.execute("BEGIN IMMEDIATE")
+        try:
+            set_origin(hub_cursor, replica_site)
+            pushed, conflicts, mapping = replay_outbox(hub_cursor, changes, replica_site, hub_site)
+            set_origin(hub_cursor, hub_site)
+            hub.commit()
+        except Exception:
+            hub.rollback()
+            raise
+
+        # Pull everything the replica did not send itself, in one consistent read.
+        # A replica that never synced with this hub (e.g. a copy made by the old
+        # whole-file sync) has its own work on the hub now, so it takes all of
+        # the hub's rows - in place, since the app may have the file open.
+        full = watermarks is None
+        hub.execute("BEGIN")
+        try:
+            if full:
+                changes, pulled_to = full_changes(hub_cursor)
+            else:
+                changes, pulled_to = pending_changes(hub_cursor, watermarks[0], exclude_origin=replica_site)
+            pull = build_payload(hub_cursor, changes)
+        finally:
+            hub.commit()
+        bytes_received = len(json.dumps(pull).encode('utf-8'))
+
+        stats = {
+            'mode': 'full' if full else 'delta',
+            'pushed': pushed,
+            'pulled': 0,
+            'conflicts': conflicts,
+            'remapped': 0,
+            'bytes_sent': bytes_sent,
+            'bytes_received': bytes_received,
+        }
+
+        replica.execute("BEGIN IMMEDIATE")
+        try:
+            set_origin(replica_cursor, hub_site)
+            stats['remapped'] = rekey_replica(replica_cursor, mapping)
+            if full:
+                pull.extend(_missing_from_hub(replica_cursor, changes))
+            stats['pulled'] = apply_to_replica(replica_cursor, pull)
+            set_origin(replica_cursor, replica_site)
+
+            replica_cursor.execute("""
+                INSERT INTO sync_peers (peer_site_id, last_pushed, last_pulled, last_sync_at, stats)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(peer_site_id) DO UPDATE SET
+                    last_pushed = excluded.last_pushed,
+                    last_pulled = excluded.last_pulled,
+                    last_sync_at = excluded.last_sync_at,
+                    stats = excluded.stats
+            """, (hub_site, pushed_to, pulled_to, datetime.now().isoformat(), json.dumps(stats)))
+
+            # The replayed operations are on the hub, and change_log only serves the hub role
+            outbox.clear(replica_cursor, replayed_to)
+            replica_cursor.execute(
+                "DELETE FROM change_log WHERE change_id <= ? OR origin != ?", (pushed_to, replica_site)
+            )
+            replica.commit()
+        except Exception:
+            replica.rollback()
+            raise
+
+        self._record_hub_watermark(hub, replica_site, pulled_to, stats)
+        return stats
+
+    def _seed(self, hub):
+        """Create the replica as a full copy of the hub, with its own identity"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.replica_path)), exist_ok=True)
+        replica = self._connect(self.replica_path)
+        try:
+            hub.execute("BEGIN")
+            try:
+                hub_site = site_id(hub.cursor())
+                hub_cursor = hub.cursor()
+                hub_cursor.execute("SELECT COALESCE(MAX(change_id), 0) FROM change_log")
+                pulled_to = hub_cursor.fetchone()[0]
+                hub.backup(replica, pages=-1)
+            finally:
+                hub.commit()
+
+            cursor = replica.cursor()
+            cursor.execute("PRAGMA journal_mode = WAL")
+            self._reidentify(cursor, recording=True)
+            stats = {
+                'mode': 'seed',
+                'pushed': 0,
+                'pulled': 0,
+                'conflicts': 0,
+                'remapped': 0,
+                'bytes_sent': 0,
+                'bytes_received': os.path.getsize(self.hub_path),
+            }
+            cursor.execute("""
+                INSERT INTO sync_peers (peer_site_id, last_pushed, last_pulled, last_sync_at, stats)
+                VALUES (?, 0, ?, ?, ?)
+            """, (hub_site, pulled_to, datetime.now().isoformat(), json.dumps(stats)))
+            replica.commit()
+            replica_site = site_id(cursor)
+        finally:
+            replica.close()
+
+        self._record_hub_watermark(hub, replica_site, pulled_to, stats)
+        return stats
+
+    def _publish(self):
+        """Create a missing hub from the replica, e.g. after the share was emptied"""
+        replica = self._connect(self.replica_path)
+        hub = self._connect(self.hub_path)
+        try:
+            migrate(replica)
+            cursor = replica.cursor()
+            replica_site = site_id(cursor)
+
+            replica.execute("BEGIN")
+            try:
+                cursor.execute("SELECT COALESCE(MAX(change_id), 0) FROM change_log")
+                pushed_to = cursor.fetchone()[0]
+                cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM outbox")
+                replayed_to = cursor.fetchone()[0]
+                replica.backup(hub, pages=-1)
+            finally:
+                replica.commit()
+
+            hub_cursor = hub.cursor()
+            # A share cannot host WAL, which the copy inherits from the replica
+            hub_cursor.execute(f"PRAGMA journal_mode = {'DELETE' if is_network_path(self.hub_path) else 'WAL'}")
+            self._reidentify(hub_cursor, recording=False)
+            hub.commit()
+            hub_site = site_id(hub_cursor)
+
+            stats = {
+                'mode': 'publish',
+                'pushed': 0,
+                'pulled': 0,
+                'conflicts': 0,
+                'remapped': 0,
+                'bytes_sent': os.path.getsize(self.replica_path),
+                'bytes_received': 0,
+            }
+            cursor.execute("""
+                INSERT OR REPLACE INTO sync_peers (peer_site_id, last_pushed, last_pulled, last_sync_at, stats)
+                VALUES (?, ?, 0, ?, ?)
+            """, (hub_site, pushed_to, datetime.now().isoformat(), json.dumps(stats)))
+            cursor.execute("DELETE FROM change_log WHERE change_id <= ?", (pushed_to,))
+            outbox.clear(cursor, replayed_to)
+            replica.commit()
+
+            self._record_hub_watermark(hub, replica_site, 0, stats)
+            return stats
+        finally:
+            hub.close()
+            replica.close()
+
+    @staticmethod
+    def _reidentify(cursor, recording):
+        """Give a freshly copied database its own site id and an empty change history"""
+        cursor.execute("UPDATE sync_state SET site_id = lower(hex(randomblob(16))) WHERE id = 1")
+        cursor.execute("UPDATE sync_state SET origin = site_id WHERE id = 1")
+        cursor.execute("DELETE FROM change_log")
+        cursor.execute("DELETE FROM sync_peers")
+        cursor.execute("DELETE FROM outbox")
+        outbox.set_recording(cursor, recording)
+
+    @staticmethod
+    def _record_hub_watermark(hub, replica_site, pulled_to, stats):
+        """Remember how far this replica has pulled, and drop log entries every replica has"""
+        hub.execute("BEGIN IMMEDIATE")
+        try:
+            hub.execute("""
+                INSERT INTO sync_peers (peer_site_id, last_pulled, last_sync_at, stats)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(peer_site_id) DO UPDATE SET
+                    last_pulled = excluded.last_pulled,
+                    last_sync_at = excluded.last_sync_at,
+                    stats = excluded.stats
+            """, (replica_site, pulled_to, datetime.now().isoformat(), json.dumps(stats)))
+            hub.execute("DELETE FROM change_log WHERE change_id <= (SELECT MIN(last_pulled) FROM sync_peers)")
+            hub.commit()
+        except Exception:
+            hub.rollback()
+            raise
+
+    @staticmethod
+    def _connect(path):
+        return sqlite3.connect(path, timeout=30, factory=InstrumentedConnection)
@@ -0,0 +1,388 @@
+import os
+import json
+import time
+import sqlite3
+import configparser
+from datetime import datetime, timedelta
+
+import archive
+import ledger
+import outbox
+from change_log import site_id
+
+
+# Phases run in this order. A run records the phase it is in and the last
+# loan_id it finished, so a crashed run resumes from the next chunk.
+PHASES = ('payments', 'cleanup', 'snapshots')
+
+
+def load_eod_config(config_path='config.ini'):
+    """Load end-of-day settings from the [EndOfDay] section of config.ini"""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    return {
+        'chunk_size': config.getint('EndOfDay', 'chunk_size', fallback=500),
+        'paid_retention_hours': config.getfloat('EndOfDay', 'paid_retention_hours', fallback=24),
+        'stale_after': config.getfloat('EndOfDay', 'stale_after', fallback=300),
+    }
+
+
+def create_daily_runs_table(cursor):
+    """
+    Create the ledger of end-of-day runs, one row per business date.
+
+    site_id is the database that runs the date. A replica claims the date
+    on the shared database first, where its row has status 'claimed'.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_runs (
+            business_date TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            phase TEXT,
+            last_loan_id INTEGER NOT NULL DEFAULT 0,
+            stats TEXT,
+            started_at TEXT NOT NULL,
+            heartbeat TEXT NOT NULL,
+            finished_at TEXT,
+            site_id TEXT
+        )
+    """)
+
+
+def add_daily_run_sites(cursor):
+    """Add daily_runs.site_id to an older ledger, marking its runs as this database's own"""
+    cursor.execute("PRAGMA table_info(daily_runs)")
+    if 'site_id' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE daily_runs ADD COLUMN site_id TEXT")
+    cursor.execute("UPDATE daily_runs SET site_id = ? WHERE site_id IS NULL", (site_id(cursor),))
+
+
+class EndOfDayEngine:
+    """
+    Idempotent, chunked end-of-day processing.
+
+    Each chunk of loans is processed in its own short write transaction, and
+    the daily_runs ledger row is advanced in that same transaction. Other
+    tellers only wait for one chunk at a time, a completed business date is
+    never processed twice, and a crashed run picks up after the last
+    committed chunk.
+
+    A sync adds both sides' payments together, so a business date must be
+    run by one database only. A replica claims the date on the shared
+    database before running it, and does not run while that is unreachable.
+
+    Args:
+        db_manager: DatabaseManager providing pooled connections
+        hub_path (str): The shared database a replica claims business dates on
+        chunk_size (int): Loans processed per transaction
+        paid_retention_hours (float): How long paid loans are kept before cleanup
+        stale_after (float): Seconds without a heartbeat before a running run
+                             is treated as crashed and may be resumed
+    """
+
+    def __init__(self, db_manager, hub_path=None, chunk_size=500, paid_retention_hours=24, stale_after=300):
+        self.db_manager = db_manager
+        self.hub_path = hub_path
+        self.chunk_size = max(1, int(chunk_size))
+        self.paid_retention_hours = paid_retention_hours
+        self.stale_after = stale_after
+
+    def run(self, business_date=None):
+        """
+        Run end-of-day processing for a business date.
+
+        Args:
+            business_date (str): YYYY-MM-DD date to process (default today)
+
+        Returns:
+            dict: business_date, status ('completed', 'already_completed',
+                  'in_progress', 'claimed_elsewhere' or 'hub_unavailable')
+                  and per-phase stats
+        """
+        business_date = business_date or datetime.now().strftime("%Y-%m-%d")
+        conn = self.db_manager._get_connection()
+
+        run = self._claim(conn, business_date)
+        if run['status'] != 'claimed':
+            return run
+
+        phase, last_loan_id, stats = run['phase'], run['last_loan_id'], run['stats']
+        handlers = {
+            'payments': self._payments_chunk,
+            'cleanup': self._cleanup_chunk,
+            'snapshots': self._snapshots_chunk,
+        }
+        cutoff = (datetime.now() - timedelta(hours=self.paid_retention_hours)).strftime("%Y-%m-%d %H:%M:%S")
+
+        try:
+            for current in PHASES[PHASES.index(phase):]:
+                phase_stats = stats.setdefault(current, {'rows': 0, 'amount': 0, 'chunks': 0, 'seconds': 0})
+
+                while True:
+                    started = time.perf_counter()
+                    self._begin(conn)
+                    cursor = conn.cursor()
+                    outbox.begin_operation(cursor, f'end_of_day:{current}')
+
+                    loan_ids, amount = handlers[current](cursor, business_date, cutoff, last_loan_id)
+                    if loan_ids:
+                        last_loan_id = loan_ids[-1]
+                        phase_stats['rows'] += len(loan_ids)
+                        phase_stats['amount'] += amount
+                        phase_stats['chunks'] += 1
+                    phase_stats['seconds'] = round(phase_stats['seconds'] + time.perf_counter() - started, 4)
+
+                    if len(loan_ids) < self.chunk_size:
+                        # Phase finished - move the ledger on to the next one
+                        next_index = PHASES.index(current) + 1
+                        if next_index < len(PHASES):
+                            self._advance(cursor, business_date, PHASES[next_index], 0, stats)
+                        else:
+                            self._finish(cursor, business_date, stats)
+                        conn.commit()
+                        last_loan_id = 0
+                        break
+
+                    self._advance(cursor, business_date, current, last_loan_id, stats)
+                    conn.commit()
+
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            self._mark_failed(conn, business_date)
+            raise
+
+        return {'business_date': business_date, 'status': 'completed', 'stats': stats}
+
+    def cleanup_paid_loans(self, cutoff=None):
+        """
+        Move paid loans (and their payments) last updated before cutoff to the archive, in chunks.
+
+        Returns:
+            int: Number of loans archived
+        """
+        cutoff = cutoff or (datetime.now() - timedelta(hours=self.paid_retention_hours)).strftime("%Y-%m-%d %H:%M:%S")
+        conn = self.db_manager._get_connection()
+        removed, last_loan_id = 0, 0
+
+        try:
+            while True:
+                self._begin(conn)
+                cursor = conn.cursor()
+                outbox.begin_operation(cursor, 'cleanup_paid_loans')
+                loan_ids, _ = self._cleanup_chunk(cursor, None, cutoff, last_loan_id)
+                conn.commit()
+
+                removed += len(loan_ids)
+                if len(loan_ids) < self.chunk_size:
+                    return removed
+                last_loan_id = loan_ids[-1]
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+    def get_run(self, business_date):
+        """Get the ledger row for a business date as a dict, or None"""
+        with self.db_manager._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM daily_runs WHERE business_date = ?", (business_date,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+
+            run = dict(zip([desc[0] for desc in cursor.description], row))
+            run['stats'] = json.loads(run['stats'] or '{}')
+            return run
+
+    def _claim(self, conn, business_date):
+        """Start a new run or take over a crashed one; report if already done, running or run elsewhere"""
+        now = datetime.now()
+        self._begin(conn)
+        try:
+            cursor = conn.cursor()
+            site = site_id(cursor)
+            cursor.execute("""
+                SELECT status, phase, last_loan_id, stats, heartbeat, site_id
+                FROM daily_runs WHERE business_date = ?
+            """, (business_date,))
+            row = cursor.fetchone()
+
+            if row is None:
+                claimed = self._claim_on_hub(business_date, site, now) if self._is_replica(cursor) else None
+                if claimed is not None:
+                    conn.commit()
+                    return claimed
+
+                cursor.execute("""
+                    INSERT INTO daily_runs (business_date, status, phase, last_loan_id, stats, started_at, heartbeat,
+                                            site_id)
+                    VALUES (?, 'running', ?, 0, '{}', ?, ?, ?)
+                """, (business_date, PHASES[0], now.isoformat(), now.isoformat(), site))
+                conn.commit()
+                return {'status': 'claimed', 'phase': PHASES[0], 'last_loan_id': 0, 'stats': {}}
+
+            status, phase, last_loan_id, stats, heartbeat, run_site = row
+            stats = json.loads(stats or '{}')
+
+            if status == 'completed':
+                conn.commit()
+                return {'business_date': business_date, 'status': 'already_completed', 'stats': stats}
+
+            if run_site != site:
+                # Claimed by a replica, or copied from the database that runs it
+                conn.commit()
+                return {'business_date': business_date, 'status': 'claimed_elsewhere', 'stats': stats}
+
+            age = (now - datetime.fromisoformat(heartbeat)).total_seconds()
+            if status == 'running' and age < self.stale_after:
+                conn.commit()
+                return {'business_date': business_date, 'status': 'in_progress', 'stats': stats}
+
+            # Failed or abandoned run - resume from the last committed chunk
+            cursor.execute("""
+                UPDATE daily_runs SET status = 'running', heartbeat = ?
+                WHERE business_date = ?
+            """, (now.isoformat(), business_date))
+            conn.commit()
+            return {'status': 'claimed', 'phase': phase or PHASES[0], 'last_loan_id': last_loan_id, 'stats': stats}
+
+        except Exception:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def _is_replica(cursor):
+        """Whether this database queues its changes for a shared database it has synced with"""
+        if not outbox.is_recording(cursor):
+            return False
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM sync_peers)")
+        return bool(cursor.fetchone()[0])
+
+    def _claim_on_hub(self, business_date, site, now):
+        """
+        Claim a business date on the shared database for this replica.
+
+        Returns:
+            dict: The run's outcome if the date cannot be run here
+                  ('claimed_elsewhere' or 'hub_unavailable'), or None once
+                  this replica holds the claim
+        """
+        unavailable = {'business_date': business_date, 'status': 'hub_unavailable', 'stats': {}}
+        if not self.hub_path or not os.path.exists(self.hub_path):
+            return unavailable
+
+        try:
+            hub = sqlite3.connect(self.hub_path)
+        except sqlite3.Error as e:
+            print(f"Error opening the shared database to claim end of day: {str(e)}")
+            return unavailable
+
+        try:
+            hub.execute("BEGIN IMMEDIATE")
+            cursor = hub.cursor()
+            cursor.execute("SELECT site_id, stats FROM daily_runs WHERE business_date = ?", (business_date,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute("""
+                    INSERT INTO daily_runs (business_date, status, phase, last_loan_id, stats, started_at, heartbeat,
+                                            site_id)
+                    VALUES (?, 'claimed', NULL, 0, '{}', ?, ?, ?)
+                """, (business_date, now.isoformat(), now.isoformat(), site))
+            hub.commit()
+
+            if row is None or row[0] == site:
+                return None
+            return {'business_date': business_date, 'status': 'claimed_elsewhere', 'stats': json.loads(row[1] or '{}')}
+        except sqlite3.Error as e:
+            print(f"Error claiming end of day on the shared database: {str(e)}")
+            return unavailable
+        finally:
+            hub.close()
+
+    def _payments_chunk(self, cursor, business_date, cutoff, last_loan_id):
+        """Record the daily auto-payment for the next chunk of active loans"""
+        cursor.execute("""
+            SELECT loan_id, payment_per_day FROM loans
+            WHERE status = 'Active' AND loan_id > ?
+            ORDER BY loan_id
+            LIMIT ?
+        """, (last_loan_id, self.chunk_size))
+        chunk = cursor.fetchall()
+        if not chunk:
+            return [], 0
+
+        first_id, last_id = chunk[0][0], chunk[-1][0]
+        cursor.execute("""
+            INSERT INTO payments (loan_id, date, amount, received_by, notes)
+            SELECT loan_id, ?, payment_per_day, 'System', 'Daily auto-payment'
+            FROM loans
+            WHERE status = 'Active' AND loan_id BETWEEN ? AND ?
+        """, (business_date, first_id, last_id))
+
+        cursor.execute("""
+            UPDATE loans
+            SET remaining_balance = MAX(0, remaining_balance - payment_per_day),
+                status = CASE WHEN remaining_balance - payment_per_day <= 0 THEN 'Paid' ELSE status END,
+                last_updated = CURRENT_TIMESTAMP
+            WHERE status = 'Active' AND loan_id BETWEEN ? AND ?
+        """, (first_id, last_id))
+
+        return [loan_id for loan_id, _ in chunk], sum(amount for _, amount in chunk)
+
+    def _cleanup_chunk(self, cursor, business_date, cutoff, last_loan_id):
+        """Archive the next chunk of paid loans older than the cutoff"""
+        archive.require_archive(cursor)
+        cursor.execute("""
+            SELECT loan_id FROM loans
+            WHERE status = 'Paid' AND last_updated < ? AND loan_id > ?
+            ORDER BY loan_id
+            LIMIT ?
+        """, (cutoff, last_loan_id, self.chunk_size))
+        loan_ids = [row[0] for row in cursor.fetchall()]
+        if not loan_ids:
+            return [], 0
+
+        archive.archive_loans(cursor, loan_ids)
+        return loan_ids, 0
+
+    def _snapshots_chunk(self, cursor, business_date, cutoff, last_loan_id):
+        """Checkpoint the balances of loans whose ledger moved since the last run"""
+        # One set-based pass over the new ledger entries; the next call finds none
+        return ledger.take_balance_snapshots(cursor, business_date), 0
+
+    def _advance(self, cursor, business_date, phase, last_loan_id, stats):
+        """Checkpoint progress inside the chunk's transaction"""
+        cursor.execute("""
+            UPDATE daily_runs
+            SET phase = ?, last_loan_id = ?, stats = ?, heartbeat = ?
+            WHERE business_date = ?
+        """, (phase, last_loan_id, json.dumps(stats), datetime.now().isoformat(), business_date))
+
+    def _finish(self, cursor, business_date, stats):
+        now = datetime.now().isoformat()
+        cursor.execute("""
+            UPDATE daily_runs
+            SET status = 'completed', phase = NULL, last_loan_id = 0,
+                stats = ?, heartbeat = ?, finished_at = ?
+            WHERE business_date = ?
+        """, (json.dumps(stats), now, now, business_date))
+
+    def _mark_failed(self, conn, business_date):
+        """Flag a run as failed so the next attempt resumes it immediately"""
+        try:
+            conn.execute(
+                "UPDATE daily_runs SET status = 'failed' WHERE business_date = ?",
+                (business_date,)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error marking end-of-day run as failed: {str(e)}")
+
+    @staticmethod
+    def _begin(conn):
+        """Open a write transaction, taking the lock up front"""
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
@@ -1,114 +1,584 @@
 import os
+import json
 import time
 import errno
+import socket
+import threading
 from typing import Optional
 
+from sql_metrics import LatencyHistogram
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:  # POSIX
+    msvcrt = None
+
+try:
+    import win32con
+    import win32file
+    import pywintypes
+except ImportError:  # pywin32 not installed (or not Windows)
+    win32file = None
+
+
+# The OS lock covers one byte far past the owner record, so the record stays
+# readable on Windows, where locked ranges cannot be read by other handles
+LOCK_OFFSET = 0x40000000
+
+# Errors meaning the filesystem (typically a network mount) has no byte-range locking
+_NO_LOCKING = {errno.ENOLCK, errno.EOPNOTSUPP, errno.ENOSYS, getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP)}
+
+HOSTNAME = socket.gethostname()
+
+
+class LockMetrics:
+    """Wait and hold times per lock file, plus contention, timeout and stale-break counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def _entry(self, name):
+        entry = self._locks.get(name)
+        if entry is None:
+            entry = self._locks[name] = {
+                'wait': LatencyHistogram(),
+                'hold': LatencyHistogram(),
+                'contended': 0,
+                'timeouts': 0,
+                'stale_breaks': 0,
+            }
+        return entry
+
+    def record_wait(self, name, seconds, acquired, contended):
+        with self._lock:
+            entry = self._entry(name)
+            if acquired:
+                entry['wait'].add(seconds * 1000.0)
+            else:
+                entry['timeouts'] += 1
+            if contended:
+                entry['contended'] += 1
+
+    def record_hold(self, name, seconds):
+        with self._lock:
+            self._entry(name)['hold'].add(seconds * 1000.0)
+
+    def record_stale_break(self, name):
+        with self._lock:
+            self._entry(name)['stale_breaks'] += 1
+
+    def snapshot(self):
+        """
+        Get the statistics collected so far.
+
+        Returns:
+            dict: lock file -> {'wait': summary, 'hold': summary, 'contended',
+                  'timeouts', 'stale_breaks'}, where a summary has count,
+                  total/avg/p50/p95/max ms and bucket counts
+        """
+        with self._lock:
+            return {
+                name: {
+                    'wait': entry['wait'].summary(),
+                    'hold': entry['hold'].summary(),
+                    'contended': entry['contended'],
+                    'timeouts': entry['timeouts'],
+                    'stale_breaks': entry['stale_breaks'],
+                }
+                for name, entry in self._locks.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._locks.clear()
+
+
+# Shared by every FileLock in the process
+lock_metrics = LockMetrics()
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5  # Access denied: it exists
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists but belongs to someone else (or Windows refused the check)
+    return True
+
+
+def read_owner(lock_file: str) -> Optional[dict]:
+    """The owner record of a lock file (host, pid, mode, acquired, lease_until), or None"""
+    try:
+        with open(lock_file, 'r', encoding='utf-8') as f:
+            data = f.read(4096).strip('\0 \n')
+        return json.loads(data) if data else None
+    except (OSError, ValueError):
+        return None
+
+
+def owner_is_stale(owner: Optional[dict], now: Optional[float] = None) -> bool:
+    """
+    Whether an owner record no longer stands for a live holder.
+
+    A holder on this machine is stale once its process has gone. A holder
+    on another machine can't be checked, so it is stale once its lease
+    has run out without being renewed.
+    """
+    if not owner:
+        return False
+    if owner.get('host') == HOSTNAME and isinstance(owner.get('pid'), int):
+        return not _pid_alive(owner['pid'])
+    return (now or time.time()) > owner.get('lease_until', float('inf'))
+
+
+class _OsLock:
+    """
+    A byte-range lock on one file, shared by every FileLock on it in this process.
+
+    POSIX record locks belong to the process and vanish when any of its
+    descriptors for the file closes, so one descriptor per file is kept
+    here and the FileLocks in this process are coordinated on a condition:
+    any number of shared holders or a single exclusive one, with waiting
+    exclusive holders served before new shared ones so writers aren't
+    starved. Only the first holder of a group takes the OS lock and the last
+    one releases it.
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, path):
+        key = os.path.normcase(os.path.abspath(path))
+        with cls._registry_lock:
+            lock = cls._registry.get(key)
+            if lock is None:
+                lock = cls._registry[key] = cls(path)
+            return lock
+
+    def __init__(self, path):
+        self.path = path
+        self._cond = threading.Condition()
+        self._fd = None
+        self._handle = None
+        self._shared = 0
+        self._exclusive = False
+        self._writers_waiting = 0
+        self._busy = False  # An OS acquisition (possibly abandoned) is in flight
+
+    def acquire(self, shared: bool, deadline: Optional[float]) -> tuple:
+        """
+        Take the lock in the given mode.
+
+        Returns:
+            tuple: (acquired, contended)
+        """
+        contended = False
+        with self._cond:
+            if not shared:
+                self._writers_waiting += 1
+            try:
+                while True:
+                    if shared and self._shared and not self._writers_waiting and not self._busy:
+                        self._shared += 1  # Join the readers already holding the OS lock
+                        return True, contended
+                    if not self._shared and not self._exclusive and not self._busy:
+                        break
+                    contended = True
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False, contended
+                    self._cond.wait(remaining)
+                self._busy = True
+            finally:
+                if not shared:
+                    self._writers_waiting -= 1
+
+        try:
+            acquired, waited, abandoned = self._acquire_os(shared, deadline)
+        except OSError:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            if not abandoned:
+                self._busy = False
+            if acquired:
+                if shared:
+                    self._shared += 1
+                else:
+                    self._exclusive = True
+            self._cond.notify_all()
+        return acquired, contended or waited
+
+    def release(self, shared: bool):
+        with self._cond:
+            if shared:
+                self._shared -= 1
+                last = self._shared == 0
+            else:
+                self._exclusive = False
+                last = True
+            if last:
+                self._unlock_os()
+            self._cond.notify_all()
+
+    def write_owner(self, record: Optional[dict]):
+        """Overwrite the owner record at the start of the file (None clears it)"""
+        data = json.dumps(record).encode('utf-8') if record else b''
+        try:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            os.write(self._fd, data.ljust(512, b' ') if data else b' ' * 512)
+        except OSError as e:
+            print(f"Error writing lock owner: {str(e)}")
+
+    def _open(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            if win32file is not None and msvcrt is not None:
+                self._handle = msvcrt.get_osfhandle(self._fd)
+
+    def _try_os(self, shared: bool, blocking: bool) -> bool:
+        """One lock attempt; blocking waits in the OS queue instead of polling"""
+        if fcntl is not None:
+            flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+            try:
+                fcntl.lockf(self._fd, flags, 1, LOCK_OFFSET, os.SEEK_SET)
+                return True
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    return False
+                raise
+
+        if win32file is not None:
+            flags = 0 if shared else win32con.LOCKFILE_EXCLUSIVE_LOCK
+            if not blocking:
+                flags |= win32con.LOCKFILE_FAIL_IMMEDIATELY
+            overlapped = pywintypes.OVERLAPPED()
+            overlapped.Offset = LOCK_OFFSET
+            try:
+                win32file.LockFileEx(self._handle, flags, 1, 0, overlapped)
+                return True
+            except pywintypes.error:
+                return False
+
+        # msvcrt only has exclusive locks, and its "blocking" mode gives up after 10 s
+        os.lseek(self._fd, LOCK_OFFSET, os.SEEK_SET)
+        try:
+            msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if blocking:
+                time.sleep(0.05)
+            return False
+
+    def _acquire_os(self, shared: bool, deadline: Optional[float]) -> tuple:
+        """
+        Take the OS lock, waiting until the deadline.
+
+        The wait is a blocking lock call on a helper thread, so the OS hands
+        the lock over as soon as it is free rather than when a poll happens
+        to notice. If the deadline passes first the helper is abandoned; it
+        drops the lock if it gets it later, and clears _busy when it ends
+        (until then other FileLocks in this process wait for it).
+
+        Returns:
+            tuple: (acquired, had to wait, helper abandoned)
+        """
+        self._open()
+        if self._try_os(shared, blocking=False):
+            return True, False, False
+
+        if deadline is not None and deadline <= time.monotonic():
+            return False, True, False
+
+        state = {'acquired': False, 'abandoned': False, 'error': None}
+        done = threading.Event()
+
+        def wait_for_lock():
+            got = False
+            try:
+                while True:
+                    if self._try_os(shared, blocking=True):
+                        got = True
+                        break
+                    with self._cond:
+                        if state['abandoned']:
+                            break
+            except OSError as e:
+                state['error'] = e
+            with self._cond:
+                if state['abandoned']:
+                    if got:
+                        self._unlock_os()
+                    self._busy = False
+                    self._cond.notify_all()
+                else:
+                    state['acquired'] = got
+                done.set()
+
+        helper = threading.Thread(target=wait_for_lock, name="file-lock-wait", daemon=True)
+        helper.start()
+        done.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+        with self._cond:
+            if not done.is_set():
+                state['abandoned'] = True
+                return False, True, True
+        if state['error'] is not None:
+            raise state['error']
+        return state['acquired'], True, False
+
+    def _unlock_os(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, LOCK_OFFSET, os.SEEK_SET)
+            elif win32file is not None:
+                overlapped = pywintypes.OVERLAPPED()
+                overlapped.Offset = LOCK_OFFSET
+                win32file.UnlockFileEx(self._handle, 1, 0, overlapped)
+            else:
+                os.lseek(self._fd, LOCK_OFFSET, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        except Exception:
+            pass
+
 
 class FileLock:
     """
-    A simple file-based lock implementation with timeout support.
+    A cross-process (and cross-machine, on a share) reader/writer lock.
+
+    By default this is an OS byte-range lock on the lock file: fcntl.lockf
+    on POSIX, LockFileEx on Windows (msvcrt.locking without pywin32, which
+    only has exclusive locks). Waiters block in the OS rather than polling,
+    any number of shared holders can hold the lock together, and the OS
+    drops the lock if its holder dies. The holder's host, PID and lease are
+    written into the lock file so a waiter that times out can say who has it.
+
+    On filesystems without byte-range locking (some network mounts) it falls
+    back to an exclusively created lock file. A lock file whose owner is a
+    dead process on this machine, or whose lease on another machine has run
+    out, is broken as stale. Holders of this kind of lock that keep it longer
+    than the lease should call renew().
 
-    This class provides a cross-process locking mechanism using lock files.
     It supports context manager protocol for easy use with 'with' statements.
 
     Args:
         filename (str): Base filename to use for the lock
-        timeout (float): Maximum time to wait for the lock (in seconds)
-        delay (float): Delay between lock acquisition attempts (in seconds)
-        pid_aware (bool): Whether to include process ID in lock file
+        timeout (float): Maximum time to wait for the lock (in seconds, None to wait forever)
+        delay (float): First delay between attempts of the lock-file fallback (in seconds)
+        pid_aware (bool): Whether to include process ID in the owner record
+        shared (bool): Take a shared (reader) lock instead of an exclusive one
+        lease (float): Seconds the owner record vouches for the holder on other machines
+        method (str): 'auto', 'os' (byte-range lock) or 'file' (lock file)
     """
 
-    def __init__(self, filename: str, timeout: float = 10.0, delay: float = 0.1, pid_aware: bool = True):
+    def __init__(self, filename: str, timeout: Optional[float] = 10.0, delay: float = 0.1, pid_aware: bool = True,
+                 shared: bool = False, lease: float = 60.0, method: str = 'auto'):
         self.lock_file = f"{filename}.lock"
         self.timeout = timeout
         self.delay = delay
         self.pid_aware = pid_aware
+        self.shared = shared
+        self.lease = lease
+        self.method = method
         self.fd: Optional[int] = None
         self._locked = False
+        self._locked_with = None  # 'os' or 'file'
+        self._acquired_at = None
 
-    def acquire(self) -> bool:
+        if method == 'auto' and fcntl is None and msvcrt is None:
+            self.method = 'file'
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
         """
-        Acquire the lock by creating a lock file.
+        Acquire the lock, waiting up to the timeout (self.timeout by default).
 
         Returns:
             bool: True if lock was acquired, False if timeout occurred
         """
-        start_time = time.time()
+        if self._locked:
+            return True
+
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+
+        acquired, contended = False, False
+        if self.method in ('auto', 'os'):
+            try:
+                acquired, contended = _OsLock.for_path(self.lock_file).acquire(self.shared, deadline)
+                if acquired:
+                    self._locked_with = 'os'
+                    if not self.shared:
+                        _OsLock.for_path(self.lock_file).write_owner(self._owner_record())
+            except OSError as e:
+                if self.method == 'os' or e.errno not in _NO_LOCKING:
+                    raise
+                self.method = 'file'  # No byte-range locks here; remember for next time
+
+        if self.method == 'file':
+            acquired, contended = self._acquire_file(deadline)
+            if acquired:
+                self._locked_with = 'file'
+
+        lock_metrics.record_wait(self.lock_file, time.monotonic() - started, acquired, contended)
+        if acquired:
+            self._locked = True
+            self._acquired_at = time.monotonic()
+        return acquired
+
+    def release(self) -> None:
+        """Release the lock."""
+        if not self._locked:
+            return
+
+        try:
+            if self._locked_with == 'os':
+                os_lock = _OsLock.for_path(self.lock_file)
+                if not self.shared:
+                    os_lock.write_owner(None)
+                os_lock.release(self.shared)
+            else:
+                if self.fd is not None:
+                    os.close(self.fd)
+                os.unlink(self._file_path)
+        except OSError:
+            pass
+        finally:
+            lock_metrics.record_hold(self.lock_file, time.monotonic() - self._acquired_at)
+            self.fd = None
+            self._locked = False
+            self._locked_with = None
+
+    def renew(self) -> None:
+        """Extend the lease in the owner record, for holders that keep the lock a long time"""
+        if not self._locked:
+            return
+        if self._locked_with == 'os':
+            if not self.shared:
+                _OsLock.for_path(self.lock_file).write_owner(self._owner_record())
+        elif self.fd is not None:
+            self._write_file_owner()
+
+    def owner(self) -> Optional[dict]:
+        """The current holder's owner record, if one was written (exclusive holders only)"""
+        return read_owner(self._file_path if self.method == 'file' else self.lock_file)
+
+    @property
+    def _file_path(self) -> str:
+        # Kept apart from the byte-range lock file, which is never removed
+        return f"{self.lock_file}.excl"
+
+    def _owner_record(self) -> dict:
+        now = time.time()
+        record = {
+            'host': HOSTNAME,
+            'mode': 'shared' if self.shared else 'exclusive',
+            'acquired': now,
+            'lease_until': now + self.lease,
+        }
+        if self.pid_aware:
+            record['pid'] = os.getpid()
+        return record
+
+    def _write_file_owner(self) -> None:
+        data = json.dumps(self._owner_record()).encode('utf-8')
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        os.ftruncate(self.fd, 0)
+        os.write(self.fd, data)
+        os.fsync(self.fd)
+
+    def _acquire_file(self, deadline: Optional[float]) -> tuple:
+        """
+        Acquire the lock-file fallback (always exclusive).
+
+        There is nothing to block on, so waiters poll, backing off from
+        `delay` to one second.
+
+        Returns:
+            tuple: (acquired, contended)
+        """
+        contended = False
+        delay = self.delay
 
         while True:
             try:
                 # Try to create the lock file exclusively
                 self.fd = os.open(
-                    self.lock_file,
+                    self._file_path,
                     os.O_CREAT | os.O_EXCL | os.O_RDWR,
                     0o644  # Set permissions (rw-r--r--)
                 )
-
-                if self.pid_aware:
-                    # Write current PID to lock file
-                    os.write(self.fd, str(os.getpid()).encode())
-
-                self._locked = True
-                return True
+                self._write_file_owner()
+                return True, contended
 
             except OSError as e:
                 if e.errno != errno.EEXIST:  # Only handle "file exists" error
                     raise
 
-                # Check if lock is stale (process that created it no longer exists)
+                contended = True
+
+                # Check if lock is stale (owner process gone, or lease expired on another host)
                 if self._is_stale():
                     self._break_lock()
                     continue
 
                 # Check timeout
-                if time.time() - start_time >= self.timeout:
-                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False, contended
 
                 # Wait before retrying
-                time.sleep(self.delay)
-
-    def release(self) -> None:
-        """Release the lock by removing the lock file."""
-        if not self._locked:
-            return
-
-        try:
-            if self.fd is not None:
-                os.close(self.fd)
-            os.unlink(self.lock_file)
-        except OSError:
-            pass
-        finally:
-            self.fd = None
-            self._locked = False
+                time.sleep(delay if remaining is None else min(delay, remaining))
+                delay = min(delay * 2, 1.0)
 
     def _is_stale(self) -> bool:
-        """Check if the lock file is stale (owner process no longer exists)."""
-        try:
-            with open(self.lock_file, 'r') as f:
-                pid_str = f.read().strip()
-
-            if pid_str and pid_str.isdigit():
-                pid = int(pid_str)
-                try:
-                    os.kill(pid, 0)  # Check if process exists
-                    return False
-                except OSError:
-                    return True  # Process doesn't exist
-        except (IOError, ValueError):
-            pass
-
-        return False
+        """Check if the lock file is stale (owner gone or lease expired)."""
+        owner = read_owner(self._file_path)
+        if owner is None:
+            # Being written right now, or unreadable; judge by age instead
+            try:
+                return time.time() - os.path.getmtime(self._file_path) > self.lease
+            except OSError:
+                return False
+        return owner_is_stale(owner)
 
     def _break_lock(self) -> None:
         """Forcefully remove a stale lock file."""
         try:
-            os.unlink(self.lock_file)
+            os.unlink(self._file_path)
+            lock_metrics.record_stale_break(self.lock_file)
         except OSError:
             pass
 
     def __enter__(self):
-        self.acquire()
+        if not self.acquire():
+            owner = self.owner()
+            held_by = f" (held by {owner.get('host')} pid {owner.get('pid')})" if owner else ""
+            raise TimeoutError(f"Could not lock {self.lock_file} within {self.timeout}s{held_by}")
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -120,5 +590,9 @@ class FileLock:
         return self._locked
 
     def __del__(self):
-        """Clean up lock file when object is garbage collected."""
-        self.release()
\ No newline at end of file
+        """Release the lock when object is garbage collected."""
+        try:
+            self.release()
+        except Exception:
+            # Interpreter shutdown - the OS drops the lock with the process anyway
+            pass
@@ -0,0 +1,416 @@
+from day_numbers import TODAY_SQL, to_day_number
+from money import Money
+
+
+# Ledger entry kinds. Any other change to remaining_balance is an adjustment.
+KIND_DISBURSEMENT = 'disbursement'
+KIND_PAYMENT = 'payment'
+KIND_ADJUSTMENT = 'adjustment'
+
+
+def create_ledger_tables(cursor):
+    """
+    Create the balance ledger, its snapshot table and the pause switch.
+
+    loan_ledger is append-only: one row per change to a loan's balance, with
+    the signed change in cents and the day it took effect. Entries are dated
+    by their event (the loan's start date, the payment's date), so they are
+    not recorded in day order; a loan's balance at the end of any day is the
+    sum of its entries dated up to that day. balance_snapshots checkpoints
+    those sums. An entry dated before a loan's checkpoint drops that
+    checkpoint, so the entries a checkpoint did not count are always those
+    on its day after its entry plus those on later days - two short index
+    ranges.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS loan_ledger (
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            loan_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            recorded_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Serves a loan's entries by day range, and on one day after a given entry
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loan_ledger_loan_day ON loan_ledger (loan_id, day, entry_id)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS balance_snapshots (
+            loan_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            entry_id INTEGER NOT NULL,
+            PRIMARY KEY (loan_id, day)
+        ) WITHOUT ROWID
+    """)
+
+    # Set while balances are rewritten from the ledger itself
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ledger_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            paused INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO ledger_state (id, paused) VALUES (1, 0)")
+
+
+# Lower than any day number, for "every day" when a loan has no snapshot
+_BEFORE_ANY_DAY = -(2 ** 31)
+
+_NOT_PAUSED_SQL = "(SELECT paused FROM ledger_state WHERE id = 1) = 0"
+
+
+def _ledger_total_sql(loan_id):
+    """
+    SQL for the sum of all of a loan's entries, from its latest snapshot.
+
+    Adds the entries after the snapshot on its day and those on later days
+    (see create_ledger_tables), so it reads a short tail, not the whole ledger.
+    """
+    latest = f"FROM balance_snapshots WHERE loan_id = {loan_id} ORDER BY day DESC LIMIT 1"
+    return f"""(
+        COALESCE((SELECT balance {latest}), 0)
+        + COALESCE((
+            SELECT SUM(amount) FROM loan_ledger
+            WHERE loan_id = {loan_id} AND day = (SELECT day {latest}) AND entry_id > (SELECT entry_id {latest})
+        ), 0)
+        + COALESCE((
+            SELECT SUM(amount) FROM loan_ledger
+            WHERE loan_id = {loan_id} AND day > COALESCE((SELECT day {latest}), {_BEFORE_ANY_DAY})
+        ), 0)
+    )"""
+
+
+# Today's adjustment for whatever the entries do not explain. The LIMIT keeps
+# SQLite from copying the drift expression into the WHERE, so it is computed once.
+_ADJUSTMENT_SQL = f"""
+    INSERT INTO loan_ledger (loan_id, day, kind, amount)
+    SELECT new.loan_id, {TODAY_SQL}, '{KIND_ADJUSTMENT}', d.drift
+    FROM (SELECT new.remaining_balance - {_ledger_total_sql('new.loan_id')} AS drift LIMIT 1) d
+    WHERE d.drift != 0 AND {_NOT_PAUSED_SQL};
+"""
+
+
+def create_ledger_triggers(cursor):
+    """
+    Append ledger entries as loans are disbursed, paid and adjusted.
+
+    A new loan is disbursed on its start date and a payment counts on its
+    payment date. Any change to remaining_balance those entries do not
+    already explain (edits, a payment capped at the balance) is recorded as
+    today's adjustment. Every code path that touches remaining_balance is
+    recorded without having to remember to write the entry itself, as long
+    as it inserts a payment before lowering the balance for it.
+    """
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ledger_loan_insert
+        AFTER INSERT ON loans
+        BEGIN
+            INSERT INTO loan_ledger (loan_id, day, kind, amount)
+            VALUES (new.loan_id, COALESCE(new.start_day, {TODAY_SQL}), '{KIND_DISBURSEMENT}', new.total_to_repay);
+            {_ADJUSTMENT_SQL}
+        END
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ledger_payment_insert
+        AFTER INSERT ON payments
+        BEGIN
+            INSERT INTO loan_ledger (loan_id, day, kind, amount)
+            VALUES (new.loan_id, COALESCE(new.day, {TODAY_SQL}), '{KIND_PAYMENT}', -new.amount);
+        END
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ledger_balance_update
+        AFTER UPDATE OF remaining_balance ON loans
+        WHEN new.remaining_balance IS NOT old.remaining_balance
+         AND {_NOT_PAUSED_SQL}
+        BEGIN
+            {_ADJUSTMENT_SQL}
+        END
+    """)
+
+    # A backdated entry changes every later checkpoint of its loan
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_ledger_backdated
+        AFTER INSERT ON loan_ledger
+        BEGIN
+            DELETE FROM balance_snapshots WHERE loan_id = new.loan_id AND day > new.day;
+        END
+    """)
+
+
+def drop_ledger_triggers(cursor):
+    """Drop the ledger triggers, so create_ledger_triggers() can replace them"""
+    for trigger in ('trg_ledger_loan_insert', 'trg_ledger_payment_insert', 'trg_ledger_balance_update',
+                    'trg_ledger_backdated'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+
+def set_paused(cursor, paused):
+    """
+    Stop or resume recording adjustments for balance writes.
+
+    Disbursements and payments are still recorded while paused; call
+    reconcile_loans() afterwards for whatever the writes left unexplained.
+    """
+    cursor.execute("UPDATE ledger_state SET paused = ? WHERE id = 1", (1 if paused else 0,))
+
+
+def reconcile_loans(cursor, loan_ids):
+    """
+    Record today's adjustment for each loan whose balance its entries do not add up to.
+
+    Used after writes made with the ledger paused, where rows arrive in an
+    order the triggers cannot follow (a sync writes loans before their payments).
+
+    Returns:
+        int: Number of adjustments recorded
+    """
+    loan_ids = sorted(set(loan_ids))
+    recorded = 0
+    for start in range(0, len(loan_ids), 500):
+        batch = loan_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(batch))
+        cursor.execute(f"""
+            INSERT INTO loan_ledger (loan_id, day, kind, amount)
+            SELECT loan_id, {TODAY_SQL}, '{KIND_ADJUSTMENT}', drift
+            FROM (
+                SELECT l.loan_id, l.remaining_balance - {_ledger_total_sql('l.loan_id')} AS drift
+                FROM loans l
+                WHERE l.loan_id IN ({placeholders})
+            )
+            WHERE drift != 0
+            ORDER BY loan_id
+        """, batch)
+        recorded += cursor.rowcount
+    return recorded
+
+
+def backfill_ledger(cursor):
+    """
+    Seed the ledger for loans that existed before it.
+
+    Each loan gets its disbursement on the start date and one entry per
+    payment on the payment date. Where those do not add up to the current
+    balance (earlier edits reset balances in place), today's adjustment
+    makes up the difference.
+    """
+    cursor.execute(f"""
+        INSERT INTO loan_ledger (loan_id, day, kind, amount)
+        SELECT loan_id, day, kind, amount FROM (
+            SELECT loan_id, COALESCE(start_day, {TODAY_SQL}) AS day, 0 AS seq,
+                   '{KIND_DISBURSEMENT}' AS kind, total_to_repay AS amount, 0 AS payment_id
+            FROM loans
+            UNION ALL
+            SELECT p.loan_id, COALESCE(p.day, l.start_day, {TODAY_SQL}), 1,
+                   '{KIND_PAYMENT}', -p.amount, p.payment_id
+            FROM payments p JOIN loans l ON l.loan_id = p.loan_id
+        )
+        ORDER BY day, seq, payment_id
+    """)
+
+    cursor.execute(f"""
+        INSERT INTO loan_ledger (loan_id, day, kind, amount)
+        SELECT l.loan_id, {TODAY_SQL}, '{KIND_ADJUSTMENT}', l.remaining_balance - b.balance
+        FROM loans l
+        JOIN (SELECT loan_id, SUM(amount) AS balance FROM loan_ledger GROUP BY loan_id) b
+          ON b.loan_id = l.loan_id
+        WHERE l.remaining_balance != b.balance
+        ORDER BY l.loan_id
+    """)
+
+
+def take_balance_snapshots(cursor, as_of_date=None):
+    """
+    Checkpoint the balance of every loan with ledger entries since the last snapshot.
+
+    Only loans with new entries are read, so the cost follows the day's
+    activity rather than the size of the ledger. A snapshot counts the
+    entries recorded so far that are dated up to its day; entries recorded
+    later on that day, or dated after it, are left for balance_at() to add.
+
+    Args:
+        cursor: Database cursor
+        as_of_date: Date, YYYY-MM-DD string or day number to checkpoint (default today)
+
+    Returns:
+        list: loan_ids that got a new snapshot, in order
+    """
+    day = as_of_date if isinstance(as_of_date, int) else to_day_number(as_of_date)
+
+    cursor.execute("SELECT COALESCE(MAX(entry_id), 0) FROM balance_snapshots")
+    watermark = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(entry_id), 0) FROM loan_ledger")
+    last_entry = cursor.fetchone()[0]
+
+    # Loans with nothing dated by the day yet (a loan starting later) wait for a later run
+    active = """
+        SELECT DISTINCT n.loan_id FROM loan_ledger n
+        WHERE n.entry_id > :watermark
+          AND EXISTS (SELECT 1 FROM loan_ledger e WHERE e.loan_id = n.loan_id AND e.day <= :day)
+    """
+    params = {'watermark': watermark, 'day': day, 'last_entry': last_entry, 'before_any': _BEFORE_ANY_DAY}
+
+    cursor.execute(f"{active} ORDER BY n.loan_id", params)
+    loan_ids = [row[0] for row in cursor.fetchall()]
+    if not loan_ids:
+        return []
+
+    # Start from each loan's latest snapshot by the day and add what it did not count
+    cursor.execute(f"""
+        INSERT OR REPLACE INTO balance_snapshots (loan_id, day, balance, entry_id)
+        SELECT
+            a.loan_id, :day,
+            COALESCE(s.balance, 0)
+            + COALESCE((
+                SELECT SUM(e.amount) FROM loan_ledger e
+                WHERE e.loan_id = a.loan_id AND e.day = s.day AND e.entry_id > s.entry_id
+            ), 0)
+            + COALESCE((
+                SELECT SUM(e.amount) FROM loan_ledger e
+                WHERE e.loan_id = a.loan_id AND e.day > COALESCE(s.day, :before_any) AND e.day <= :day
+            ), 0),
+            :last_entry
+        FROM ({active}) a
+        LEFT JOIN balance_snapshots s
+          ON s.loan_id = a.loan_id
+         AND s.day = (SELECT MAX(day) FROM balance_snapshots WHERE loan_id = a.loan_id AND day <= :day)
+    """, params)
+
+    return loan_ids
+
+
+def forget_loans(cursor, loan_ids):
+    """
+    Drop the history of deleted loans before their ids are used again.
+
+    A sync can bring back a loan this database deleted (or reuse its id);
+    the new row's disbursement must not be added to the old loan's entries.
+    """
+    loan_ids = list(loan_ids)
+    for start in range(0, len(loan_ids), 500):
+        batch = loan_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(batch))
+        cursor.execute(f"DELETE FROM balance_snapshots WHERE loan_id IN ({placeholders})", batch)
+        cursor.execute(f"DELETE FROM loan_ledger WHERE loan_id IN ({placeholders})", batch)
+
+
+def balance_at(cursor, loan_id, as_of_date=None):
+    """
+    Reconstruct a loan's balance at the end of a day.
+
+    One snapshot lookup plus two short index ranges for the entries it did
+    not count: those recorded after it on its day, and those dated after it.
+
+    Args:
+        cursor: Database cursor
+        loan_id (int): The loan
+        as_of_date: Date, YYYY-MM-DD string or day number (default today)
+
+    Returns:
+        Money: The balance, or None if the loan has no entries by that day
+    """
+    day = as_of_date if isinstance(as_of_date, int) else to_day_number(as_of_date)
+
+    cursor.execute("""
+        SELECT balance, entry_id, day FROM balance_snapshots
+        WHERE loan_id = ? AND day <= ?
+        ORDER BY day DESC LIMIT 1
+    """, (loan_id, day))
+    snapshot = cursor.fetchone()
+    if snapshot is None:
+        cursor.execute("""
+            SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM loan_ledger
+            WHERE loan_id = ? AND day <= ?
+        """, (loan_id, day))
+        count, total = cursor.fetchone()
+        return Money(total) if count else None
+
+    balance, after_entry, snapshot_day = snapshot
+    cursor.execute("""
+        SELECT
+            COALESCE((
+                SELECT SUM(amount) FROM loan_ledger
+                WHERE loan_id = :loan AND day = :snapshot_day AND entry_id > :after_entry
+            ), 0)
+            + COALESCE((
+                SELECT SUM(amount) FROM loan_ledger
+                WHERE loan_id = :loan AND day > :snapshot_day AND day <= :day
+            ), 0)
+    """, {'loan': loan_id, 'snapshot_day': snapshot_day, 'after_entry': after_entry, 'day': day})
+    return Money(balance + cursor.fetchone()[0])
+
+
+def get_ledger(cursor, loan_id):
+    """Get a loan's ledger entries in day order, with the running balance after each"""
+    cursor.execute("""
+        SELECT entry_id, day, kind, amount,
+               SUM(amount) OVER (ORDER BY day, entry_id) AS balance_after,
+               recorded_at
+        FROM loan_ledger
+        WHERE loan_id = ?
+        ORDER BY day, entry_id
+    """, (loan_id,))
+    return cursor.fetchall()
+
+
+def _ledger_drift(cursor):
+    """Loans whose stored balance differs from the ledger, in one grouped pass"""
+    cursor.execute("""
+        SELECT l.loan_id, l.remaining_balance, COALESCE(b.balance, 0)
+        FROM loans l
+        LEFT JOIN (
+            SELECT loan_id, SUM(amount) AS balance FROM loan_ledger GROUP BY loan_id
+        ) b ON b.loan_id = l.loan_id
+        WHERE l.remaining_balance != COALESCE(b.balance, 0)
+        ORDER BY l.loan_id
+    """)
+    return cursor.fetchall()
+
+
+def rebuild_balances(cursor):
+    """
+    Rewrite every loan's remaining_balance from the ledger.
+
+    The ledger is paused while doing so, since these writes restore the
+    ledger's own figures rather than change them.
+
+    Returns:
+        int: Number of loans whose balance was corrected
+    """
+    drifted = _ledger_drift(cursor)
+    if not drifted:
+        return 0
+
+    set_paused(cursor, True)
+    try:
+        cursor.executemany(
+            "UPDATE loans SET remaining_balance = ? WHERE loan_id = ?",
+            [(ledger_balance, loan_id) for loan_id, _, ledger_balance in drifted]
+        )
+    finally:
+        set_paused(cursor, False)
+
+    return len(drifted)
+
+
+def verify_ledger(cursor, repair=False):
+    """
+    Compare stored balances with the balances the ledger adds up to.
+
+    Args:
+        cursor: Database cursor
+        repair (bool): Rewrite drifted balances from the ledger
+
+    Returns:
+        dict: {loan_id: (stored, ledger)} for every loan that drifted
+    """
+    drift = {loan_id: (stored, ledger_balance) for loan_id, stored, ledger_balance in _ledger_drift(cursor)}
+
+    if drift and repair:
+        rebuild_balances(cursor)
+
+    return drift
@@ -6,18 +6,45 @@ import os
 
 import pandas as pd
 from fpdf import FPDF
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from money import Money
+from day_numbers import to_day_number
 
 
 
 
 class LoanDetailWindow(ctk.CTkToplevel):
+    """
+    One loan's details, payment history and payment summary.
+
+    The loan, its payment totals and the first page of payments are
+    loaded once, on the parent's background executor, into attributes the
+    tabs share (loan_data, payment_stats, payments_df). Each tab is built
+    the first time it is selected, and the payment history loads further
+    pages on request.
+    """
+
+    # Payments shown per page in the Payment History tab
+    PAYMENT_PAGE_SIZE = 50
+
+    HISTORY_HEADERS = ["ID", "Date", "Amount", "Received By", "Notes"]
+    HISTORY_WIDTHS = [50, 120, 100, 150, 250]
+
     def __init__(self, parent, loan_id, user_system):
         super().__init__(parent)
         self.parent = parent
         self.loan_id = loan_id
         self.user_system = user_system
         self.current_user = parent.current_user
+        self.executor = parent.executor
+
+        self.loan_data = None
+        self.payment_stats = None
+        self.payments_df = pd.DataFrame()  # The pages loaded so far, newest first
+        self._payments_cursor = None
+        self.notebook = None
+        self._built_tabs = set()
 
         # Configure window
         self.title(f"Loan Details - ID {loan_id}")
@@ -26,25 +53,15 @@ class LoanDetailWindow(ctk.CTkToplevel):
         self.after(100, lambda: self.wm_state('zoomed'))
 
         # Create main container
-        self.container = ctk.CTkFrame(self)
-        self.container.pack(pady=20, padx=20, fill="both", expand=True)
-
-        # Load loan data - using the proper file path method
-        self.loan_data, self.payments_df = self._load_loan_details()
-        if not self.loan_data:
-            self.destroy()
-            return
-
-
-        # Initialize UI
         self._setup_container()
-        self._create_ui()
+        self._loading_label = ctk.CTkLabel(self.container, text="Loading loan...", text_color="gray70")
+        self._loading_label.pack(pady=40)
 
         # Prevent multiple instances
         self.transient(parent)
         self.grab_set()
 
-        # Load data and build UI
+        # Load data, then build the UI
         self.refresh_data()
 
     def _setup_history_tab(self):
@@ -109,21 +126,18 @@ class LoanDetailWindow(ctk.CTkToplevel):
         history_card.pack(fill="both", expand=True, padx=10, pady=10)
 
         # History scrollable area
-        scroll_frame = ctk.CTkScrollableFrame(history_card, fg_color="transparent")
-        scroll_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.history_frame = ctk.CTkScrollableFrame(history_card, fg_color="transparent")
+        self.history_frame.pack(fill="both", expand=True, padx=10, pady=10)
 
         if self.payments_df.empty:
-            ctk.CTkLabel(scroll_frame, text="No payment history found").pack(pady=20)
+            ctk.CTkLabel(self.history_frame, text="No payment history found").pack(pady=20)
             return
 
         # Modern table header
-        header_frame = ctk.CTkFrame(scroll_frame, fg_color="#2c3e50", height=40)
+        header_frame = ctk.CTkFrame(self.history_frame, fg_color="#2c3e50", height=40)
         header_frame.pack(fill="x", pady=(0, 5))
 
-        headers = ["ID", "Date", "Amount", "Received By", "Notes"]
-        widths = [50, 120, 100, 150, 250]
-
-        for col, (header, width) in enumerate(zip(headers, widths)):
+        for col, (header, width) in enumerate(zip(self.HISTORY_HEADERS, self.HISTORY_WIDTHS)):
             ctk.CTkLabel(
                 header_frame,
                 text=header,
@@ -132,11 +146,34 @@ class LoanDetailWindow(ctk.CTkToplevel):
                 width=width
             ).grid(row=0, column=col, padx=5, sticky="w")
 
+        self._history_rows = 0
+        self._add_payment_rows(self.payments_df)
+
+        # Footer: how much of the history is shown, and a button for the next page
+        footer = ctk.CTkFrame(history_card, fg_color="transparent")
+        footer.pack(fill="x", padx=10, pady=(0, 10))
+
+        self.history_count_label = ctk.CTkLabel(footer, text="", text_color="gray70")
+        self.history_count_label.pack(side="left")
+
+        self.load_more_btn = ctk.CTkButton(
+            footer,
+            text="Load more",
+            command=self._load_more_payments,
+            width=120
+        )
+        self._update_history_footer()
+
+    def _add_payment_rows(self, payments):
+        """Add rows for a page of payments below those already shown"""
+        widths = self.HISTORY_WIDTHS
+
         # Payment rows with alternating colors
-        for row, (_, payment) in enumerate(self.payments_df.iterrows(), 1):
+        for _, payment in payments.iterrows():
+            self._history_rows += 1
             row_frame = ctk.CTkFrame(
-                scroll_frame,
-                fg_color="#f8f9fa" if row % 2 == 0 else "white",
+                self.history_frame,
+                fg_color="#f8f9fa" if self._history_rows % 2 == 0 else "white",
                 height=35
             )
             row_frame.pack(fill="x", pady=1)
@@ -158,7 +195,7 @@ class LoanDetailWindow(ctk.CTkToplevel):
             # Amount
             ctk.CTkLabel(
                 row_frame,
-                text=f"{float(payment['amount']):,.2f}",
+                text=f"{Money(payment['amount']):,.2f}",
                 width=widths[2],
                 anchor="e"
             ).grid(row=0, column=2, padx=5)
@@ -177,13 +214,51 @@ class LoanDetailWindow(ctk.CTkToplevel):
                 width=widths[4]
             ).grid(row=0, column=4, padx=5, sticky="w")
 
+    def _update_history_footer(self):
+        self.history_count_label.configure(
+            text=f"Showing {len(self.payments_df)} of {self.payment_stats['payment_count']} payments"
+        )
+        if self._payments_cursor is not None:
+            self.load_more_btn.configure(state="normal", text="Load more")
+            self.load_more_btn.pack(side="right")
+        else:
+            self.load_more_btn.pack_forget()
+
+    def _load_more_payments(self):
+        """Fetch the next page of payments in the background and add it to the history"""
+        if self._payments_cursor is None:
+            return
+        self.load_more_btn.configure(state="disabled", text="Loading...")
+
+        def on_done(result):
+            page, next_cursor = result
+            self.payments_df = pd.concat([self.payments_df, page], ignore_index=True)
+            self._payments_cursor = next_cursor
+            self._add_payment_rows(page)
+            self._update_history_footer()
+
+        def on_error(e):
+            self.load_more_btn.configure(state="normal", text="Load more")
+            messagebox.showerror("Error", f"Could not load more payments: {str(e)}")
+
+        self.executor.submit(
+            self.user_system.get_loan_payments,
+            self.loan_id,
+            after=self._payments_cursor,
+            limit=self.PAYMENT_PAGE_SIZE,
+            key='loan_payments',
+            owner=self.history_frame,
+            on_done=on_done,
+            on_error=on_error
+        )
+
     def _remove_payment(self):
         """Remove a payment from the loan"""
         try:
             payment_id = int(self.payment_id_entry.get())
 
-            # Find the payment to remove
-            payment_to_remove = self.payments_df[self.payments_df['payment_id'] == payment_id]
+            # Find the payment to remove (it may be on a page not loaded yet)
+            payment_to_remove = self.user_system.get_loan_payment(self.loan_id, payment_id)
             if payment_to_remove.empty:
                 messagebox.showerror("Error", "Payment ID not found")
                 return
@@ -231,10 +306,7 @@ class LoanDetailWindow(ctk.CTkToplevel):
                     payments_df.to_excel(writer, sheet_name='Payments', index=False)
 
                 # Refresh the view
-                self.loan_data, self.payments_df = self.user_system.get_loan_details(self.loan_id)
-                for widget in self.container.winfo_children():
-                    widget.destroy()
-                self._create_ui()
+                self.refresh_data()
 
                 messagebox.showinfo("Success", f"Payment ID {payment_id} removed successfully")
 
@@ -353,22 +425,17 @@ class LoanDetailWindow(ctk.CTkToplevel):
     def _settle_missed_payments(self, amount):
         """Handle settlement of missed payments with UI refresh"""
         try:
-            success, message, updated_loans = self.user_system.settle_missed_payments(self.loan_id, amount)
+            success, message, changes = self.user_system.settle_missed_payments(self.loan_id, amount)
 
             if success:
-                # Refresh all data
-                self.loan_data, self.payments_df = self.user_system.get_loan_details(self.loan_id)
-
-                # Refresh parent window if available
-                if hasattr(self.master, 'display_loans'):
-                    self.master.display_loans(updated_loans)
+                # Patch this loan's row in the parent's list
+                if hasattr(self.master, 'apply_loan_changes'):
+                    self.master.apply_loan_changes(changes)
                 if hasattr(self.master, '_refresh_loan_payments_tab'):
                     self.master._refresh_loan_payments_tab()
 
-                # Completely rebuild this window
-                for widget in self.container.winfo_children():
-                    widget.destroy()
-                self._create_ui()
+                # Reload this window's data and redraw the tab in view
+                self.refresh_data()
 
                 messagebox.showinfo("Success", f"Missed payments settled successfully!\n{message}")
             else:
@@ -396,15 +463,8 @@ class LoanDetailWindow(ctk.CTkToplevel):
         self.container.pack(pady=20, padx=20, fill="both", expand=True)
 
     def _create_ui(self):
-        """Build the UI components"""
+        """Build the buttons and the tab view; each tab is filled in when first selected"""
         try:
-            # Load loan data
-            self.loan_data, self.payments_df = self._load_loan_details()
-            if not self.loan_data:
-                self.destroy()
-                return
-
-            """Create all UI components"""
             # Top button frame
             button_frame = ctk.CTkFrame(self.container)
             button_frame.pack(fill="x", pady=(0, 10))
@@ -430,7 +490,7 @@ class LoanDetailWindow(ctk.CTkToplevel):
             print_history_btn.pack(side="left", padx=5)
 
             # Main content notebook
-            self.notebook = ctk.CTkTabview(self.container)
+            self.notebook = ctk.CTkTabview(self.container, command=self._build_selected_tab)
             self.notebook.pack(fill="both", expand=True)
 
             # Add tabs
@@ -438,42 +498,69 @@ class LoanDetailWindow(ctk.CTkToplevel):
             self.notebook.add("Payment History")
             self.notebook.add("Payment Summary")  # New tab
 
-            # Configure tabs
-            self._setup_details_tab()
-            self._setup_history_tab()
-            self._setup_summary_tab()  # New method for summary tab
+            self._build_selected_tab()
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to create UI: {str(e)}")
             self.destroy()
 
+    def _build_selected_tab(self):
+        """Build the selected tab if it hasn't been built since the data was loaded"""
+        name = self.notebook.get()
+        if name in self._built_tabs:
+            return
+        self._built_tabs.add(name)
+
+        builders = {
+            "Loan Details": self._setup_details_tab,
+            "Payment History": self._setup_history_tab,
+            "Payment Summary": self._setup_summary_tab,
+        }
+        builders[name]()
+
     def _load_loan_details(self):
-        """Safely load loan details"""
-        try:
-            return self.user_system.get_loan_details(self.loan_id)
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not load loan details: {str(e)}")
-            return None, None
-
-    def refresh_data(self, updated_loan=None):
-        """Refresh all data and UI"""
-        # Clear existing widgets
-        for widget in self.container.winfo_children():
-            widget.destroy()
-
-        # Load data
-        if updated_loan:
-            self.loan_data = updated_loan
-            # Get fresh payments data
-            _, self.payments_df = self.user_system.get_loan_details(self.loan_id)
-        else:
-            self.loan_data, self.payments_df = self.user_system.get_loan_details(self.loan_id)
-            if not self.loan_data:
+        """Load the loan, its payment totals and the first page of payments (runs on a worker thread)"""
+        loan_data, payment_stats = self.user_system.get_loan_overview(self.loan_id)
+        if not loan_data:
+            return None
+        payments_df, payments_cursor = self.user_system.get_loan_payments(self.loan_id, limit=self.PAYMENT_PAGE_SIZE)
+        return loan_data, payment_stats, payments_df, payments_cursor
+
+    def refresh_data(self):
+        """Reload the loan's data in the background, then redraw the tab in view"""
+        def on_done(result):
+            if result is None:
+                messagebox.showerror("Error", f"Loan ID {self.loan_id} was not found")
                 self.destroy()
                 return
+            self.loan_data, self.payment_stats, self.payments_df, self._payments_cursor = result
+
+            if self.notebook is None:
+                self._loading_label.destroy()
+                self._create_ui()
+                return
 
-        # Rebuild UI
-        self._create_ui()
+            # Tabs not in view are rebuilt from the new data when next selected
+            for name in self._built_tabs:
+                for widget in self.notebook.tab(name).winfo_children():
+                    widget.destroy()
+            self._built_tabs.clear()
+            self._build_selected_tab()
+
+        def on_error(e):
+            messagebox.showerror("Error", f"Could not load loan details: {str(e)}")
+            if self.notebook is None:
+                self.destroy()
+
+        # A page still loading belongs to the data being replaced
+        self.executor.cancel('loan_payments')
+        self.executor.submit(
+            self._load_loan_details,
+            key='loan_details',
+            owner=self,
+            on_done=on_done,
+            on_error=on_error
+        )
 
     def _setup_summary_tab(self):
         """Modern, robust implementation of Payment Summary tab"""
@@ -651,7 +738,7 @@ class LoanDetailWindow(ctk.CTkToplevel):
         ).pack(pady=(15, 10))
 
         details = [
-            f"Last Payment: KES {float(payment['amount']):,.2f}",
+            f"Last Payment: KES {Money(payment['amount']):,.2f}",
             f"Date: {payment['date']}",
             f"Received by: {payment['received_by']}",
             f"Notes: {payment.get('notes', 'None')}"
@@ -675,7 +762,7 @@ class LoanDetailWindow(ctk.CTkToplevel):
     def _safe_refresh(self):
         """Safe wrapper for refresh operation"""
         try:
-            self._setup_summary_tab()
+            self.refresh_data()
         except Exception as e:
             messagebox.showerror("Error", f"Refresh failed: {str(e)}")
 
@@ -715,11 +802,7 @@ class LoanDetailWindow(ctk.CTkToplevel):
 
     def _refresh_summary_data(self):
         """Refresh all summary data"""
-        self.loan_data, self.payments_df = self.user_system.get_loan_details(self.loan_id)
-        for widget in self.notebook.tab("Payment Summary").winfo_children():
-            widget.destroy()
-        self._setup_summary_tab()
-        messagebox.showinfo("Refreshed", "Payment summary data has been updated")
+        self.refresh_data()
 
     def _safe_command(self, func):
         """Wrapper to prevent uncaught exceptions in button commands"""
@@ -768,10 +851,7 @@ class LoanDetailWindow(ctk.CTkToplevel):
 
     def _refresh_summary_tab(self):
         """Refresh all summary data"""
-        self.loan_data, self.payments_df = self.user_system.get_loan_details(self.loan_id)
-        for widget in self.notebook.tab("Payment Summary").winfo_children():
-            widget.destroy()
-        self._setup_summary_tab()
+        self.refresh_data()
 
 
 
@@ -785,10 +865,10 @@ class LoanDetailWindow(ctk.CTkToplevel):
                 self.user_system.reset_daily_payments()
         self._last_calculation_date = datetime.now().date()
         """Calculate payment summary including exact missed days"""
-        amount_given = float(self.loan_data['amount'])
-        total_to_repay = float(self.loan_data['total_to_repay'])
-        remaining_balance = float(self.loan_data['remaining_balance'])
-        daily_payment = float(self.loan_data['payment_per_day'])
+        amount_given = self.loan_data['amount']
+        total_to_repay = self.loan_data['total_to_repay']
+        remaining_balance = self.loan_data['remaining_balance']
+        daily_payment = self.loan_data['payment_per_day']
 
         # Basic calculations (unchanged)
         amount_paid = total_to_repay - remaining_balance
@@ -796,31 +876,23 @@ class LoanDetailWindow(ctk.CTkToplevel):
         amount_out = remaining_balance
 
         # ===== NEW: Precise missed payment calculation =====
-        start_date = datetime.strptime(self.loan_data['start_date'], "%Y-%m-%d").date()
-        today = datetime.now().date()
-        term_days = int(self.loan_data['term_months']) * 30  # Approx 30 days/month
-        expected_days = (today - start_date).days + 1  # +1 to include start day
-
-        # Count actual unique payment days
-        if not self.payments_df.empty:
-            payment_dates = pd.to_datetime(self.payments_df['date']).dt.date
-            unique_payment_days = len(payment_dates.unique())
-        else:
-            unique_payment_days = 0
+        # Day numbers come from the database, so no date parsing is needed
+        today = to_day_number()
+        expected_days = today - self.loan_data['start_day'] + 1  # +1 to include start day
+
+        # Count actual unique payment days (over all payments, not just the pages loaded)
+        unique_payment_days = self.payment_stats['payment_days']
 
         # Calculate missed days (only for active loans)
         missed_days = 0
-        accumulated_missed = 0
-        end_date = start_date + timedelta(days=term_days)
+        accumulated_missed = Money(0)
 
-        if self.loan_data['status'] == 'Active' and today <= end_date:
+        if self.loan_data['status'] == 'Active' and today <= self.loan_data['end_day']:
             missed_days = max(0, expected_days - unique_payment_days)
             accumulated_missed = missed_days * daily_payment
 
         # Last payment info
-        last_payment = None
-        if not self.payments_df.empty:
-            last_payment = self.payments_df.iloc[-1].to_dict()
+        last_payment = self.payment_stats['last_payment']
 
         return {
             'amount_given': amount_given,
@@ -914,11 +986,11 @@ class LoanDetailWindow(ctk.CTkToplevel):
 
         # Add loan cycle information
         try:
-            cycle_count = self.user_system.get_loan_cycle({
-                'customer_name': self.loan_data['customer_name'],
-                'national_id': self.loan_data.get('national_id', ''),
-                'phone_number': self.loan_data.get('phone_number', '')
-            })
+            cycle_count = self.user_system.get_loan_cycle(
+                self.loan_data['customer_name'],
+                national_id=self.loan_data.get('national_id', ''),
+                phone_number=self.loan_data.get('phone_number', '')
+            )
 
             cycle_frame = ctk.CTkFrame(content_frame, fg_color="transparent")
             cycle_frame.pack(fill="x", pady=(10, 5))
@@ -1067,19 +1139,16 @@ class LoanDetailWindow(ctk.CTkToplevel):
                 'notes': notes or ""
             }
 
-            success, message, updated_loans = self.user_system.add_payment(self.loan_id, payment_data)
+            success, message, changes = self.user_system.add_payment(self.loan_id, payment_data)
             if success:
-                # Refresh the parent dashboard's views
-                if hasattr(self.master, 'display_loans'):
-                    self.master.display_loans(updated_loans)
+                # Patch this loan's row in the parent's list
+                if hasattr(self.master, 'apply_loan_changes'):
+                    self.master.apply_loan_changes(changes)
                 if hasattr(self.master, '_refresh_loan_payments_tab'):
                     self.master._refresh_loan_payments_tab()
 
                 # Refresh this detail window
-                self.loan_data, self.payments_df = self.user_system.get_loan_details(self.loan_id)
-                for widget in self.container.winfo_children():
-                    widget.destroy()
-                self._create_ui()
+                self.refresh_data()
 
                 # Clear the payment form
                 self.amount_entry.delete(0, 'end')
@@ -1119,7 +1188,10 @@ class LoanDetailWindow(ctk.CTkToplevel):
         pdf.set_font("Arial", 'B', 12)
         pdf.cell(0, 10, "Payment History", 0, 1)
 
-        if self.payments_df.empty:
+        # The whole history, not only the pages shown in the window
+        payments_df, _ = self.user_system.get_loan_payments(self.loan_id, limit=None)
+
+        if payments_df.empty:
             pdf.set_font("Arial", '', 10)
             pdf.cell(0, 8, "No payments recorded yet", 0, 1)
             return
@@ -1135,10 +1207,10 @@ class LoanDetailWindow(ctk.CTkToplevel):
         # Table rows - ensure all values are converted to strings
         pdf.set_font("Arial", '', 10)
         pdf.set_fill_color(255, 255, 255)
-        for _, payment in self.payments_df.iterrows():
+        for _, payment in payments_df.iterrows():
             # Convert all values to strings explicitly
             date_str = str(payment['date'])
-            amount_str = f"{float(payment['amount']):,.2f}"
+            amount_str = f"{Money(payment['amount']):,.2f}"
             received_by_str = str(payment['received_by'])
             notes_str = str(payment.get('notes', ''))
 
@@ -0,0 +1,334 @@
+import bisect
+
+import customtkinter as ctk
+
+from money import Money
+
+
+class _LoanRow:
+    """One pooled row of widgets, rebound to whichever loan is scrolled into its slot"""
+
+    def __init__(self, table, parent):
+        self.loan_id = None
+        self._key = None
+
+        self.frame = ctk.CTkFrame(parent, height=table.ROW_HEIGHT - 4)
+        self.frame.grid_propagate(False)
+        self.frame.grid_rowconfigure(0, weight=1)
+
+        self.labels = []
+        for col, (_, width) in enumerate(table.COLUMNS[:-2]):
+            label = ctk.CTkLabel(self.frame, text="", width=width)
+            label.grid(row=0, column=col, padx=2)
+            self.labels.append(label)
+
+        # Status label (dynamic color)
+        self.status_label = ctk.CTkLabel(
+            self.frame,
+            text="",
+            width=table.COLUMNS[-2][1] - 20,
+            text_color="white",
+            corner_radius=4
+        )
+        self.status_label.grid(row=0, column=len(self.labels), padx=2)
+
+        # Action buttons frame
+        btn_frame = ctk.CTkFrame(self.frame, fg_color="transparent")
+        btn_frame.grid(row=0, column=len(self.labels) + 1, padx=2)
+
+        # The commands read loan_id when clicked, so they follow the row as it is rebound
+        ctk.CTkButton(
+            btn_frame,
+            text="View",
+            width=70,
+            command=lambda: self.loan_id is not None and table.on_view(self.loan_id)
+        ).pack(side="left", padx=2)
+
+        self.edit_menu = ctk.CTkSegmentedButton(
+            btn_frame,
+            values=["Edit", "Delete"],
+            width=140,
+            command=lambda value: self._on_action(table, value)
+        )
+        self.edit_menu.pack(side="left", padx=2)
+        self.edit_menu.set("Options")  # Default display text
+
+    def _on_action(self, table, value):
+        self.edit_menu.set("Options")
+        if self.loan_id is not None:
+            table.on_action(value, self.loan_id)
+
+    def bind(self, loan, status_color):
+        """Show a loan in this row's widgets, skipping the redraw if nothing changed"""
+        texts = (
+            str(loan['loan_id']),
+            str(loan['customer_name']),
+            f"{Money(loan['amount']):,.2f}",
+            f"{Money(loan['payment_per_day']):,.2f}",
+            f"{loan['term_months']} months",
+            f"{Money(loan['total_to_repay']):,.2f}",
+        )
+        key = texts + (loan['display_status'], status_color)
+        self.loan_id = loan['loan_id']
+        if key == self._key:
+            return
+        self._key = key
+
+        for label, text in zip(self.labels, texts):
+            label.configure(text=text)
+        self.status_label.configure(text=loan['display_status'], fg_color=status_color)
+
+
+class VirtualLoanTable(ctk.CTkFrame):
+    """
+    A loan table that draws only the rows in view.
+
+    It keeps a pool of row widgets about one screen tall and rebinds them
+    to loans as the table scrolls, so drawing cost depends on the size of
+    the window rather than the number of loans. Loans are kept as plain
+    dicts; when the view nears the end of the loaded loans and more exist,
+    on_need_more() is called to fetch the next page, which is then passed
+    to append_loans().
+
+    Loans are held in loan_id order with an id-to-position index, so
+    patch_loans() and remove_loans() can change single rows after an edit
+    without reloading, keeping the scroll position.
+
+    Args:
+        parent: Parent widget
+        on_view (callable): on_view(loan_id) for the View button
+        on_action (callable): on_action("Edit" or "Delete", loan_id)
+        on_need_more (callable): Fetches the next page, if any
+        status_colors (dict): Badge color per display status
+    """
+
+    ROW_HEIGHT = 40
+
+    COLUMNS = [
+        ("ID", 80), ("Customer", 180), ("Amount", 120),
+        ("Daily", 100), ("Term", 80), ("Total", 120),
+        ("Status", 120), ("", 160)
+    ]
+
+    def __init__(self, parent, on_view, on_action, on_need_more=None, status_colors=None, **kwargs):
+        kwargs.setdefault('border_width', 1)
+        kwargs.setdefault('border_color', "gray20")
+        super().__init__(parent, **kwargs)
+        self.on_view = on_view
+        self.on_action = on_action
+        self.on_need_more = on_need_more
+        self.status_colors = status_colors or {}
+
+        self._loans = []
+        self._index = {}  # loan_id -> position in _loans
+        self._total = 0
+        self._has_more = False
+        self._loading = False
+        self._top = 0  # Index of the loan in the first row slot
+        self._visible = 1  # Row slots that fit in the body
+        self._pool = []
+
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        # Header row
+        header_frame = ctk.CTkFrame(self, fg_color="#2c3e50", height=40)
+        header_frame.grid(row=0, column=0, columnspan=2, sticky="ew", padx=2, pady=(2, 5))
+        for col, (header, width) in enumerate(self.COLUMNS):
+            ctk.CTkLabel(
+                header_frame,
+                text=header,
+                font=ctk.CTkFont(weight="bold"),
+                text_color="white",
+                width=width
+            ).grid(row=0, column=col, padx=2)
+
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.grid(row=1, column=0, sticky="nsew", padx=2)
+        self.body.grid_columnconfigure(0, weight=1)
+        self.body.grid_propagate(False)  # Sized by the table, never by its row slots
+        self.body.bind("<Configure>", self._on_resize)
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        self.empty_label = ctk.CTkLabel(
+            self.body,
+            text="No loans found",
+            font=ctk.CTkFont(size=14),
+            text_color="gray70"
+        )
+
+        self.footer_label = ctk.CTkLabel(self, text="", text_color="gray70", anchor="w")
+        self.footer_label.grid(row=2, column=0, columnspan=2, sticky="ew", padx=10, pady=5)
+
+        # Wheel events go to the widget under the pointer; catch them for any of our rows.
+        # Kept so destroy() can take back just these handlers from the shared "all" tag.
+        self._wheel_bindings = [
+            (sequence, self.bind_all(sequence, self._on_wheel, add="+"))
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>")
+        ]
+
+    def destroy(self):
+        """Remove this table's wheel handlers, leaving other widgets' ones bound"""
+        for sequence, funcid in self._wheel_bindings:
+            # unbind_all() would drop every handler for the sequence, e.g. scrollable frames'
+            script = self.tk.call('bind', 'all', sequence)
+            kept = '\n'.join(line for line in script.split('\n') if funcid not in line)
+            self.tk.call('bind', 'all', sequence, kept)
+            self.deletecommand(funcid)
+        self._wheel_bindings = []
+        super().destroy()
+
+    def set_loans(self, loans_df, total=None, has_more=False):
+        """Replace the table's loans with a first page and scroll to the top"""
+        self._loans = loans_df.to_dict('records')
+        self._reindex()
+        self._total = total if total is not None else len(self._loans)
+        self._has_more = has_more
+        self._loading = False
+        self._top = 0
+        self._redraw()
+
+    def append_loans(self, loans_df, total=None, has_more=False):
+        """Add the next page of loans below those already loaded"""
+        self._loans.extend(loans_df.to_dict('records'))
+        self._reindex()
+        if total is not None:
+            self._total = total
+        self._has_more = has_more
+        self._loading = False
+        self._redraw()
+
+    def patch_loans(self, loans, matches=None):
+        """
+        Update loans in place, inserting any the table doesn't have yet.
+
+        A new loan is inserted at its loan_id position when matches(loan)
+        is true (always when matches is None). One that sorts after every
+        loaded loan while more pages remain is left for paging to fetch.
+        The rows in view stay in view.
+        """
+        inserted = False
+        for loan in loans:
+            position = self._index.get(loan['loan_id'])
+            if position is not None:
+                self._loans[position] = loan
+                continue
+            if matches is not None and not matches(loan):
+                continue
+
+            self._total += 1
+            position = bisect.bisect_left(self._loans, loan['loan_id'], key=lambda row: row['loan_id'])
+            if position == len(self._loans) and self._has_more:
+                continue
+            self._loans.insert(position, loan)
+            if position < self._top:
+                self._top += 1
+            inserted = True
+            self._reindex()
+
+        self._redraw()
+        return inserted
+
+    def remove_loans(self, loan_ids):
+        """Drop loans from the table, keeping the rows in view where they were"""
+        positions = sorted((self._index[loan_id] for loan_id in loan_ids if loan_id in self._index), reverse=True)
+        for position in positions:
+            del self._loans[position]
+            if position < self._top:
+                self._top -= 1
+        self._total = max(0, self._total - len(positions))
+        self._reindex()
+        self._top = max(0, min(self._top, len(self._loans) - self._visible))
+        self._redraw()
+
+    def _reindex(self):
+        self._index = {loan['loan_id']: position for position, loan in enumerate(self._loans)}
+
+    @property
+    def loan_count(self):
+        """Number of loans loaded so far"""
+        return len(self._loans)
+
+    def scroll_to(self, index):
+        """Put the loan at index in the top row slot (clamped to the loaded range)"""
+        top = max(0, min(int(index), len(self._loans) - self._visible))
+        if top != self._top:
+            self._top = top
+            self._redraw()
+
+    def _on_resize(self, event):
+        visible = max(1, event.height // self.ROW_HEIGHT)
+        if visible == self._visible and len(self._pool) >= visible:
+            return
+        self._visible = visible
+
+        # One spare row so a partly visible last row is still drawn
+        wanted = visible + 1
+        while len(self._pool) < wanted:
+            self._pool.append(_LoanRow(self, self.body))
+        while len(self._pool) > wanted:
+            self._pool.pop().frame.destroy()
+
+        self.scroll_to(self._top)
+        self._redraw()
+
+    def _redraw(self):
+        """Bind the row slots to the loans in view and update the scrollbar and footer"""
+        count = len(self._loans)
+        if not count:
+            self.empty_label.grid(row=0, column=0, pady=50)
+        else:
+            self.empty_label.grid_remove()
+
+        for slot, row in enumerate(self._pool):
+            index = self._top + slot
+            if index < count:
+                loan = self._loans[index]
+                row.bind(loan, self.status_colors.get(loan['display_status'], "#3498db"))
+                row.frame.grid(row=slot, column=0, sticky="ew", pady=2)
+            else:
+                row.loan_id = None
+                row.frame.grid_remove()
+
+        if count:
+            first = self._top / count
+            last = min(1.0, (self._top + self._visible) / count)
+            self.scrollbar.set(first, last)
+            shown_to = min(count, self._top + self._visible)
+            loaded = f", {count} loaded" if count < self._total else ""
+            self.footer_label.configure(
+                text=f"Showing {self._top + 1}-{shown_to} of {self._total} loans{loaded}"
+            )
+        else:
+            self.scrollbar.set(0.0, 1.0)
+            self.footer_label.configure(text="")
+
+        # Fetch the next page while the user is still a screen away from the end
+        if (self._has_more and not self._loading and self.on_need_more is not None
+                and self._top + 2 * self._visible >= count):
+            self._loading = True
+            self.after_idle(self.on_need_more)
+
+    def _on_scrollbar(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * len(self._loans))
+        elif args[0] == 'scroll':
+            amount = float(args[1])
+            step = int(amount) or (1 if amount > 0 else -1)
+            self.scroll_to(self._top + step * (self._visible if args[2] == 'pages' else 1))
+
+    def _on_wheel(self, event):
+        widget = str(event.widget)
+        if not self.winfo_exists() or not widget.startswith(str(self)) or widget.startswith(str(self.scrollbar)):
+            return  # Elsewhere, or the scrollbar, which scrolls us itself
+        if event.num == 4:
+            step = -3
+        elif event.num == 5:
+            step = 3
+        elif abs(event.delta) >= 120:
+            step = -3 * int(event.delta / 120)  # Windows: multiples of 120 per notch
+        else:
+            step = -event.delta  # macOS: small deltas
+        self.scroll_to(self._top + step)
@@ -0,0 +1,160 @@
+"""
+Multi-process contention benchmark for file_locking.FileLock.
+
+Worker processes take the lock repeatedly, as readers or writers, around a
+shared counter file. Writers mark the counter as being written, hold the
+lock, then store the incremented value; readers read it twice across their
+hold. A reader seeing a write in progress or a changing value, or a final
+count short of the number of writes, means the lock let someone in that it
+should not have.
+
+    python lock_benchmark.py --processes 8 --iterations 200 --readers 0.8
+    python lock_benchmark.py --method file   # the lock-file fallback, for comparison
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+from file_locking import FileLock, lock_metrics
+from sql_metrics import LatencyHistogram, BUCKET_BOUNDS_MS
+
+IN_PROGRESS = -1
+
+
+def _read_counter(path):
+    with open(path, 'r') as f:
+        return int(f.read() or 0)
+
+
+def _write_counter(path, value):
+    with open(path, 'w') as f:
+        f.write(str(value))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _worker(base, counter_path, iterations, reader_share, hold, method, seed, results):
+    rng = random.Random(seed)
+    writes = reads = violations = timeouts = 0
+
+    for _ in range(iterations):
+        shared = rng.random() < reader_share
+        lock = FileLock(base, timeout=30.0, shared=shared, method=method)
+        if not lock.acquire():
+            timeouts += 1
+            continue
+        try:
+            if shared:
+                first = _read_counter(counter_path)
+                time.sleep(hold)
+                if first == IN_PROGRESS or _read_counter(counter_path) != first:
+                    violations += 1
+                reads += 1
+            else:
+                value = _read_counter(counter_path)
+                if value == IN_PROGRESS:
+                    violations += 1
+                _write_counter(counter_path, IN_PROGRESS)
+                time.sleep(hold)
+                _write_counter(counter_path, value + 1)
+                writes += 1
+        finally:
+            lock.release()
+
+    stats = lock_metrics.snapshot().get(f"{base}.lock", {})
+    results.put({
+        'writes': writes,
+        'reads': reads,
+        'violations': violations,
+        'timeouts': timeouts,
+        'wait_buckets': stats.get('wait', {}).get('buckets'),
+        'wait_total_ms': stats.get('wait', {}).get('total_ms', 0.0),
+        'wait_max_ms': stats.get('wait', {}).get('max_ms', 0.0),
+        'contended': stats.get('contended', 0),
+    })
+
+
+def run_benchmark(processes=8, iterations=200, reader_share=0.8, hold=0.002, method='auto', directory=None):
+    """
+    Run the benchmark and summarise it.
+
+    Returns:
+        dict: operations, writes, reads, seconds, ops_per_second, violations,
+              lost_writes, timeouts, contended and wait percentiles (ms)
+    """
+    directory = directory or tempfile.mkdtemp(prefix='lockbench_')
+    base = os.path.join(directory, 'bench')
+    counter_path = os.path.join(directory, 'counter.txt')
+    _write_counter(counter_path, 0)
+
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=_worker,
+            args=(base, counter_path, iterations, reader_share, hold, method, seed, results)
+        )
+        for seed in range(processes)
+    ]
+
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - started
+
+    wait = LatencyHistogram()
+    for outcome in outcomes:
+        for index, count in enumerate(outcome['wait_buckets'] or []):
+            wait.buckets[index] += count
+            wait.count += count
+        wait.total_ms += outcome['wait_total_ms']
+        wait.max_ms = max(wait.max_ms, outcome['wait_max_ms'])
+
+    writes = sum(o['writes'] for o in outcomes)
+    reads = sum(o['reads'] for o in outcomes)
+    summary = wait.summary()
+    return {
+        'method': method,
+        'processes': processes,
+        'operations': writes + reads,
+        'writes': writes,
+        'reads': reads,
+        'seconds': round(seconds, 3),
+        'ops_per_second': round((writes + reads) / seconds, 1) if seconds else 0.0,
+        'violations': sum(o['violations'] for o in outcomes),
+        'lost_writes': writes - _read_counter(counter_path),
+        'timeouts': sum(o['timeouts'] for o in outcomes),
+        'contended': sum(o['contended'] for o in outcomes),
+        'wait_avg_ms': summary['avg_ms'],
+        'wait_p50_ms': summary['p50_ms'],
+        'wait_p95_ms': summary['p95_ms'],
+        'wait_max_ms': summary['max_ms'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-process FileLock contention benchmark")
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=200, help="Lock acquisitions per process")
+    parser.add_argument('--readers', type=float, default=0.8, help="Share of acquisitions that are shared (reader) locks")
+    parser.add_argument('--hold', type=float, default=0.002, help="Seconds each holder keeps the lock")
+    parser.add_argument('--method', choices=('auto', 'os', 'file'), default='auto')
+    parser.add_argument('--dir', help="Directory for the lock and counter files, e.g. on the network share")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.processes, args.iterations, args.readers, args.hold, args.method, args.dir)
+    for key, value in result.items():
+        print(f"{key:>15}: {value}")
+    print(f"{'buckets (ms)':>15}: {BUCKET_BOUNDS_MS}")
+
+    return 0 if result['violations'] == 0 and result['lost_writes'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
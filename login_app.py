@@ -4,17 +4,38 @@ import sqlite3
 import sys
 import hashlib
 import re
+import json
+import bisect
+from collections.abc import Mapping
 from datetime import datetime, timedelta
 import customtkinter as ctk
 from tkinter import messagebox, filedialog
 import pandas as pd
 
 from loan_detail_window import LoanDetailWindow
+from loan_table import VirtualLoanTable
+from db_pool import ConnectionPool, load_pool_config
+from migrations import migrate
+import portfolio
+import search_index
+import customers
+import archive
+import ledger
+import outbox
+from money import Money, to_cents, money_frame, wrap_money
+from day_numbers import TODAY_SQL, to_day_number
+from eod import EndOfDayEngine, PHASES, load_eod_config
+import sql_metrics
+from sql_metrics import InstrumentedConnection, load_metrics_config
+from report_snapshot import ReportSnapshot, describe_snapshot, load_report_config
+from delta_sync import DeltaSync
+from sync_scheduler import SyncScheduler, describe_sync_status, load_sync_config
+from share_health import ShareHealthMonitor, describe_share_health, load_share_health_config
+from ui_executor import BackgroundExecutor
+from prefix_index import PrefixIndex, load_search_config
+import prefix_index
 import os
 import sys
-import shutil
-import time
-from threading import Thread
 
 
 class NetworkManager:
@@ -22,7 +43,11 @@ class NetworkManager:
         self.shared_mode = False
         self.network_path = r"\\SERVER\KodongoLoanData"
         self.local_path = self._get_local_data_path()
-        self.sync_interval = 300  # 5 minutes
+        self.sync_scheduler = None
+        self.data_folder = None
+        self._sync_listeners = []
+        self.health = ShareHealthMonitor(self.network_path, **load_share_health_config())
+        self.health.add_listener(self._on_share_change)
 
     def _get_local_data_path(self):
         if getattr(sys, 'frozen', False):
@@ -38,22 +63,23 @@ class NetworkManager:
             return os.path.dirname(os.path.abspath(__file__))
 
     def check_network_share(self):
-        """Check if network share is available"""
-        try:
-            # Try to list the directory
-            if os.path.exists(self.network_path):
-                return True
-            return False
-        except:
-            return False
+        """Check if network share is available (the cached probe result; never blocks)"""
+        return self.health.is_available()
 
     def initialize_data_folder(self):
-        """Initialize data folder in appropriate location"""
-        if self.check_network_share():
+        """
+        Initialize data folder in appropriate location.
+
+        Waits only briefly for the first share probe. If the share has not
+        answered by then the app starts on local storage, and the sync
+        scheduler upgrades it to shared mode once the share is reachable.
+        """
+        if self.health.wait_for_first_probe():
             try:
                 data_folder = os.path.join(self.network_path, "Data")
                 os.makedirs(data_folder, exist_ok=True)
                 self.shared_mode = True
+                self.data_folder = data_folder
                 return data_folder
             except:
                 self.shared_mode = False
@@ -62,122 +88,169 @@ class NetworkManager:
 
         # Fall back to local storage
         os.makedirs(self.local_path, exist_ok=True)
+        self.data_folder = self.local_path
         return self.local_path
 
     def start_sync_thread(self):
-        """Start background thread for syncing data"""
-        if self.shared_mode:
-            Thread(target=self._sync_data, daemon=True).start()
-
-    def _sync_data(self):
-        """Sync data between network and local storage"""
-        while True:
-            try:
-                if self.shared_mode and self.check_network_share():
-                    network_db = os.path.join(self.network_path, "Data", "kodongo_loans.db")
-                    local_db = os.path.join(self.local_path, "kodongo_loans.db")
-
-                    # Sync logic remains the same as before
-                    if os.path.exists(network_db) and os.path.exists(local_db):
-                        network_mtime = os.path.getmtime(network_db)
-                        local_mtime = os.path.getmtime(local_db)
-
-                        if network_mtime > local_mtime:
-                            shutil.copy2(network_db, local_db)
-                        elif local_mtime > network_mtime:
-                            shutil.copy2(local_db, network_db)
-                    elif os.path.exists(network_db):
-                        shutil.copy2(network_db, local_db)
-                    elif os.path.exists(local_db):
-                        shutil.copy2(local_db, network_db)
+        """
+        Start the background sync scheduler.
+
+        Also started in local mode, so operations queued while the share was
+        down are replayed to it as soon as it is back.
+        """
+        if self.sync_scheduler is None:
+            self.sync_scheduler = SyncScheduler(
+                self._sync_once, self.check_network_share, self._pending_operations, **load_sync_config()
+            )
+        self.sync_scheduler.start()
+
+    def stop_sync(self, timeout=10.0):
+        """Stop the scheduler, letting a sync in progress finish"""
+        if self.sync_scheduler is not None:
+            return self.sync_scheduler.stop(timeout)
+        return True
+
+    def add_sync_listener(self, callback):
+        """Call callback(stats) from the sync thread after a sync that brought in the hub's changes"""
+        self._sync_listeners.append(callback)
+
+    def notify_change(self):
+        """Tell the scheduler a local transaction committed"""
+        if self.sync_scheduler is not None:
+            self.sync_scheduler.notify_change()
+
+    def get_sync_status(self):
+        """Current sync state (see SyncScheduler.status), or None before the scheduler starts"""
+        if self.sync_scheduler is None:
+            return None
+        return self.sync_scheduler.status()
+
+    def get_share_health(self):
+        """Latency, throughput and availability of the share (see ShareHealthMonitor.status)"""
+        return self.health.status()
+
+    def _on_share_change(self, available):
+        """
+        Follow the share coming and going when running on the local database.
+
+        The local database stays open; the scheduler keeps it in step with the
+        shared one, so being reachable is what makes this session shared.
+        """
+        if self.data_folder != self.local_path:
+            return  # Opened on the share itself
+        self.shared_mode = available
+        if available and self.sync_scheduler is not None:
+            self.sync_scheduler.sync_now()
+
+    def _sync_once(self):
+        """Exchange only the rows changed since the last sync, in both directions"""
+        network_db = os.path.join(self.network_path, "Data", "kodongo_loans.db")
+        local_db = os.path.join(self.local_path, "kodongo_loans.db")
+        if not os.path.exists(network_db) and not os.path.exists(local_db):
+            return None
 
-            except Exception as e:
-                print(f"Sync error: {str(e)}")
+        os.makedirs(os.path.dirname(network_db), exist_ok=True)
+        stats = DeltaSync(network_db, local_db).sync()
 
-            time.sleep(self.sync_interval)
+        if stats and (stats.get('pulled') or stats.get('mode') == 'seed'):
+            for callback in list(self._sync_listeners):
+                try:
+                    callback(stats)
+                except Exception as e:
+                    print(f"Error in sync listener: {str(e)}")
+        return stats
+
+    def _pending_operations(self):
+        """Operations queued in the local database's outbox"""
+        local_db = os.path.join(self.local_path, "kodongo_loans.db")
+        if not os.path.exists(local_db):
+            return 0
+
+        conn = sqlite3.connect(local_db, timeout=1)
+        try:
+            return outbox.get_status(conn.cursor())['operations']
+        except sqlite3.OperationalError:
+            return None  # Busy, or not migrated yet
+        finally:
+            conn.close()
+
+
+# Status shown in the UI: stored status, except loans still owing past their end date
+LOAN_DISPLAY_STATUS_SQL = f"""
+    CASE
+        WHEN status = 'Paid' THEN 'Paid'
+        WHEN end_day < {TODAY_SQL} AND remaining_balance > 0 THEN 'Overdue'
+        WHEN status = 'Defaulted' THEN 'Defaulted'
+        ELSE 'Active'
+    END
+"""
+
+# Columns returned by every loan listing query
+LOAN_COLUMNS = f"""
+    loan_id, customer_name, amount, payment_per_day,
+    term_months, start_date, end_date, total_to_repay,
+    status, created_by, remaining_balance, physical_address,
+    national_id, phone_number, start_day, end_day,
+    {LOAN_DISPLAY_STATUS_SQL} AS display_status
+"""
+
+# Allowed sort keys for query_loans, mapped to their ORDER BY expressions
+LOAN_SORT_KEYS = {
+    'loan_id': 'loan_id',
+    'customer_name': 'customer_name COLLATE NOCASE',
+    'start_date': 'start_date',
+    'end_date': 'end_date',
+    'remaining_balance': 'remaining_balance',
+}
+
+
+def _prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
 
 
 class DatabaseManager:
     def __init__(self, db_path, network_manager):
         self.db_path = db_path
         self.network_manager = network_manager
+        self.pool = ConnectionPool(db_path, factory=InstrumentedConnection, **load_pool_config())
+        self.archive_path = archive.archive_path_for(db_path)
+        self.pool.add_connect_hook(self._attach_archive)
+        # Local commits wake the sync scheduler
+        self.pool.add_commit_hook(network_manager.notify_change)
         self._initialize_database()
 
-    def _initialize_database(self):
-        """Initialize the database with required tables"""
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-
-            # Users table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    role TEXT NOT NULL
-                )
-            """)
-
-            # Loans table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS loans (
-                    loan_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    customer_name TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    payment_per_day REAL NOT NULL,
-                    term_months INTEGER NOT NULL,
-                    start_date TEXT NOT NULL,
-                    end_date TEXT NOT NULL,
-                    total_to_repay REAL NOT NULL,
-                    status TEXT NOT NULL,
-                    created_by TEXT NOT NULL,
-                    remaining_balance REAL NOT NULL,
-                    physical_address TEXT,
-                    national_id TEXT,
-                    phone_number TEXT,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    last_updated TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+    def _attach_archive(self, conn):
+        """Attach the settled-loan archive to a new pooled connection"""
+        try:
+            archive.attach_archive(conn, self.archive_path)
+        except sqlite3.Error as e:
+            # Live data stays usable; archiving refuses to run until this works
+            print(f"Error attaching archive database: {str(e)}")
 
-            # Payments table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS payments (
-                    payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    loan_id INTEGER NOT NULL,
-                    date TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    received_by TEXT NOT NULL,
-                    notes TEXT,
-                    FOREIGN KEY (loan_id) REFERENCES loans (loan_id)
-                )
-            """)
+    def _initialize_database(self):
+        """Bring the database schema up to date"""
+        conn = self._get_connection()
+        migrate(conn)
+        self.ensure_search_index()
 
-            # Loan cycles table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS loan_cycles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    customer_name TEXT NOT NULL,
-                    national_id TEXT,
-                    phone_number TEXT,
-                    loan_cycles INTEGER NOT NULL DEFAULT 1
-                )
-            """)
+    def ensure_search_index(self):
+        """Check the customer search index, rebuilding it if it is missing"""
+        with self._get_connection() as conn:
+            self.search_enabled = search_index.ensure_search_index(conn.cursor())
+        return self.search_enabled
 
-            # Check if default admin user exists
-            cursor.execute("SELECT COUNT(*) FROM users WHERE username = 'Kodongo'")
-            if cursor.fetchone()[0] == 0:
-                default_password = self._hash_password("Kodongo123")
-                cursor.execute(
-                    "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-                    ('Kodongo', default_password, 'Admin')
-                )
+    def _get_connection(self):
+        """Get the calling thread's pooled database connection"""
+        return self.pool.get_connection()
 
-            conn.commit()
+    def get_pool_stats(self):
+        """Get connection pool statistics"""
+        return self.pool.stats()
 
-    def _get_connection(self):
-        """Get a database connection"""
-        return sqlite3.connect(self.db_path)
+    def close(self):
+        """Close all pooled connections"""
+        self.pool.close_all()
 
     @staticmethod
     def _hash_password(password):
@@ -193,14 +266,72 @@ class SQLiteUserSystem:
         # Initialize database paths
         self.data_folder = self.network_manager.initialize_data_folder()
         self.db_path = os.path.join(self.data_folder, "kodongo_loans.db")
-        self.shared_mode = self.network_manager.shared_mode
 
         # Start sync thread
         self.network_manager.start_sync_thread()
 
+        # Slow statements are logged locally, so the log works even when the share is down
+        self._configure_sql_metrics()
+
         # Initialize database
         self.db_manager = DatabaseManager(self.db_path, self.network_manager)
         self.cycles_path = self.db_path
+
+        # End-of-day batch engine
+        # A replica claims each business date on the shared database first
+        hub_path = os.path.join(self.network_manager.network_path, "Data", "kodongo_loans.db")
+        self.eod = EndOfDayEngine(self.db_manager, hub_path=hub_path, **load_eod_config())
+
+        # Reports read a consistent read-only snapshot, never the tellers' connection
+        self.reports = ReportSnapshot(self.db_manager, self.network_manager.local_path, **load_report_config())
+
+        # In-memory prefix index for search-as-you-type, kept current by _loan_changes;
+        # loans pulled in by a sync are picked up by rebuilding it
+        self.loan_index = PrefixIndex(self._loan_index_rows, max_age=load_search_config()['max_age'])
+        self.network_manager.add_sync_listener(lambda stats: self.loan_index.invalidate())
+
+    @property
+    def shared_mode(self):
+        """Whether this session's data is shared (follows the share coming and going in local mode)"""
+        return self.network_manager.shared_mode
+
+    @shared_mode.setter
+    def shared_mode(self, value):
+        self.network_manager.shared_mode = value
+
+    def get_pool_stats(self):
+        """Get database connection pool statistics"""
+        return self.db_manager.get_pool_stats()
+
+    def _configure_sql_metrics(self):
+        """Send slow statements to a rotating log using the [Logging] settings"""
+        try:
+            sql_metrics.metrics.configure(
+                os.path.join(self.network_manager.local_path, 'logs'), **load_metrics_config()
+            )
+        except OSError as e:
+            print(f"Error setting up slow-query log: {str(e)}")
+
+    def get_sql_stats(self):
+        """Get per-method and per-statement SQL timings collected since startup (or the last reset)"""
+        return sql_metrics.metrics.snapshot()
+
+    def format_sql_stats(self, limit=20):
+        """Get SQL timings as a plain-text table"""
+        return sql_metrics.metrics.format_report(limit)
+
+    def reset_sql_stats(self):
+        """Clear the collected SQL timings"""
+        sql_metrics.metrics.reset()
+
+    def get_report_snapshot_info(self):
+        """Get the report snapshot mode, when it was taken and its age in seconds"""
+        return self.reports.info()
+
+    def refresh_report_snapshot(self):
+        """Refresh the report snapshot now rather than when it expires"""
+        self.reports.refresh()
+
     def _initialize_paths(self):
         """Initialize all file paths consistently"""
         if getattr(sys, 'frozen', False):
@@ -282,11 +413,16 @@ class SQLiteUserSystem:
         return True, "Password meets requirements"
 
     def add_loan(self, loan_data):
-        """Add a new loan to the system"""
+        """
+        Add a new loan to the system.
+
+        Returns:
+            tuple: (success, message, changes) - see _loan_changes
+        """
         try:
             # Calculate loan details
-            amount = float(loan_data['amount'])
-            payment_per_day = float(loan_data['payment_per_day'])
+            amount = to_cents(loan_data['amount'])
+            payment_per_day = to_cents(loan_data['payment_per_day'])
             term_months = int(loan_data['term_months'])
 
             # Calculate total to repay
@@ -299,6 +435,17 @@ class SQLiteUserSystem:
 
             with self.db_manager._get_connection() as conn:
                 cursor = conn.cursor()
+                outbox.begin_operation(cursor, 'add_loan')
+
+                # One indexed probe finds the customer (or creates them);
+                # the insert trigger then counts the new loan cycle
+                customer_id = customers.resolve_or_create_customer(
+                    cursor,
+                    loan_data['customer_name'],
+                    loan_data.get('national_id', ''),
+                    loan_data.get('phone_number', ''),
+                    loan_data.get('physical_address', '')
+                )
 
                 # Insert loan record
                 cursor.execute("""
@@ -306,8 +453,8 @@ class SQLiteUserSystem:
                         customer_name, amount, payment_per_day, term_months,
                         start_date, end_date, total_to_repay, status,
                         created_by, remaining_balance, physical_address,
-                        national_id, phone_number
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        national_id, phone_number, customer_id
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     loan_data['customer_name'],
                     amount,
@@ -321,16 +468,89 @@ class SQLiteUserSystem:
                     total_to_repay,
                     loan_data.get('physical_address', ''),
                     loan_data.get('national_id', ''),
-                    loan_data.get('phone_number', '')
+                    loan_data.get('phone_number', ''),
+                    customer_id
                 ))
 
                 loan_id = cursor.lastrowid
                 conn.commit()
 
-                return True, "Loan added successfully"
+                return True, "Loan added successfully", self._loan_changes(cursor, [loan_id])
 
         except Exception as e:
-            return False, f"Error saving loan: {str(e)}"
+            return False, f"Error saving loan: {str(e)}", None
+
+    def delete_loan(self, loan_id):
+        """
+        Permanently delete a loan and its payments.
+
+        Returns:
+            tuple: (success, message, changes) - see _loan_changes
+        """
+        try:
+            with self.db_manager._get_connection() as conn:
+                cursor = conn.cursor()
+                outbox.begin_operation(cursor, 'delete_loan')
+
+                # Delete loan payments first
+                cursor.execute("DELETE FROM payments WHERE loan_id = ?", (loan_id,))
+
+                # Then delete the loan
+                cursor.execute("DELETE FROM loans WHERE loan_id = ?", (loan_id,))
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    return False, "Loan not found", None
+
+                conn.commit()
+
+                return True, f"Loan ID {loan_id} permanently deleted", self._loan_changes(cursor, deleted_ids=[loan_id])
+
+        except Exception as e:
+            return False, f"Deletion failed: {str(e)}", None
+
+    def _loan_changes(self, cursor, loan_ids=(), deleted_ids=()):
+        """
+        Describe the loans a mutation touched, so views can patch just those rows.
+
+        Returns:
+            dict: 'loans' (the touched loans' current rows, as dicts of
+                  LOAN_COLUMNS with money as Money) and 'deleted' (loan ids)
+        """
+        loans = []
+        loan_ids = list(loan_ids)
+        if loan_ids:
+            cursor.execute(
+                f"SELECT {LOAN_COLUMNS} FROM loans WHERE loan_id IN ({', '.join('?' * len(loan_ids))})",
+                loan_ids
+            )
+            columns = [desc[0] for desc in cursor.description]
+            loans = [wrap_money(dict(zip(columns, row))) for row in cursor.fetchall()]
+
+        for loan in loans:
+            self.loan_index.update(loan)
+        for loan_id in deleted_ids:
+            self.loan_index.remove(loan_id)
+        return {'loans': loans, 'deleted': list(deleted_ids)}
+
+    def _loan_index_rows(self):
+        """Rows the live search prefix index is built from"""
+        with self.db_manager._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT loan_id, customer_name, phone_number, national_id FROM loans")
+            return cursor.fetchall()
+
+    def search_loan_ids(self, term, previous=None):
+        """
+        Find loans by customer name, phone number or national ID prefix (or loan ID) in memory.
+
+        Args:
+            term (str): Search text
+            previous (PrefixMatch): The last result, narrowed when term extends it
+
+        Returns:
+            PrefixMatch: term, loan_ids (ascending) and index generation, or None for an empty term
+        """
+        return self.loan_index.search(term, previous)
 
     def get_loans_data(self):
         """Get all loans data"""
@@ -345,13 +565,272 @@ class SQLiteUserSystem:
                 FROM loans
             """)
 
+            columns = [desc[0] for desc in cursor.description]
+            return money_frame(cursor.fetchall(), columns)
+
+    def query_loans(self, status=None, overdue_as_of=None, loan_id=None, search_prefix=None,
+                    loan_ids=None, sort_by='loan_id', descending=False, after=None, limit=100):
+        """
+        Fetch one page of loans, filtered and sorted in SQL.
+
+        Args:
+            status (str): Stored status to match ("Overdue" means active and past end date)
+            overdue_as_of (str): Only active loans still owing after their end date as of this YYYY-MM-DD date
+            loan_id (int): Exact loan ID
+            search_prefix (str): Customer name, phone number or national ID prefix;
+                numeric terms also match the loan ID
+            loan_ids (list): Only these loans, e.g. from search_loan_ids
+            sort_by (str): One of LOAN_SORT_KEYS
+            descending (bool): Sort direction
+            after (tuple): Keyset cursor (sort value, loan_id) returned by the previous page
+            limit (int): Page size
+
+        Returns:
+            tuple: (DataFrame page, total matching count, cursor for the next page or None)
+        """
+        if sort_by not in LOAN_SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort_by}")
+
+        if status == 'Overdue':
+            status = None
+            overdue_as_of = overdue_as_of or datetime.now().strftime("%Y-%m-%d")
+
+        where = []
+        params = []
+
+        if status:
+            where.append("status = ?")
+            params.append(status)
+
+        if overdue_as_of:
+            where.append("status = 'Active' AND end_day < ? AND remaining_balance > 0")
+            params.append(to_day_number(overdue_as_of))
+
+        if loan_id is not None:
+            where.append("loan_id = ?")
+            params.append(int(loan_id))
+
+        if loan_ids is not None:
+            # One JSON parameter rather than a placeholder per ID, however many there are
+            where.append("loan_id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([int(value) for value in loan_ids]))
+
+        search_prefix = (search_prefix or "").strip()
+        match_query = search_index.build_match_query(search_prefix)
+        if search_prefix and self.db_manager.search_enabled and match_query:
+            # Full-text index covers name, phone and national ID prefixes
+            terms = [f"loan_id IN (SELECT rowid FROM {search_index.SEARCH_TABLE} "
+                     f"WHERE {search_index.SEARCH_TABLE} MATCH ? AND rowid > 0)"]
+            term_params = [match_query]
+            if search_prefix.isdigit():
+                terms.append("loan_id = ?")
+                term_params.append(int(search_prefix))
+            where.append(f"({' OR '.join(terms)})")
+            params.extend(term_params)
+        elif search_prefix:
+            # Range predicates rather than LIKE so both indexes can be used
+            prefix = search_prefix.lower()
+            terms = [
+                "(customer_name >= ? COLLATE NOCASE AND customer_name < ? COLLATE NOCASE)",
+                "(phone_number >= ? AND phone_number < ?)"
+            ]
+            term_params = [prefix, _prefix_upper_bound(prefix),
+                           search_prefix, _prefix_upper_bound(search_prefix)]
+            if search_prefix.isdigit():
+                terms.append("loan_id = ?")
+                term_params.append(int(search_prefix))
+            where.append(f"({' OR '.join(terms)})")
+            params.extend(term_params)
+
+        order_expr = LOAN_SORT_KEYS[sort_by]
+        direction = "DESC" if descending else "ASC"
+
+        page_where = list(where)
+        page_params = list(params)
+        if after is not None:
+            comparison = "<" if descending else ">"
+            if sort_by == 'loan_id':
+                page_where.append(f"loan_id {comparison} ?")
+                page_params.append(after[-1])
+            else:
+                page_where.append(f"({order_expr}, loan_id) {comparison} (?, ?)")
+                page_params.extend(after)
+
+        def where_sql(clauses):
+            return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self.db_manager._get_connection() as conn:
+            cursor = conn.cursor()
+
+            # Fetch one extra row to learn whether another page exists
+            page_sql = f"""
+                SELECT {LOAN_COLUMNS}
+                FROM loans
+                {where_sql(page_where)}
+                ORDER BY {order_expr} {direction}, loan_id {direction}
+                LIMIT ?
+            """
+            try:
+                cursor.execute(page_sql, page_params + [limit + 1])
+            except sqlite3.OperationalError as e:
+                if not search_index.is_missing_index_error(e) or not self.db_manager.ensure_search_index():
+                    raise
+                cursor.execute(page_sql, page_params + [limit + 1])
+
             columns = [desc[0] for desc in cursor.description]
             rows = cursor.fetchall()
 
-            if not rows:
-                return pd.DataFrame(columns=columns)
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = dict(zip(columns, rows[-1]))
+                next_cursor = (last[sort_by], last['loan_id'])
+
+            status_only = not (overdue_as_of or loan_id is not None or search_prefix or loan_ids is not None)
+            total = self._count_loans(cursor, where_sql(where), params, status, status_only)
+
+        page = money_frame(rows, columns)
+        return page, total, next_cursor
+
+    def _count_loans(self, cursor, where_sql, params, status, status_only):
+        """Count loans matching a filter, using the portfolio counters when possible"""
+        if status_only and status in (None, 'Active', 'Paid'):
+            column = {None: 'loan_count', 'Active': 'active_loans', 'Paid': 'paid_loans'}[status]
+            cursor.execute(f"SELECT {column} FROM portfolio_totals WHERE id = 1")
+            result = cursor.fetchone()
+            if result:
+                return result[0]
+
+        cursor.execute(f"SELECT COUNT(*) FROM loans {where_sql}", params)
+        return cursor.fetchone()[0]
+
+    def get_overdue_loans(self, as_of_date=None):
+        """Active loans still owing after their end date, most overdue first"""
+        return self._select_loans(
+            "status = 'Active' AND end_day < ? AND remaining_balance > 0",
+            [to_day_number(as_of_date)],
+            "end_day, loan_id"
+        )
+
+    def get_loans_due_between(self, start_date, end_date):
+        """Active loans whose end date falls between start_date and end_date inclusive"""
+        return self._select_loans(
+            "status = 'Active' AND end_day BETWEEN ? AND ?",
+            [to_day_number(start_date), to_day_number(end_date)],
+            "end_day, loan_id"
+        )
+
+    def get_loans_due_this_week(self, as_of_date=None):
+        """Active loans due in the Monday-Sunday week containing as_of_date (default today)"""
+        day = to_day_number(as_of_date)
+        monday = day - (day + 3) % 7  # Day 0 (1970-01-01) was a Thursday
+        return self._select_loans(
+            "status = 'Active' AND end_day BETWEEN ? AND ?",
+            [monday, monday + 6],
+            "end_day, loan_id"
+        )
+
+    def get_payments_between(self, start_date, end_date, loan_id=None, include_archive=False):
+        """
+        Get payments dated between start_date and end_date inclusive.
+
+        Args:
+            include_archive (bool): Also include payments of archived loans
+
+        Returns:
+            DataFrame: payment_id, loan_id, date, amount, received_by, notes - oldest first
+        """
+        if include_archive:
+            # The archive has no day column, so filter on the ISO date text
+            table, order = "all_payments", "date"
+            where = "date BETWEEN ? AND ?"
+            params = [str(start_date)[:10], str(end_date)[:10]]
+        else:
+            table, order = "payments", "day"
+            where = "day BETWEEN ? AND ?"
+            params = [to_day_number(start_date), to_day_number(end_date)]
+        if loan_id is not None:
+            where += " AND loan_id = ?"
+            params.append(int(loan_id))
+
+        with self.reports.connection() as conn:
+            cursor = conn.cursor()
+            if include_archive:
+                archive.create_union_views(cursor)
+            cursor.execute(f"""
+                SELECT payment_id, loan_id, date, amount, received_by, notes
+                FROM {table}
+                WHERE {where}
+                ORDER BY {order}, payment_id
+            """, params)
+
+            columns = [desc[0] for desc in cursor.description]
+            return money_frame(cursor.fetchall(), columns)
+
+    def _select_loans(self, where, params, order_by):
+        """Run a loan listing query with LOAN_COLUMNS"""
+        with self.db_manager._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {LOAN_COLUMNS}
+                FROM loans
+                WHERE {where}
+                ORDER BY {order_by}
+            """, params)
+
+            columns = [desc[0] for desc in cursor.description]
+            return money_frame(cursor.fetchall(), columns)
+
+    def search_customers(self, term, limit=20):
+        """
+        Ranked prefix search over customer name, phone number and national ID.
+
+        Returns:
+            DataFrame: source ('loan' or 'customer'), loan_id (missing for customer records),
+                       customer_id (missing for loan records), customer_name, phone_number,
+                       national_id and rank, best match first
+        """
+        columns = ['source', 'ref_id', 'customer_name', 'phone_number', 'national_id', 'rank']
 
-            return pd.DataFrame(rows, columns=columns)
+        with self.db_manager._get_connection() as conn:
+            cursor = conn.cursor()
+
+            if not self.db_manager.search_enabled:
+                rows = self._search_customers_fallback(cursor, term, limit)
+            else:
+                try:
+                    rows = search_index.search(cursor, term, limit)
+                except sqlite3.OperationalError as e:
+                    if not search_index.is_missing_index_error(e):
+                        raise
+                    # Index was dropped or never built - rebuild it and retry
+                    if self.db_manager.ensure_search_index():
+                        rows = search_index.search(cursor, term, limit)
+                    else:
+                        rows = self._search_customers_fallback(cursor, term, limit)
+
+        results = pd.DataFrame(rows, columns=columns)
+        results['loan_id'] = results['ref_id'].where(results['source'] == 'loan', None)
+        results['customer_id'] = results['ref_id'].where(results['source'] == 'customer', None)
+        return results.drop(columns=['ref_id'])
+
+    def _search_customers_fallback(self, cursor, term, limit):
+        """Prefix search over loans when the full-text index is unavailable"""
+        term = (term or "").strip()
+        if not term:
+            return []
+
+        pattern = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        cursor.execute("""
+            SELECT 'loan', loan_id, customer_name, phone_number, national_id, 0
+            FROM loans
+            WHERE customer_name LIKE ? ESCAPE '\\'
+               OR phone_number LIKE ? ESCAPE '\\'
+               OR national_id LIKE ? ESCAPE '\\'
+            ORDER BY customer_name
+            LIMIT ?
+        """, (pattern, pattern, pattern, limit))
+        return cursor.fetchall()
 
     def get_loan_details(self, loan_id):
         """Get details for a specific loan"""
@@ -365,7 +844,7 @@ class SQLiteUserSystem:
                         loan_id, customer_name, amount, payment_per_day,
                         term_months, start_date, end_date, total_to_repay,
                         status, created_by, remaining_balance, physical_address,
-                        national_id, phone_number
+                        national_id, phone_number, start_day, end_day
                     FROM loans
                     WHERE loan_id = ?
                 """, (loan_id,))
@@ -377,7 +856,7 @@ class SQLiteUserSystem:
 
                 # Get column names
                 columns = [desc[0] for desc in cursor.description]
-                loan_dict = dict(zip(columns, loan_data))
+                loan_dict = wrap_money(dict(zip(columns, loan_data)))
 
                 # Get payments for this loan
                 cursor.execute("""
@@ -390,7 +869,7 @@ class SQLiteUserSystem:
 
                 payments = cursor.fetchall()
                 payment_columns = [desc[0] for desc in cursor.description]
-                payments_df = pd.DataFrame(payments, columns=payment_columns) if payments else pd.DataFrame()
+                payments_df = money_frame(payments, payment_columns) if payments else pd.DataFrame()
 
                 return loan_dict, payments_df
 
@@ -398,36 +877,171 @@ class SQLiteUserSystem:
             messagebox.showerror("Error", f"Could not load loan details: {str(e)}")
             return None, None
 
+    def get_loan_overview(self, loan_id):
+        """
+        Get a loan and its payment totals, without loading its payments.
+
+        Returns:
+            tuple: (loan dict or None, stats dict with payment_count, payment_days
+                   (distinct payment dates), total_paid and last_payment (the most
+                   recent payment as a dict, or None))
+        """
+        with self.db_manager._get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                SELECT
+                    loan_id, customer_name, amount, payment_per_day,
+                    term_months, start_date, end_date, total_to_repay,
+                    status, created_by, remaining_balance, physical_address,
+                    national_id, phone_number, start_day, end_day
+                FROM loans
+                WHERE loan_id = ?
+            """, (loan_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None, None
+            loan = wrap_money(dict(zip([desc[0] for desc in cursor.description], row)))
+
+            cursor.execute("""
+                SELECT COUNT(*), COUNT(DISTINCT date), COALESCE(SUM(amount), 0)
+                FROM payments
+                WHERE loan_id = ?
+            """, (loan_id,))
+            payment_count, payment_days, total_paid = cursor.fetchone()
+
+            cursor.execute("""
+                SELECT payment_id, date, amount, received_by, notes
+                FROM payments
+                WHERE loan_id = ?
+                ORDER BY date DESC, payment_id DESC
+                LIMIT 1
+            """, (loan_id,))
+            last = cursor.fetchone()
+            last_payment = wrap_money(dict(zip([desc[0] for desc in cursor.description], last))) if last else None
+
+        return loan, {
+            'payment_count': payment_count,
+            'payment_days': payment_days,
+            'total_paid': Money(total_paid),
+            'last_payment': last_payment,
+        }
+
+    def get_loan_payments(self, loan_id, after=None, limit=100):
+        """
+        Fetch one page of a loan's payments, newest first.
+
+        Args:
+            loan_id (int): Loan to fetch payments for
+            after (tuple): Keyset cursor (date, payment_id) returned by the previous page
+            limit (int): Page size, or None for every remaining payment
+
+        Returns:
+            tuple: (DataFrame page, cursor for the next page or None)
+        """
+        where = "loan_id = ?"
+        params = [loan_id]
+        if after is not None:
+            where += " AND (date, payment_id) < (?, ?)"
+            params.extend(after)
+
+        with self.db_manager._get_connection() as conn:
+            cursor = conn.cursor()
+            # Fetch one extra row to learn whether another page exists
+            cursor.execute(f"""
+                SELECT payment_id, date, amount, received_by, notes
+                FROM payments
+                WHERE {where}
+                ORDER BY date DESC, payment_id DESC
+                LIMIT ?
+            """, params + [-1 if limit is None else limit + 1])
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = dict(zip(columns, rows[-1]))
+            next_cursor = (last['date'], last['payment_id'])
+
+        return money_frame(rows, columns), next_cursor
+
+    def get_loan_payment(self, loan_id, payment_id):
+        """
+        Fetch one of a loan's payments by id, wherever it falls in the history.
+
+        Returns:
+            DataFrame: The payment, with the columns of get_loan_payments, or empty if
+                       the loan has no such payment
+        """
+        with self.db_manager._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT payment_id, date, amount, received_by, notes
+                FROM payments
+                WHERE payment_id = ? AND loan_id = ?
+            """, (payment_id, loan_id))
+            columns = [desc[0] for desc in cursor.description]
+            return money_frame(cursor.fetchall(), columns)
+
     def update_loan(self, loan_id, updated_data):
-        """Update a loan record"""
+        """
+        Update a loan record.
+
+        Returns:
+            tuple: (success, message, changes) - the updated loan is changes['loans'][0]
+        """
         try:
             with self.db_manager._get_connection() as conn:
                 cursor = conn.cursor()
+                outbox.begin_operation(cursor, 'update_loan')
 
                 # Get current loan data
                 cursor.execute("""
                     SELECT 
                         payment_per_day, term_months, start_date, status,
-                        total_to_repay
+                        total_to_repay, remaining_balance
                     FROM loans
                     WHERE loan_id = ?
                 """, (loan_id,))
 
                 current_data = cursor.fetchone()
                 if not current_data:
+                    conn.rollback()
                     return False, "Loan not found", None
 
+                # Money arrives in currency units and is stored as cents
+                for field in ('amount', 'payment_per_day'):
+                    if field in updated_data:
+                        updated_data[field] = to_cents(updated_data[field])
+
                 # Calculate any derived fields
                 if 'payment_per_day' in updated_data or 'term_months' in updated_data:
-                    payment = float(updated_data.get('payment_per_day', current_data[0]))
+                    payment = updated_data.get('payment_per_day', current_data[0])
                     term = int(updated_data.get('term_months', current_data[1]))
                     updated_data['total_to_repay'] = payment * (term * 30)
 
                     if updated_data.get('status', current_data[3]) == 'Active':
-                        updated_data['remaining_balance'] = updated_data['total_to_repay']
+                        # Keep what has already been paid against the new total
+                        amount_paid = current_data[4] - current_data[5]
+                        updated_data['remaining_balance'] = max(0, updated_data['total_to_repay'] - amount_paid)
                     else:
                         updated_data['remaining_balance'] = 0
 
+                # Re-link the loan if the customer's details changed
+                identity_fields = ('customer_name', 'national_id', 'phone_number', 'physical_address')
+                if any(field in updated_data for field in identity_fields):
+                    cursor.execute("""
+                        SELECT customer_name, national_id, phone_number, physical_address
+                        FROM loans WHERE loan_id = ?
+                    """, (loan_id,))
+                    identity = dict(zip(identity_fields, cursor.fetchone()))
+                    identity.update({field: updated_data[field] for field in identity_fields if field in updated_data})
+                    updated_data['customer_id'] = customers.resolve_or_create_customer(
+                        cursor, identity['customer_name'], identity['national_id'],
+                        identity['phone_number'], identity['physical_address']
+                    )
+
                 # Update dates if needed
                 if 'start_date' in updated_data or 'term_months' in updated_data:
                     start_date = datetime.strptime(
@@ -456,31 +1070,22 @@ class SQLiteUserSystem:
                 cursor.execute(update_query, params)
                 conn.commit()
 
-                # Get updated loan data
-                cursor.execute("""
-                    SELECT 
-                        loan_id, customer_name, amount, payment_per_day,
-                        term_months, start_date, end_date, total_to_repay,
-                        status, created_by, remaining_balance, physical_address,
-                        national_id, phone_number
-                    FROM loans
-                    WHERE loan_id = ?
-                """, (loan_id,))
-
-                updated_loan = cursor.fetchone()
-                columns = [desc[0] for desc in cursor.description]
-                updated_loan_dict = dict(zip(columns, updated_loan))
-
-                return True, "Loan updated successfully", updated_loan_dict
+                return True, "Loan updated successfully", self._loan_changes(cursor, [loan_id])
 
         except Exception as e:
             return False, f"Error updating loan: {str(e)}", None
 
     def add_payment(self, loan_id, payment_data):
-        """Add a payment to a loan"""
+        """
+        Add a payment to a loan.
+
+        Returns:
+            tuple: (success, message, changes) - see _loan_changes
+        """
         try:
             with self.db_manager._get_connection() as conn:
                 cursor = conn.cursor()
+                outbox.begin_operation(cursor, 'add_payment')
 
                 # Verify loan exists
                 cursor.execute("SELECT status, total_to_repay, remaining_balance FROM loans WHERE loan_id = ?",
@@ -488,6 +1093,7 @@ class SQLiteUserSystem:
                 loan = cursor.fetchone()
 
                 if not loan:
+                    conn.rollback()
                     return False, "Loan not found", None
 
                 status, total_to_repay, current_balance = loan
@@ -500,7 +1106,7 @@ class SQLiteUserSystem:
                 """, (
                     loan_id,
                     payment_data['date'],
-                    float(payment_data['amount']),
+                    to_cents(payment_data['amount']),
                     payment_data['received_by'],
                     payment_data.get('notes', '')
                 ))
@@ -508,7 +1114,7 @@ class SQLiteUserSystem:
                 payment_id = cursor.lastrowid
 
                 # Update loan balance
-                payment_amount = float(payment_data['amount'])
+                payment_amount = to_cents(payment_data['amount'])
                 new_balance = max(0, current_balance - payment_amount)
 
                 # Update status if fully paid
@@ -525,93 +1131,159 @@ class SQLiteUserSystem:
 
                 conn.commit()
 
-                # Return updated loan data
-                loans_df = self.get_loans_data()
-                return True, "Payment recorded successfully", loans_df
+                # Return only the loan that changed
+                return True, "Payment recorded successfully", self._loan_changes(cursor, [loan_id])
 
         except Exception as e:
             return False, f"Error processing payment: {str(e)}", None
 
-    def get_loan_cycle(self, customer_name, national_id="", phone_number=""):
-        """Get loan cycle count for a customer"""
+    def add_payments_bulk(self, payments):
+        """
+        Record a batch of payments in one transaction.
+
+        The whole batch is validated before anything is written; if any row
+        is invalid nothing is recorded. Balances and statuses are updated
+        with a single set-based UPDATE.
+
+        Args:
+            payments: Iterable of dicts with loan_id, date, amount, received_by
+                      and optional notes
+
+        Returns:
+            tuple: (success, message, changes) - see _loan_changes, plus
+                   'payments': {loan_id: {'payments', 'amount_paid',
+                   'remaining_balance', 'status'}}; pass changes to
+                   apply_loan_changes() to patch the loans table
+        """
+        rows = []
+        totals = {}
+
+        # Validate every row before touching the database
+        for index, payment in enumerate(payments, 1):
+            if not isinstance(payment, Mapping):
+                return False, f"Row {index}: invalid row (expected a payment record, got {type(payment).__name__})", None
+            try:
+                loan_id = int(payment['loan_id'])
+                amount = to_cents(payment['amount'])
+                date = str(payment['date'])
+                datetime.strptime(date, "%Y-%m-%d")
+                received_by = str(payment['received_by'])
+                notes = str(payment.get('notes', '') or '')
+            except KeyError as e:
+                return False, f"Row {index}: missing field {e}", None
+            except (TypeError, ValueError) as e:
+                return False, f"Row {index}: invalid value ({str(e)})", None
+
+            if amount <= 0:
+                return False, f"Row {index}: amount must be greater than zero", None
+
+            rows.append((loan_id, date, amount, received_by, notes))
+            count, total = totals.get(loan_id, (0, 0))
+            totals[loan_id] = (count + 1, total + amount)
+
+        if not rows:
+            return False, "No payments to record", None
+
         try:
             with self.db_manager._get_connection() as conn:
                 cursor = conn.cursor()
+                outbox.begin_operation(cursor, 'add_payments_bulk')
 
-                # Try matching by most reliable identifier first
-                if phone_number:
-                    cursor.execute("""
-                        SELECT loan_cycles FROM loan_cycles
-                        WHERE phone_number = ?
-                    """, (phone_number,))
-                    result = cursor.fetchone()
-                    if result:
-                        return result[0]
-
-                # Fallback to national_id if available
-                if national_id:
-                    cursor.execute("""
-                        SELECT loan_cycles FROM loan_cycles
-                        WHERE national_id = ?
-                    """, (national_id,))
-                    result = cursor.fetchone()
-                    if result:
-                        return result[0]
-
-                # Final fallback - name only
                 cursor.execute("""
-                    SELECT loan_cycles FROM loan_cycles
-                    WHERE customer_name = ?
-                """, (customer_name,))
-                result = cursor.fetchone()
+                    CREATE TEMP TABLE IF NOT EXISTS payment_batch (
+                        loan_id INTEGER PRIMARY KEY,
+                        payment_count INTEGER NOT NULL,
+                        amount INTEGER NOT NULL
+                    )
+                """)
+                cursor.execute("DELETE FROM temp.payment_batch")
+                cursor.executemany(
+                    "INSERT INTO temp.payment_batch (loan_id, payment_count, amount) VALUES (?, ?, ?)",
+                    [(loan_id, count, total) for loan_id, (count, total) in totals.items()]
+                )
+
+                # Every loan in the batch must exist
+                cursor.execute("""
+                    SELECT b.loan_id FROM temp.payment_batch b
+                    LEFT JOIN loans l ON l.loan_id = b.loan_id
+                    WHERE l.loan_id IS NULL
+                """)
+                missing = [str(row[0]) for row in cursor.fetchall()]
+                if missing:
+                    conn.rollback()
+                    return False, f"Loan(s) not found: {', '.join(missing)}", None
 
-                return result[0] if result else 1
+                cursor.executemany("""
+                    INSERT INTO payments (
+                        loan_id, date, amount, received_by, notes
+                    ) VALUES (?, ?, ?, ?, ?)
+                """, rows)
+
+                # Apply every balance change in one statement
+                cursor.execute("""
+                    UPDATE loans
+                    SET remaining_balance = MAX(0, remaining_balance - (
+                            SELECT b.amount FROM temp.payment_batch b WHERE b.loan_id = loans.loan_id
+                        )),
+                        status = CASE
+                            WHEN remaining_balance - (
+                                SELECT b.amount FROM temp.payment_batch b WHERE b.loan_id = loans.loan_id
+                            ) <= 0 THEN 'Paid'
+                            ELSE status
+                        END,
+                        last_updated = CURRENT_TIMESTAMP
+                    WHERE loan_id IN (SELECT loan_id FROM temp.payment_batch)
+                """)
+
+                cursor.execute("""
+                    SELECT l.loan_id, b.payment_count, b.amount, l.remaining_balance, l.status
+                    FROM temp.payment_batch b
+                    JOIN loans l ON l.loan_id = b.loan_id
+                """)
+                results = {
+                    loan_id: {
+                        'payments': count,
+                        'amount_paid': Money(amount),
+                        'remaining_balance': Money(balance),
+                        'status': status
+                    }
+                    for loan_id, count, amount, balance, status in cursor.fetchall()
+                }
+
+                cursor.execute("DELETE FROM temp.payment_batch")
+                conn.commit()
+
+                changes = self._loan_changes(cursor, list(results))
+                changes['payments'] = results
+                return True, f"Recorded {len(rows)} payments for {len(results)} loans", changes
+
+        except Exception as e:
+            return False, f"Error processing payments: {str(e)}", None
+
+    def get_loan_cycle(self, customer_name, national_id="", phone_number=""):
+        """Get loan cycle count for a customer"""
+        try:
+            with self.db_manager._get_connection() as conn:
+                found = customers.find_customer(conn.cursor(), customer_name, national_id, phone_number)
+                return max(1, found[1]) if found else 1
 
         except Exception as e:
             print(f"Error in get_loan_cycle: {str(e)}")
             return 1  # Always return 1 if any error occurs
 
     def update_loan_cycle(self, customer_name, national_id="", phone_number=""):
-        """Update loan cycle count for a customer"""
+        """Count an extra loan cycle for a customer (new loans are counted automatically)"""
         try:
             with self.db_manager._get_connection() as conn:
                 cursor = conn.cursor()
-
-                # Find existing record
-                if phone_number:
-                    cursor.execute("""
-                        SELECT id FROM loan_cycles
-                        WHERE phone_number = ?
-                    """, (phone_number,))
-                    result = cursor.fetchone()
-                elif national_id:
-                    cursor.execute("""
-                        SELECT id FROM loan_cycles
-                        WHERE national_id = ?
-                    """, (national_id,))
-                    result = cursor.fetchone()
-                else:
-                    cursor.execute("""
-                        SELECT id FROM loan_cycles
-                        WHERE customer_name = ?
-                    """, (customer_name,))
-                    result = cursor.fetchone()
-
-                if result:
-                    # Update existing record
-                    cursor.execute("""
-                        UPDATE loan_cycles
-                        SET loan_cycles = loan_cycles + 1
-                        WHERE id = ?
-                    """, (result[0],))
-                else:
-                    # Insert new record
-                    cursor.execute("""
-                        INSERT INTO loan_cycles (
-                            customer_name, national_id, phone_number, loan_cycles
-                        ) VALUES (?, ?, ?, 1)
-                    """, (customer_name, national_id, phone_number))
-
+                customer_id = customers.resolve_or_create_customer(
+                    cursor, customer_name, national_id, phone_number
+                )
+                cursor.execute("""
+                    UPDATE customers
+                    SET loan_cycles = loan_cycles + 1
+                    WHERE customer_id = ?
+                """, (customer_id,))
                 conn.commit()
                 return True
 
@@ -620,51 +1292,87 @@ class SQLiteUserSystem:
             return False
 
     def get_daily_financial_summary(self):
-        """Calculate all required financial metrics"""
+        """Read the trigger-maintained financial metrics"""
+        today = datetime.now().strftime("%Y-%m-%d")
+
         with self.db_manager._get_connection() as conn:
-            cursor = conn.cursor()
+            (amount_given, outstanding, total_interest, daily_paid,
+             active_loans, paid_loans, total_loans) = portfolio.read_summary(conn.cursor(), today)
 
-            # Get total amount given
-            cursor.execute("SELECT COALESCE(SUM(amount), 0) FROM loans")
-            amount_given = cursor.fetchone()[0]
+            return {
+                'amount_given': Money(amount_given),
+                'outstanding': Money(outstanding),
+                'total_interest': Money(total_interest),
+                'daily_paid': Money(daily_paid),
+                'active_loans': active_loans,
+                'paid_loans': paid_loans,
+                'total_loans': total_loans
+            }
 
-            # Get outstanding balance
-            cursor.execute("SELECT COALESCE(SUM(remaining_balance), 0) FROM loans")
-            outstanding = cursor.fetchone()[0]
+    def verify_portfolio_totals(self, repair=False):
+        """Recompute portfolio totals from scratch and report any drift"""
+        with self.db_manager._get_connection() as conn:
+            drift = portfolio.verify_portfolio_totals(conn.cursor(), repair=repair)
+            conn.commit()
+            return drift
 
-            # Get total interest
-            cursor.execute("SELECT COALESCE(SUM(total_to_repay - amount), 0) FROM loans")
-            total_interest = cursor.fetchone()[0]
+    def get_balance_at(self, loan_id, as_of_date=None):
+        """Get a loan's balance at the end of a day from the ledger (Money, or None)"""
+        with self.db_manager._get_connection() as conn:
+            return ledger.balance_at(conn.cursor(), loan_id, as_of_date)
 
-            # Get today's payments
-            today = datetime.now().strftime("%Y-%m-%d")
-            cursor.execute("""
-                SELECT COALESCE(SUM(amount), 0) FROM payments
-                WHERE date = ?
-            """, (today,))
-            daily_paid = cursor.fetchone()[0]
+    def get_loan_ledger(self, loan_id):
+        """Get a loan's balance ledger as a DataFrame with a running balance"""
+        with self.db_manager._get_connection() as conn:
+            rows = ledger.get_ledger(conn.cursor(), loan_id)
+        df = money_frame(rows, ['entry_id', 'day', 'kind', 'amount', 'balance_after', 'recorded_at'])
+        df['balance_after'] = df['balance_after'].fillna(0).astype('int64')
+        return df
 
-            # Count active and paid loans
-            cursor.execute("SELECT COUNT(*) FROM loans WHERE status = 'Active'")
-            active_loans = cursor.fetchone()[0]
+    def get_outbox_status(self):
+        """Operations made offline that are still waiting to be replayed to the network database"""
+        with self.db_manager._get_connection() as conn:
+            return outbox.get_status(conn.cursor())
 
-            cursor.execute("SELECT COUNT(*) FROM loans WHERE status = 'Paid'")
-            paid_loans = cursor.fetchone()[0]
+    def get_sync_status(self):
+        """Sync scheduler state: last success, pending changes, last error, ..."""
+        return self.network_manager.get_sync_status()
 
-            return {
-                'amount_given': amount_given,
-                'outstanding': outstanding,
-                'total_interest': total_interest,
-                'daily_paid': daily_paid,
-                'active_loans': active_loans,
-                'paid_loans': paid_loans
-            }
+    def get_share_health(self):
+        """Network share availability, latency and throughput from the last probe"""
+        return self.network_manager.get_share_health()
+
+    def sync_now(self):
+        """Ask the scheduler to sync straight away"""
+        if self.network_manager.sync_scheduler is not None:
+            self.network_manager.sync_scheduler.sync_now()
+
+    def get_sync_conflicts(self, limit=100):
+        """Get the most recent sync conflicts as a DataFrame, newest first"""
+        with self.db_manager._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT conflict_id, table_name, row_id, kind, kept, discarded,
+                       operations, peer_site_id, detected_at
+                FROM sync_conflicts
+                ORDER BY conflict_id DESC
+                LIMIT ?
+            """, (limit,))
+            columns = [desc[0] for desc in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def verify_ledger(self, repair=False):
+        """Compare stored loan balances with the ledger and report any drift"""
+        with self.db_manager._get_connection() as conn:
+            drift = ledger.verify_ledger(conn.cursor(), repair=repair)
+            conn.commit()
+            return drift
 
     def get_payment_compliance_report(self):
         """Get list of loans with payment compliance status"""
         today = datetime.now().strftime("%Y-%m-%d")
 
-        with self.db_manager._get_connection() as conn:
+        with self.reports.connection() as conn:
             cursor = conn.cursor()
 
             # Get active loans and their payment status for today
@@ -682,132 +1390,131 @@ class SQLiteUserSystem:
             results = cursor.fetchall()
             columns = [desc[0] for desc in cursor.description]
 
-            if not results:
-                return pd.DataFrame(columns=columns)
+            # Arrears from the portfolio-wide calculation (no per-loan queries), same snapshot
+            arrears = self._query_missed_payments(cursor, today)[['loan_id', 'missed_days', 'arrears']]
 
-            return pd.DataFrame(results, columns=columns)
+        compliance = money_frame(results, columns)
+        compliance = compliance.merge(arrears, on='loan_id', how='left')
+        compliance[['missed_days', 'arrears']] = compliance[['missed_days', 'arrears']].fillna(0).astype('int64')
+        return compliance
 
-    def generate_payments_summary_report(self):
-        """Generate summary report of all payments"""
-        with self.db_manager._get_connection() as conn:
+    def generate_payments_summary_report(self, include_archive=False):
+        """
+        Generate summary report of all payments.
+
+        Args:
+            include_archive (bool): Also include archived (settled) loans and their payments
+        """
+        loans_table, payments_table = ('all_loans', 'all_payments') if include_archive else ('loans', 'payments')
+
+        with self.reports.connection() as conn:
             cursor = conn.cursor()
+            if include_archive:
+                archive.create_union_views(cursor)
 
             # Get loan summary with payment info
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT 
                     l.loan_id, l.customer_name, l.amount as loan_amount,
                     COALESCE(SUM(p.amount), 0) as total_paid,
                     l.remaining_balance as remaining,
                     l.status,
                     COALESCE(MAX(p.date), 'Never') as last_payment
-                FROM loans l
-                LEFT JOIN payments p ON l.loan_id = p.loan_id
+                FROM {loans_table} l
+                LEFT JOIN {payments_table} p ON l.loan_id = p.loan_id
                 GROUP BY l.loan_id, l.customer_name, l.amount, l.remaining_balance, l.status
             """)
 
-            results = cursor.fetchall()
             columns = [desc[0] for desc in cursor.description]
-
-            if not results:
-                return pd.DataFrame(columns=columns)
-
-            return pd.DataFrame(results, columns=columns)
+            return money_frame(cursor.fetchall(), columns)
 
     def reset_daily_payments(self):
-        """Reset daily payments tracking and clean up old loans"""
+        """Reset daily payments tracking and archive old paid loans"""
         try:
-            with self.db_manager._get_connection() as conn:
-                cursor = conn.cursor()
-
-                # Archive and delete paid loans older than 24 hours
-                cutoff_time = (datetime.now() - timedelta(hours=24)).strftime("%Y-%m-%d %H:%M:%S")
-
-                # Get loans to archive
-                cursor.execute("""
-                    SELECT * FROM loans
-                    WHERE status = 'Paid' 
-                    AND last_updated < ?
-                """, (cutoff_time,))
-
-                old_loans = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
-
-                # Delete these loans
-                cursor.execute("""
-                    DELETE FROM loans
-                    WHERE status = 'Paid' 
-                    AND last_updated < ?
-                """, (cutoff_time,))
-
-                # Also delete their payments
-                cursor.execute("""
-                    DELETE FROM payments
-                    WHERE loan_id IN (
-                        SELECT loan_id FROM loans
-                        WHERE status = 'Paid'
-                        AND last_updated < ?
-                    )
-                """, (cutoff_time,))
-
-                conn.commit()
-
-                return {
-                    'paid_loans': len(old_loans),
-                    'active_loans': self.get_daily_financial_summary()['active_loans']
-                }
-
-        except Exception as e:
-            print(f"Error in reset_daily_payments: {str(e)}")
-            return None
-
-    def get_missed_payments(self, loan_id):
-        """Calculate accumulated missed payments for a loan"""
-        with self.db_manager._get_connection() as conn:
-            cursor = conn.cursor()
-
-            # Get loan details
-            cursor.execute("""
-                SELECT payment_per_day, start_date, status
-                FROM loans
-                WHERE loan_id = ?
-            """, (loan_id,))
-
-            loan = cursor.fetchone()
-            if not loan:
-                return 0
-
-            daily_payment, start_date_str, status = loan
-
-            # If loan is paid, no missed payments
-            if status == "Paid":
-                return 0
-
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-            today = datetime.now().date()
-
-            # Calculate expected payment days
-            expected_days = (today - start_date).days + 1
-
-            # Get actual unique payment days
-            cursor.execute("""
-                SELECT COUNT(DISTINCT date) 
-                FROM payments
-                WHERE loan_id = ?
-            """, (loan_id,))
+            removed = self.eod.cleanup_paid_loans()
+            return {
+                'paid_loans': removed,
+                'active_loans': self.get_daily_financial_summary()['active_loans']
+            }
 
-            unique_payment_days = cursor.fetchone()[0] or 0
+        except Exception as e:
+            print(f"Error in reset_daily_payments: {str(e)}")
+            return None
 
-            # Calculate missed days and accumulated amount
-            missed_days = max(0, expected_days - unique_payment_days)
-            accumulated_amount = missed_days * daily_payment
+    def get_missed_payments(self, loan_id):
+        """Calculate accumulated missed payments for a loan"""
+        arrears = self.get_missed_payments_bulk(loan_ids=[loan_id])
+        if arrears.empty:
+            return Money(0)
+        return Money(arrears.iloc[0]['arrears'])
+
+    def get_missed_payments_bulk(self, as_of_date=None, loan_ids=None):
+        """
+        Calculate missed payment days and arrears for every active loan in one query.
+
+        Expected days run from the start date to as_of_date inclusive; paid days
+        are distinct payment dates on or before as_of_date.
+
+        Args:
+            as_of_date (str): YYYY-MM-DD date to measure arrears at (default today)
+            loan_ids (list): Restrict to these loans
+
+        Returns:
+            DataFrame: loan_id, customer_name, phone_number, payment_per_day, start_date,
+                       expected_days, paid_days, missed_days, arrears - largest arrears first
+        """
+        with self.db_manager._get_connection() as conn:
+            return self._query_missed_payments(conn.cursor(), as_of_date, loan_ids)
+
+    def _query_missed_payments(self, cursor, as_of_date=None, loan_ids=None):
+        """Run the arrears query for get_missed_payments_bulk on a given cursor"""
+        as_of_day = to_day_number(as_of_date)
+
+        loan_filter = ""
+        params = [as_of_day, as_of_day]
+        if loan_ids is not None:
+            loan_ids = [int(loan_id) for loan_id in loan_ids]
+            loan_filter = f"AND l.loan_id IN ({', '.join('?' * len(loan_ids))})" if loan_ids else "AND 0"
+            params.extend(loan_ids)
+
+        cursor.execute(f"""
+            WITH paid AS (
+                SELECT loan_id, COUNT(DISTINCT day) AS paid_days
+                FROM payments
+                WHERE day <= ?
+                GROUP BY loan_id
+            ),
+            expected AS (
+                SELECT
+                    l.loan_id, l.customer_name, l.phone_number, l.payment_per_day, l.start_date,
+                    MAX(0, ? - l.start_day + 1) AS expected_days,
+                    COALESCE(p.paid_days, 0) AS paid_days
+                FROM loans l
+                LEFT JOIN paid p ON p.loan_id = l.loan_id
+                WHERE l.status = 'Active' {loan_filter}
+            )
+            SELECT
+                *,
+                MAX(0, expected_days - paid_days) AS missed_days,
+                MAX(0, expected_days - paid_days) * payment_per_day AS arrears
+            FROM expected
+            ORDER BY arrears DESC, loan_id
+        """, params)
 
-            return accumulated_amount
+        columns = [desc[0] for desc in cursor.description]
+        return money_frame(cursor.fetchall(), columns)
 
     def settle_missed_payments(self, loan_id, amount):
-        """Record a payment to settle accumulated missed payments"""
+        """
+        Record a payment to settle accumulated missed payments.
+
+        Returns:
+            tuple: (success, message, changes) - see _loan_changes
+        """
         try:
             with self.db_manager._get_connection() as conn:
                 cursor = conn.cursor()
+                outbox.begin_operation(cursor, 'settle_missed_payments')
 
                 # Add payment record
                 cursor.execute("""
@@ -817,7 +1524,7 @@ class SQLiteUserSystem:
                 """, (
                     loan_id,
                     datetime.now().strftime("%Y-%m-%d"),
-                    float(amount),
+                    to_cents(amount),
                     "System (Missed Payments Settlement)",
                     "Settlement of accumulated missed payments"
                 ))
@@ -828,7 +1535,7 @@ class SQLiteUserSystem:
                     SET remaining_balance = remaining_balance - ?,
                         last_updated = CURRENT_TIMESTAMP
                     WHERE loan_id = ?
-                """, (float(amount), loan_id))
+                """, (to_cents(amount), loan_id))
 
                 # Check if loan is now paid
                 cursor.execute("""
@@ -839,88 +1546,33 @@ class SQLiteUserSystem:
 
                 conn.commit()
 
-                # Return updated loan data
-                return True, "Missed payments settled successfully", self.get_loans_data()
+                # Return only the loan that changed
+                return True, "Missed payments settled successfully", self._loan_changes(cursor, [loan_id])
 
         except Exception as e:
             return False, f"Error settling missed payments: {str(e)}", None
 
-    def process_daily_operations(self):
-        """Handle all daily operations including payments and cleanup"""
-        try:
-            with self.db_manager._get_connection() as conn:
-                cursor = conn.cursor()
-
-                today = datetime.now().strftime("%Y-%m-%d")
-
-                # Process daily payments for active loans
-                cursor.execute("""
-                    UPDATE loans
-                    SET remaining_balance = remaining_balance - payment_per_day,
-                        last_updated = CURRENT_TIMESTAMP
-                    WHERE status = 'Active'
-                """)
-
-                # Mark loans as paid if balance <= 0
-                cursor.execute("""
-                    UPDATE loans
-                    SET status = 'Paid',
-                        remaining_balance = 0
-                    WHERE status = 'Active' AND remaining_balance <= 0
-                """)
-
-                # Record payments for all active loans
-                cursor.execute("""
-                    INSERT INTO payments (loan_id, date, amount, received_by, notes)
-                    SELECT 
-                        loan_id, ?, payment_per_day, 'System', 'Daily auto-payment'
-                    FROM loans
-                    WHERE status = 'Active'
-                """, (today,))
-
-                # Get daily collection amount
-                cursor.execute("""
-                    SELECT SUM(payment_per_day) FROM loans
-                    WHERE status = 'Active'
-                """)
-                daily_collection = cursor.fetchone()[0] or 0
-
-                # Count active loans
-                cursor.execute("SELECT COUNT(*) FROM loans WHERE status = 'Active'")
-                active_loans = cursor.fetchone()[0]
-
-                # Clean up paid loans older than 24 hours
-                cutoff_time = (datetime.now() - timedelta(hours=24)).strftime("%Y-%m-%d %H:%M:%S")
-
-                cursor.execute("""
-                    SELECT COUNT(*) FROM loans
-                    WHERE status = 'Paid' 
-                    AND last_updated < ?
-                """, (cutoff_time,))
-                paid_loans = cursor.fetchone()[0]
-
-                cursor.execute("""
-                    DELETE FROM loans
-                    WHERE status = 'Paid' 
-                    AND last_updated < ?
-                """, (cutoff_time,))
-
-                cursor.execute("""
-                    DELETE FROM payments
-                    WHERE loan_id IN (
-                        SELECT loan_id FROM loans
-                        WHERE status = 'Paid'
-                        AND last_updated < ?
-                    )
-                """, (cutoff_time,))
+    def process_daily_operations(self, business_date=None):
+        """
+        Run end-of-day processing (auto-payments, then paid-loan cleanup).
 
-                conn.commit()
+        Safe to call more than once per day: a business date that already
+        completed is not processed again, and an interrupted run resumes.
 
-                return {
-                    'daily_collection': daily_collection,
-                    'active_loans': active_loans,
-                    'paid_loans': paid_loans
-                }
+        Returns:
+            dict: daily_collection, active_loans, paid_loans, status and
+                  per-phase stats, or None on error
+        """
+        try:
+            run = self.eod.run(business_date)
+            stats = run['stats']
+            return {
+                'daily_collection': Money(stats.get('payments', {}).get('amount', 0)),
+                'active_loans': self.get_daily_financial_summary()['active_loans'],
+                'paid_loans': stats.get('cleanup', {}).get('rows', 0),
+                'status': run['status'],
+                'phases': {phase: stats[phase] for phase in PHASES if phase in stats}
+            }
 
         except Exception as e:
             print(f"Error in daily operations: {str(e)}")
@@ -928,6 +1580,17 @@ class SQLiteUserSystem:
 
 
 class LoginApp(ctk.CTk):
+    # Number of loans fetched per page in the View Loans tab
+    LOAN_PAGE_SIZE = 100
+
+    # Badge colors for each display status
+    LOAN_STATUS_COLORS = {
+        'Paid': "#2ecc71",  # Green
+        'Overdue': "#e67e22",  # Orange
+        'Defaulted': "#e74c3c",  # Red
+        'Active': "#3498db",  # Blue
+    }
+
     def __init__(self):
         super().__init__()
 
@@ -952,27 +1615,50 @@ class LoginApp(ctk.CTk):
         self.user_system = SQLiteUserSystem()
         self.current_user = None
 
+        # Queries run here, off the Tk thread, so the window keeps redrawing meanwhile
+        self.executor = BackgroundExecutor(self, on_busy=self._show_busy)
+        self.search_debounce_ms = load_search_config()['debounce_ms']
+
         # Setup UI
         self._setup_ui()
         self.after_ids = set()  # Track scheduled callbacks
         self._loan_detail_window = None  # Track detail window
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
         self.after(1000, self.check_network_status)
 
     def check_network_status(self):
-        """Check and display network status"""
-        if hasattr(self, 'user_system') and hasattr(self.user_system, 'network_manager'):
-            if self.user_system.network_manager.shared_mode:
-                status = "Connected to network share"
-                color = "green"
-            else:
-                status = "Using local storage (network unavailable)"
-                color = "orange"
+        """Keep the dashboard's sync status line current"""
+        self._show_sync_status()
+
+        # Reading the scheduler's state is cheap, so keep the label current
+        self.after(5000, self.check_network_status)
+
+    def _show_sync_status(self):
+        """Show the sync scheduler's state in the dashboard header"""
+        if not hasattr(self, 'sync_status_label') or not self.sync_status_label.winfo_exists():
+            return
+        if not hasattr(self, 'user_system') or not hasattr(self.user_system, 'network_manager'):
+            return
 
-            if hasattr(self, 'status_label'):
-                self.status_label.configure(text=status, text_color=color)
+        sync_status = self.user_system.get_sync_status()
+        if sync_status is not None:
+            status, color = describe_sync_status(sync_status)
+        elif self.user_system.network_manager.shared_mode:
+            status, color = "Connected to network share", "green"
+        else:
+            status, color = "Using local storage (network unavailable)", "orange"
+        self.sync_status_label.configure(text=status, text_color=color)
 
-        # Check every minute
-        self.after(60000, self.check_network_status)
+    def _on_close(self):
+        """Let a sync in progress finish, then close the database and the window"""
+        self._cleanup_after_calls()
+        try:
+            self.executor.shutdown()
+            self.user_system.network_manager.stop_sync()
+            self.user_system.db_manager.close()
+        except Exception as e:
+            print(f"Error shutting down: {str(e)}")
+        self.destroy()
 
     def _cleanup_callbacks(self):
         """Cancel all pending callbacks"""
@@ -1230,6 +1916,20 @@ class LoginApp(ctk.CTk):
             anchor="w"
         ).pack(fill="x")
 
+        # Network share and sync state, kept current by check_network_status
+        self.sync_status_label = ctk.CTkLabel(
+            welcome_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            anchor="w"
+        )
+        self.sync_status_label.pack(fill="x")
+        self._show_sync_status()
+
+        # Shown while background queries are running
+        self.busy_bar = ctk.CTkProgressBar(welcome_frame, mode="indeterminate", width=200, height=6)
+        self._show_busy(self.executor.is_busy())
+
         # Action buttons frame
         action_frame = ctk.CTkFrame(header_frame, fg_color="transparent")
         action_frame.pack(side="right")
@@ -1257,6 +1957,18 @@ class LoginApp(ctk.CTk):
             hover_color="#2980b9"
         ).pack(side="left", padx=5)
 
+        # Diagnostics button
+        ctk.CTkButton(
+            action_frame,
+            text="Diagnostics",
+            command=self.show_diagnostics_window,
+            width=100,
+            height=35,
+            fg_color="transparent",
+            border_width=1,
+            text_color=("gray10", "#DCE4EE")
+        ).pack(side="left", padx=5)
+
         # Logout button
         ctk.CTkButton(
             action_frame,
@@ -1283,6 +1995,18 @@ class LoginApp(ctk.CTk):
         self._setup_loan_payments_tab()
         self._cleanup_callbacks()  # Clean up before creating new UI
 
+    def _show_busy(self, count):
+        """Show or hide the dashboard's loading indicator as background queries start and finish"""
+        if not hasattr(self, 'busy_bar') or not self.busy_bar.winfo_exists():
+            return
+        if count:
+            if not self.busy_bar.winfo_ismapped():
+                self.busy_bar.pack(anchor="w", pady=(5, 0))
+                self.busy_bar.start()
+        else:
+            self.busy_bar.stop()
+            self.busy_bar.pack_forget()
+
     def _setup_view_loans_tab(self):
         """Configure the View Loans tab with status filtering"""
         tab = self.tabview.tab("View Loans")
@@ -1294,11 +2018,12 @@ class LoginApp(ctk.CTk):
         # Search entry
         self.search_entry = ctk.CTkEntry(
             search_frame,
-            placeholder_text="Search by name or loan ID...",
+            placeholder_text="Search by name, phone, national ID or loan ID...",
             height=40
         )
         self.search_entry.pack(side="left", fill="x", expand=True, padx=(0, 10))
         self.search_entry.bind("<Return>", lambda e: self.filter_loans())
+        self.search_entry.bind("<KeyRelease>", self._on_search_key)
 
         # Search button
         ctk.CTkButton(
@@ -1314,146 +2039,57 @@ class LoginApp(ctk.CTk):
             search_frame,
             values=["All", "Active", "Paid", "Defaulted", "Overdue"],
             width=120,
-            height=40
+            height=40,
+            command=lambda _: self.filter_loans()
         )
         self.status_filter.set("All")
         self.status_filter.pack(side="left")
 
-        # Loans table
-        self.loans_scroll_frame = ctk.CTkScrollableFrame(
+        # Loans table: a screenful of row widgets rebound as it scrolls
+        self.loans_table = VirtualLoanTable(
             tab,
-            border_width=1,
-            border_color="gray20"
-        )
-        self.loans_scroll_frame.pack(fill="both", expand=True)
-
-        # Display all loans initially
-        self.display_loans(self.user_system.get_loans_data())
-
-    def display_loans(self, loans_df):
-        """Display loans with status coloring"""
-        # Clear existing loans
-        for widget in self.loans_scroll_frame.winfo_children():
-            widget.destroy()
-
-        if loans_df.empty:
-            ctk.CTkLabel(
-                self.loans_scroll_frame,
-                text="No loans found",
-                font=ctk.CTkFont(size=14),
-                text_color="gray70"
-            ).pack(pady=50)
-            return
-
-        # Header row
-        header_frame = ctk.CTkFrame(
-            self.loans_scroll_frame,
-            fg_color="#2c3e50",
-            height=40
-        )
-        header_frame.pack(fill="x", pady=(0, 5))
-
-        headers = [
-            ("ID", 80), ("Customer", 180), ("Amount", 120),
-            ("Daily", 100), ("Term", 80), ("Total", 120),
-            ("Status", 120), ("", 160)
-        ]
-
-        for col, (header, width) in enumerate(headers):
-            ctk.CTkLabel(
-                header_frame,
-                text=header,
-                font=ctk.CTkFont(weight="bold"),
-                text_color="white",
-                width=width
-            ).grid(row=0, column=col, padx=2)
-
-        # Loan rows
-        for _, loan in loans_df.iterrows():
-            self._create_loan_row(loan)
-
-    def _create_loan_row(self, loan):
-        """Create a loan row with dynamic status coloring"""
-        loan_frame = ctk.CTkFrame(self.loans_scroll_frame)
-        loan_frame.pack(fill="x", pady=2)
-
-        # Determine status and color
-        status, color = self._determine_loan_status(loan)
-
-        # Loan ID
-        ctk.CTkLabel(
-            loan_frame,
-            text=str(loan['loan_id']),
-            width=80
-        ).grid(row=0, column=0, padx=5)
-
-        # Customer Name
-        ctk.CTkLabel(
-            loan_frame,
-            text=str(loan['customer_name']),
-            width=120
-        ).grid(row=0, column=1, padx=10)
-
-        # Amount
-        ctk.CTkLabel(
-            loan_frame,
-            text=f"{loan['amount']:,.2f}",
-            width=80
-        ).grid(row=0, column=2, padx=10)
-
-        # Daily Payment
-        ctk.CTkLabel(
-            loan_frame,
-            text=f"{loan['payment_per_day']:,.2f}",
-            width=80
-        ).grid(row=0, column=3, padx=10)
-
-        # Term
-        ctk.CTkLabel(
-            loan_frame,
-            text=f"{loan['term_months']} months",
-            width=80
-        ).grid(row=0, column=4, padx=10)
-
-        # Total to Repay
-        ctk.CTkLabel(
-            loan_frame,
-            text=f"{loan['total_to_repay']:,.2f}",
-            width=120
-        ).grid(row=0, column=5, padx=10)
-
-        # Status label (dynamic color)
-        status_label = ctk.CTkLabel(
-            loan_frame,
-            text=status,
-            width=100,
-            text_color="white",
-            fg_color=color,
-            corner_radius=4
+            on_view=self._safe_show_loan_details,
+            on_action=self._handle_loan_action,
+            on_need_more=self._load_more_loans,
+            status_colors=self.LOAN_STATUS_COLORS
         )
-        status_label.grid(row=0, column=6, padx=5)
-
-        # Action buttons frame
-        btn_frame = ctk.CTkFrame(loan_frame, fg_color="transparent")
-        btn_frame.grid(row=0, column=7, padx=5)
-
-        # View button
-        ctk.CTkButton(
-            btn_frame,
-            text="View",
-            width=70,
-            command=lambda lid=loan['loan_id']: self._safe_show_loan_details(lid)
-        ).pack(side="left", padx=2)
-
-        # Edit button with dropdown menu
-        edit_menu = ctk.CTkSegmentedButton(
-            btn_frame,
-            values=["Edit", "Delete"],
-            width=140,
-            command=lambda v, lid=loan['loan_id']: self._handle_loan_action(v, lid)
+        self.loans_table.pack(fill="both", expand=True)
+
+        # Display the first page of loans initially, and build the search index meanwhile
+        self.filter_loans()
+        self.executor.submit(self.user_system.loan_index.ensure_built)
+
+    def display_loans(self, loans_df, total=None, next_cursor=None):
+        """Display the first page of a loan query; later pages load as the table scrolls"""
+        self._loans_next_cursor = next_cursor
+        self.loans_table.set_loans(loans_df, total=total, has_more=next_cursor is not None)
+
+    def _load_more_loans(self):
+        """Append the next page of the current loan query"""
+        if self._loans_next_cursor is None or self.executor.is_busy('loans'):
+            return  # A new first page is on its way and will replace this query
+
+        def on_done(result):
+            page, total, next_cursor = result
+            self._loans_next_cursor = next_cursor
+            self.loans_table.append_loans(page, total=total, has_more=next_cursor is not None)
+
+        def on_error(e):
+            # Stop paging rather than retrying on every scroll; a refresh starts over
+            print(f"Error loading more loans: {str(e)}")
+            self._loans_next_cursor = None
+            self.loans_table.append_loans(pd.DataFrame(), has_more=False)
+
+        self.executor.submit(
+            self.user_system.query_loans,
+            after=self._loans_next_cursor,
+            limit=self.LOAN_PAGE_SIZE,
+            key='loans_more',
+            owner=self.loans_table,
+            on_done=on_done,
+            on_error=on_error,
+            **self._loan_query
         )
-        edit_menu.pack(side="left", padx=2)
-        edit_menu.set("Options")  # Default display text
 
     def _safe_show_loan_details(self, loan_id):
         """Wrapper to prevent callback errors"""
@@ -1530,79 +2166,119 @@ class LoginApp(ctk.CTk):
             messagebox.showerror("Error", "Invalid admin password")
             return
 
-        try:
-            with self.user_system.db_manager._get_connection() as conn:
-                cursor = conn.cursor()
-
-                # Delete loan payments first
-                cursor.execute("DELETE FROM payments WHERE loan_id = ?", (loan_id,))
-
-                # Then delete the loan
-                cursor.execute("DELETE FROM loans WHERE loan_id = ?", (loan_id,))
-
-                conn.commit()
-
-                # Refresh UI
-                loans_df = self.user_system.get_loans_data()
-                self.display_loans(loans_df)
-                messagebox.showinfo("Success", f"Loan ID {loan_id} permanently deleted")
-                confirm_window.destroy()
-
-                # Refresh parent views if available
-                if hasattr(self.master, 'display_loans'):
-                    self.master.display_loans(loans_df)
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Deletion failed: {str(e)}")
-
-    def _determine_loan_status(self, loan):
-        """Determine status text and color for a loan"""
-        today = datetime.now().date()
-        end_date = datetime.strptime(loan['end_date'], "%Y-%m-%d").date()
+        success, message, changes = self.user_system.delete_loan(loan_id)
+        if not success:
+            messagebox.showerror("Error", message)
+            return
 
-        if loan['status'] == 'Paid':
-            return "Paid", "#2ecc71"  # Green
+        # Drop just this row
+        self.apply_loan_changes(changes)
+        messagebox.showinfo("Success", message)
+        confirm_window.destroy()
 
-        if today > end_date and float(loan['remaining_balance']) > 0:
-            return "Overdue", "#e67e22"  # Orange
+    def filter_loans(self):
+        """Search now (Enter, the Search button or a new status filter)"""
+        self._cancel_live_search()
+        self._run_loan_search()
+
+    def _on_search_key(self, event):
+        """Search as the user types, once they pause for the debounce interval"""
+        if event.keysym in ("Return", "KP_Enter"):
+            return  # Handled by the <Return> binding
+        self._cancel_live_search()
+        if (self.search_entry.get().strip() == getattr(self, '_loan_search_term', "")
+                and not self.executor.is_busy('loans')):
+            return  # Cursor movement, modifier keys and the like
+        self._search_after_id = self.after(self.search_debounce_ms, self._run_loan_search)
+
+    def _cancel_live_search(self):
+        after_id = getattr(self, '_search_after_id', None)
+        if after_id is not None:
+            self.after_cancel(after_id)
+            self._search_after_id = None
+
+    def refresh_loans(self):
+        """Reload the first page of the current loan query"""
+        self._run_loan_search(narrow=False)
+
+    def _run_loan_search(self, narrow=True):
+        """
+        Load the first page of loans for the search box and status filter.
+
+        The term is looked up in the in-memory prefix index; while the user
+        keeps typing, each lookup narrows the last result instead of
+        scanning the whole index (narrow=False starts afresh).
+        """
+        self._search_after_id = None
+        term = self.search_entry.get().strip()
+        status_filter = self.status_filter.get()
+        status = None if status_filter == "All" else status_filter
+        previous = getattr(self, '_search_match', None) if narrow else None
+
+        def on_done(result):
+            match, query, (page, total, next_cursor) = result
+            self._search_match = match
+            self._loan_search_term = term
+            self._loan_query = query
+            self.display_loans(page, total=total, next_cursor=next_cursor)
+
+        # A newer search supersedes this one, and any page still loading for the old one
+        self.executor.cancel('loans_more')
+        self.executor.submit(
+            self._query_loan_search,
+            term,
+            status,
+            previous,
+            key='loans',
+            owner=self.loans_table,
+            on_done=on_done,
+            on_error=lambda e: messagebox.showerror("Error", f"Could not load loans: {str(e)}")
+        )
 
-        if loan['status'] == 'Defaulted':
-            return "Defaulted", "#e74c3c"  # Red
+    def _query_loan_search(self, term, status, previous):
+        """Match the term and fetch the first page (runs on a worker thread)"""
+        match = self.user_system.search_loan_ids(term, previous) if term else None
+        query = {'status': status, 'loan_ids': match.loan_ids if match is not None else None}
+        return match, query, self.user_system.query_loans(limit=self.LOAN_PAGE_SIZE, **query)
+
+    def apply_loan_changes(self, changes):
+        """
+        Patch the loans a mutation touched into the View Loans table.
+
+        Loans already listed are updated in place (even if they no longer
+        match the filter, so the change stays visible until the next
+        search); new ones are inserted when they match it. Without changes
+        to apply the table is reloaded.
+        """
+        if not hasattr(self, 'loans_table') or not self.loans_table.winfo_exists():
+            return
+        if not changes:
+            self.refresh_loans()
+            return
 
-        return "Active", "#3498db"  # Blue
+        self.loans_table.remove_loans(changes.get('deleted', ()))
+        self.loans_table.patch_loans(changes.get('loans', ()), matches=self._loan_matches_query)
 
-    def filter_loans(self):
-        """Filter loans based on search term and status"""
-        search_term = self.search_entry.get().strip().lower()
-        status_filter = self.status_filter.get()
+        # Let paging find new matches that sort past the loaded rows
+        loan_ids = getattr(self, '_loan_query', {}).get('loan_ids')
+        if loan_ids is not None:
+            for loan in changes.get('loans', ()):
+                position = bisect.bisect_left(loan_ids, loan['loan_id'])
+                if (position == len(loan_ids) or loan_ids[position] != loan['loan_id']) \
+                        and self._loan_matches_query(loan):
+                    loan_ids.insert(position, loan['loan_id'])
 
-        loans_df = self.user_system.get_loans_data()
-
-        # Apply status filter first
-        if status_filter != "All":
-            if status_filter == "Overdue":
-                today = datetime.now().date()
-                loans_df = loans_df[
-                    (loans_df['status'] == 'Active') &
-                    (loans_df['end_date'].apply(lambda x: datetime.strptime(x, "%Y-%m-%d").date()) < today) &
-                    (loans_df['remaining_balance'].astype(float) > 0)
-                    ]
-            else:
-                loans_df = loans_df[loans_df['status'] == status_filter]
+    def _loan_matches_query(self, loan):
+        """Whether a loan belongs in the current View Loans query (mirrors query_loans' filters)"""
+        query = getattr(self, '_loan_query', {})
 
-        # Apply search term
-        if search_term:
-            try:
-                # Try searching by loan ID
-                loan_id = int(search_term)
-                loans_df = loans_df[loans_df['loan_id'] == loan_id]
-            except ValueError:
-                # Search by customer name if not numeric
-                loans_df = loans_df[
-                    loans_df['customer_name'].str.lower().str.contains(search_term)
-                ]
+        status = query.get('status')
+        if status == 'Overdue' and loan['display_status'] != 'Overdue':
+            return False
+        if status and status != 'Overdue' and loan['status'] != status:
+            return False
 
-        self.display_loans(loans_df)
+        return prefix_index.matches(loan, getattr(self, '_loan_search_term', ""))
 
     def _setup_add_loan_tab(self):
         """Setup the Add Loan tab with working functionality"""
@@ -1712,14 +2388,13 @@ class LoginApp(ctk.CTk):
             }
 
             # Call the user system to add loan
-            success, message = self.user_system.add_loan(loan_data)
+            success, message, changes = self.user_system.add_loan(loan_data)
 
             if success:
                 messagebox.showinfo("Success", message)
                 self._clear_loan_form()
-                # Refresh the loans display if available
-                if hasattr(self, 'display_loans'):
-                    self.display_loans(self.user_system.get_loans_data())
+                # Insert the new loan into the list
+                self.apply_loan_changes(changes)
             else:
                 messagebox.showerror("Error", message)
 
@@ -1740,7 +2415,7 @@ class LoginApp(ctk.CTk):
     def calculate_repayment(self):
         """Calculate total repayment amount"""
         try:
-            payment_per_day = float(self.loan_entries['payment_per_day'].get())
+            payment_per_day = Money.from_units(self.loan_entries['payment_per_day'].get())
             term_months = int(self.loan_entries['term_months'].get())
 
             if term_months < 1:
@@ -1765,14 +2440,26 @@ class LoginApp(ctk.CTk):
         for widget in tab.winfo_children():
             widget.destroy()
 
-        # Get updated data
-        loans_df = self.user_system.get_loans_data()
-        summary = self.user_system.get_daily_financial_summary()
-
-        # Rebuild the UI with fresh data
-        self._create_financial_summary_section(tab, summary)
-        self._create_daily_operations_section(tab)
-        self._create_loan_status_section(tab, loans_df)
+        loading_label = ctk.CTkLabel(tab, text="Loading...", text_color="gray70")
+        loading_label.pack(pady=20)
+
+        def on_done(summary):
+            # Rebuild the UI with fresh data
+            loading_label.destroy()
+            self._create_financial_summary_section(tab, summary)
+            self._create_daily_operations_section(tab)
+            self._create_loan_status_section(tab, summary)
+
+        def on_error(e):
+            loading_label.configure(text=f"Could not load the financial summary: {str(e)}")
+
+        self.executor.submit(
+            self.user_system.get_daily_financial_summary,
+            key='payments_summary',
+            owner=loading_label,
+            on_done=on_done,
+            on_error=on_error
+        )
 
     def _create_financial_summary_section(self, parent, summary_data):
         """Create financial summary section"""
@@ -1855,7 +2542,7 @@ class LoginApp(ctk.CTk):
         )
         self.status_label.pack(side="left", padx=10)
 
-    def _create_loan_status_section(self, parent, loans_df):
+    def _create_loan_status_section(self, parent, summary_data):
         """Create loan status overview section"""
         section_frame = ctk.CTkFrame(parent, border_width=1, corner_radius=10)
         section_frame.pack(fill="x", pady=(0, 10), padx=5)
@@ -1870,9 +2557,9 @@ class LoginApp(ctk.CTk):
         status_frame = ctk.CTkFrame(section_frame, fg_color="transparent")
         status_frame.pack(fill="x", pady=5, padx=10)
 
-        # Count loans by status
-        active_loans = len(loans_df[loans_df['status'] == 'Active'])
-        paid_loans = len(loans_df[loans_df['status'] == 'Paid'])
+        # Loan counts by status
+        active_loans = summary_data['active_loans']
+        paid_loans = summary_data['paid_loans']
 
         # Status cards
         statuses = [
@@ -1920,29 +2607,37 @@ class LoginApp(ctk.CTk):
         """Handle daily reset operation"""
         confirm = messagebox.askyesno(
             "Confirm Reset",
-            "This will reset daily payment totals and remove loans paid >24hrs ago.\nContinue?"
+            "This will reset daily payment totals and archive loans paid >24hrs ago.\nContinue?"
         )
         if not confirm:
             return
 
         self.reset_btn.configure(state="disabled", text="Resetting...")
         self.status_label.configure(text="Processing daily reset...")
-        self.update()
 
-        try:
-            summary = self.user_system.reset_daily_payments()
+        def on_done(summary):
+            self.reset_btn.configure(state="normal", text="Reset Daily Payments")
+            self.status_label.configure(text="Click at midnight to reset daily totals")
             if summary:
                 self._setup_loan_payments_tab()  # Refresh the tab
                 messagebox.showinfo(
                     "Success",
                     f"Daily reset completed:\n"
-                    f"- Removed {summary.get('paid_loans', 0)} paid loans\n"
+                    f"- Archived {summary.get('paid_loans', 0)} paid loans\n"
                     f"- Daily totals reset"
                 )
-        except Exception as e:
-            messagebox.showerror("Error", f"Daily reset failed: {str(e)}")
-        finally:
+
+        def on_error(e):
             self.reset_btn.configure(state="normal", text="Reset Daily Payments")
+            self.status_label.configure(text="Daily reset failed")
+            messagebox.showerror("Error", f"Daily reset failed: {str(e)}")
+
+        self.executor.submit(
+            self.user_system.reset_daily_payments,
+            owner=self.reset_btn,
+            on_done=on_done,
+            on_error=on_error
+        )
 
     def show_change_password_frame(self):
         """Display the password change form"""
@@ -2062,10 +2757,12 @@ class LoginApp(ctk.CTk):
         # Add tabs
         notebook.add("Payment Compliance")
         notebook.add("Payments Summary")
+        notebook.add("Arrears")
 
         # Build tabs
         self._build_compliance_tab(notebook.tab("Payment Compliance"))
         self._build_summary_tab(notebook.tab("Payments Summary"))
+        self._build_arrears_tab(notebook.tab("Arrears"))
 
         # Close button
         close_btn = ctk.CTkButton(
@@ -2078,6 +2775,72 @@ class LoginApp(ctk.CTk):
         )
         close_btn.grid(row=1, column=0, pady=10)
 
+    def show_diagnostics_window(self):
+        """Show SQL timings, connection pool and report snapshot statistics"""
+        window = ctk.CTkToplevel(self)
+        window.title("Diagnostics")
+        window.geometry("1000x650")
+        window.grid_rowconfigure(0, weight=1)
+        window.grid_columnconfigure(0, weight=1)
+
+        text = ctk.CTkTextbox(window, font=ctk.CTkFont(family="Courier", size=12), wrap="none")
+        text.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
+
+        def load():
+            pool = self.user_system.get_pool_stats()
+            pool_lines = "\n".join(f"  {key}: {value}" for key, value in pool.items())
+            queue = self.user_system.get_outbox_status()
+            sync_status = self.user_system.get_sync_status() or {}
+            sync_lines = "\n".join(f"  {key}: {value}" for key, value in sync_status.items())
+            report = [
+                "Connection pool",
+                pool_lines,
+                "",
+                f"Reports: {describe_snapshot(self.user_system.get_report_snapshot_info())}",
+                f"Offline queue: {queue['operations']} operations on {queue['rows']} rows"
+                + (f" (oldest {queue['oldest']})" if queue['oldest'] else ""),
+                "",
+                "Sync",
+                sync_lines or "  not started",
+                f"  share: {describe_share_health(self.user_system.get_share_health())}",
+                "",
+                self.user_system.format_sql_stats(),
+            ]
+            text.configure(state="normal")
+            text.delete("1.0", "end")
+            text.insert("1.0", "\n".join(report))
+            text.configure(state="disabled")
+
+        def reset():
+            self.user_system.reset_sql_stats()
+            load()
+
+        def save():
+            filepath = filedialog.asksaveasfilename(
+                defaultextension=".txt",
+                filetypes=[("Text Files", "*.txt")],
+                initialfile=f"sql_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            )
+            if filepath:
+                try:
+                    with open(filepath, 'w', encoding='utf-8') as f:
+                        f.write(text.get("1.0", "end"))
+                except OSError as e:
+                    messagebox.showerror("Error", f"Could not save statistics: {str(e)}")
+
+        btn_frame = ctk.CTkFrame(window, fg_color="transparent")
+        btn_frame.grid(row=1, column=0, pady=(0, 10))
+        ctk.CTkButton(btn_frame, text="Refresh", command=load, width=100).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="Reset", command=reset, width=100).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="Save...", command=save, width=100).pack(side="left", padx=5)
+        ctk.CTkButton(btn_frame, text="Sync Now", command=self.user_system.sync_now, width=100).pack(side="left", padx=5)
+        ctk.CTkButton(
+            btn_frame, text="Close", command=window.destroy,
+            fg_color="#e74c3c", hover_color="#c0392b", width=100
+        ).pack(side="left", padx=5)
+
+        load()
+
     def _build_compliance_tab(self, tab):
         """Build payment compliance tab with search functionality"""
         tab.grid_rowconfigure(2, weight=1)  # Changed from 1 to 2 to accommodate search frame
@@ -2093,6 +2856,10 @@ class LoginApp(ctk.CTk):
             font=ctk.CTkFont(size=16, weight="bold")
         ).pack(side="left")
 
+        # How current the report data is (reports read a snapshot, not the live file)
+        self.compliance_snapshot_label = ctk.CTkLabel(header_frame, text="", text_color="gray")
+        self.compliance_snapshot_label.pack(side="left", padx=10)
+
         # Action buttons
         btn_frame = ctk.CTkFrame(header_frame, fg_color="transparent")
         btn_frame.pack(side="right")
@@ -2134,7 +2901,7 @@ class LoginApp(ctk.CTk):
         # Search by name/ID
         self.compliance_search_entry = ctk.CTkEntry(
             search_frame,
-            placeholder_text="Search by name or ID...",
+            placeholder_text="Search by name, phone, national ID or loan ID...",
             width=200
         )
         self.compliance_search_entry.pack(side="left", padx=5)
@@ -2156,25 +2923,44 @@ class LoginApp(ctk.CTk):
 
     def _filter_compliance_data(self):
         """Filter compliance data based on search criteria"""
+        self.executor.submit(
+            self._query_filtered_compliance,
+            self.payment_filter.get(),
+            self.compliance_search_entry.get().strip(),
+            key='compliance',
+            owner=self.compliance_frame,
+            on_done=self._show_filtered_compliance,
+            on_error=lambda e: messagebox.showerror("Error", f"Could not filter compliance data: {str(e)}")
+        )
+
+    def _query_filtered_compliance(self, payment_filter, search_term):
+        """Compliance rows matching the filters (runs on a worker thread); None if there are none at all"""
         # Get the original data
         df = self.user_system.get_payment_compliance_report()
         if df.empty:
-            return
+            return None
 
         # Apply payment status filter
-        payment_filter = self.payment_filter.get()
         if payment_filter == "Yes":
             df = df[df['paid_today'] == 'Yes']
         elif payment_filter == "No":
             df = df[df['paid_today'] == 'No']
 
-        # Apply search term filter
-        search_term = self.compliance_search_entry.get().lower()
+        # Apply search term filter (name, phone or national ID prefix, or loan ID).
+        # Every matching loan in the book, so none are cut off by a result limit
         if search_term:
+            match = self.user_system.search_loan_ids(search_term)
+            loan_ids = match.loan_ids if match is not None else []
             df = df[
-                df['customer_name'].str.lower().str.contains(search_term) |
-                df['loan_id'].astype(str).str.contains(search_term)
+                df['loan_id'].isin(loan_ids) |
+                df['loan_id'].astype(str).str.contains(search_term, regex=False)
                 ]
+        return df
+
+    def _show_filtered_compliance(self, df):
+        """Draw the filtered compliance rows"""
+        if df is None:
+            return
 
         # Clear existing widgets
         for widget in self.compliance_frame.winfo_children():
@@ -2189,7 +2975,7 @@ class LoginApp(ctk.CTk):
             return
 
         # Create headers
-        headers = ["Loan ID", "Customer", "Daily Amount", "Paid Today", "Last Payment"]
+        headers = ["Loan ID", "Customer", "Daily Amount", "Paid Today", "Last Payment", "Arrears"]
         for col, header in enumerate(headers):
             ctk.CTkLabel(
                 self.compliance_frame,
@@ -2217,7 +3003,7 @@ class LoginApp(ctk.CTk):
 
             ctk.CTkLabel(
                 self.compliance_frame,
-                text=f"KES {float(item['daily_amount']):,.2f}",
+                text=f"KES {Money(item['payment_per_day']):,.2f}",
                 width=150,
                 anchor="w"
             ).grid(row=row, column=2, padx=5, pady=2, sticky="w")
@@ -2238,14 +3024,31 @@ class LoginApp(ctk.CTk):
                 anchor="w"
             ).grid(row=row, column=4, padx=5, pady=2, sticky="w")
 
+            ctk.CTkLabel(
+                self.compliance_frame,
+                text=f"KES {Money(item['arrears']):,.2f}",
+                text_color="#e74c3c" if item['arrears'] > 0 else None,
+                width=150,
+                anchor="w"
+            ).grid(row=row, column=5, padx=5, pady=2, sticky="w")
+
     def _load_compliance_data(self):
         """Load payment compliance data into the table"""
+        self.executor.submit(
+            self.user_system.get_payment_compliance_report,
+            key='compliance',
+            owner=self.compliance_frame,
+            on_done=self._show_compliance_data,
+            on_error=lambda e: messagebox.showerror("Error", f"Could not load compliance data: {str(e)}")
+        )
+
+    def _show_compliance_data(self, compliance_data):
+        """Draw the payment compliance table"""
         # Clear existing widgets
         for widget in self.compliance_frame.winfo_children():
             widget.destroy()
 
-        # Get data from system
-        compliance_data = self.user_system.get_payment_compliance_report()
+        self._show_snapshot_age(self.compliance_snapshot_label)
 
         if compliance_data.empty:
             ctk.CTkLabel(
@@ -2256,7 +3059,7 @@ class LoginApp(ctk.CTk):
             return
 
         # Create headers
-        headers = ["Loan ID", "Customer", "Daily Amount", "Paid Today", "Last Payment"]
+        headers = ["Loan ID", "Customer", "Daily Amount", "Paid Today", "Last Payment", "Arrears"]
         for col, header in enumerate(headers):
             ctk.CTkLabel(
                 self.compliance_frame,
@@ -2287,7 +3090,7 @@ class LoginApp(ctk.CTk):
             # Daily Amount
             ctk.CTkLabel(
                 self.compliance_frame,
-                text=f"KES {float(loan['payment_per_day']):,.2f}",
+                text=f"KES {Money(loan['payment_per_day']):,.2f}",
                 width=150,
                 anchor="w"
             ).grid(row=row, column=2, padx=5, pady=2, sticky="w")
@@ -2310,10 +3113,36 @@ class LoginApp(ctk.CTk):
                 anchor="w"
             ).grid(row=row, column=4, padx=5, pady=2, sticky="w")
 
+            # Arrears
+            ctk.CTkLabel(
+                self.compliance_frame,
+                text=f"KES {Money(loan['arrears']):,.2f}",
+                text_color="#e74c3c" if loan['arrears'] > 0 else None,
+                width=150,
+                anchor="w"
+            ).grid(row=row, column=5, padx=5, pady=2, sticky="w")
+
+    def _show_snapshot_age(self, label):
+        """Show how current the report snapshot is"""
+        label.configure(text=describe_snapshot(self.user_system.get_report_snapshot_info()))
+
     def _refresh_compliance(self, tab):
         """Refresh compliance data"""
-        self._load_compliance_data()
-        messagebox.showinfo("Refreshed", "Compliance data updated")
+        def on_done(_):
+            self._load_compliance_data()
+            messagebox.showinfo("Refreshed", "Compliance data updated")
+
+        self._refresh_report_snapshot(tab, on_done)
+
+    def _refresh_report_snapshot(self, owner, on_done):
+        """Take a new report snapshot on a worker thread, then call on_done"""
+        self.executor.submit(
+            self.user_system.refresh_report_snapshot,
+            key='report_snapshot',
+            owner=owner,
+            on_done=on_done,
+            on_error=lambda e: messagebox.showerror("Error", f"Could not refresh the report data: {str(e)}")
+        )
 
     def _print_compliance_report(self):
         """Generate PDF of compliance report"""
@@ -2337,6 +3166,7 @@ class LoginApp(ctk.CTk):
             # Date
             pdf.set_font("Arial", '', 12)
             pdf.cell(0, 10, f"Date: {datetime.now().strftime('%Y-%m-%d')}", 0, 1)
+            pdf.cell(0, 10, describe_snapshot(self.user_system.get_report_snapshot_info()), 0, 1)
             pdf.ln(5)
 
             # Table header
@@ -2353,7 +3183,7 @@ class LoginApp(ctk.CTk):
             for _, row in df.iterrows():
                 pdf.cell(30, 10, str(row['loan_id']), 1)
                 pdf.cell(50, 10, str(row['customer_name']), 1)
-                pdf.cell(30, 10, f"KES {float(row['daily_amount']):,.2f}", 1)
+                pdf.cell(30, 10, f"KES {Money(row['payment_per_day']):,.2f}", 1)
                 pdf.cell(30, 10, str(row['paid_today']), 1)
                 pdf.cell(40, 10, str(row['last_payment']), 1)
                 pdf.ln()
@@ -2374,6 +3204,102 @@ class LoginApp(ctk.CTk):
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate report: {str(e)}")
 
+    def _build_arrears_tab(self, tab):
+        """Build arrears report tab"""
+        tab.grid_rowconfigure(1, weight=1)
+        tab.grid_columnconfigure(0, weight=1)
+
+        # Header frame
+        header_frame = ctk.CTkFrame(tab, fg_color="transparent")
+        header_frame.grid(row=0, column=0, sticky="ew", padx=10, pady=5)
+
+        ctk.CTkLabel(
+            header_frame,
+            text="Arrears Report",
+            font=ctk.CTkFont(size=16, weight="bold")
+        ).pack(side="left")
+
+        self.arrears_total_label = ctk.CTkLabel(
+            header_frame,
+            text="",
+            font=ctk.CTkFont(size=12)
+        )
+        self.arrears_total_label.pack(side="left", padx=20)
+
+        ctk.CTkButton(
+            header_frame,
+            text="Refresh",
+            command=self._load_arrears_data,
+            width=100
+        ).pack(side="right", padx=5)
+
+        # Create scrollable frame for table
+        self.arrears_frame = ctk.CTkScrollableFrame(tab)
+        self.arrears_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
+
+        # Load initial data
+        self._load_arrears_data()
+
+    def _load_arrears_data(self):
+        """Load loans in arrears, largest first"""
+        self.executor.submit(
+            self.user_system.get_missed_payments_bulk,
+            key='arrears',
+            owner=self.arrears_frame,
+            on_done=self._show_arrears_data,
+            on_error=lambda e: messagebox.showerror("Error", f"Could not load arrears: {str(e)}")
+        )
+
+    def _show_arrears_data(self, arrears):
+        """Draw the arrears table"""
+        # Clear existing widgets
+        for widget in self.arrears_frame.winfo_children():
+            widget.destroy()
+
+        arrears = arrears[arrears['arrears'] > 0]
+
+        self.arrears_total_label.configure(
+            text=f"{len(arrears)} loans | Total: KES {Money(arrears['arrears'].sum()):,.2f}"
+        )
+
+        if arrears.empty:
+            ctk.CTkLabel(
+                self.arrears_frame,
+                text="No loans in arrears",
+                font=ctk.CTkFont(size=12)
+            ).pack(pady=20)
+            return
+
+        # Create headers
+        headers = ["Loan ID", "Customer", "Phone", "Daily Amount", "Missed Days", "Arrears"]
+        for col, header in enumerate(headers):
+            ctk.CTkLabel(
+                self.arrears_frame,
+                text=header,
+                font=ctk.CTkFont(weight="bold"),
+                width=150 if col != 1 else 200,
+                anchor="w"
+            ).grid(row=0, column=col, padx=5, pady=5, sticky="w")
+
+        # Add data rows
+        for row, (_, loan) in enumerate(arrears.iterrows(), 1):
+            values = [
+                str(loan['loan_id']),
+                str(loan['customer_name']),
+                str(loan['phone_number'] or ''),
+                f"KES {Money(loan['payment_per_day']):,.2f}",
+                str(loan['missed_days']),
+                f"KES {Money(loan['arrears']):,.2f}"
+            ]
+            for col, value in enumerate(values):
+                ctk.CTkLabel(
+                    self.arrears_frame,
+                    text=value,
+                    text_color="#e74c3c" if col == 5 else None,
+                    width=150 if col != 1 else 200,
+                    anchor="w"
+                ).grid(row=row, column=col, padx=5, pady=2, sticky="w")
+
     def _build_summary_tab(self, tab):
         """Build payments summary tab"""
         tab.grid_rowconfigure(1, weight=1)
@@ -2389,6 +3315,9 @@ class LoginApp(ctk.CTk):
             font=ctk.CTkFont(size=16, weight="bold")
         ).pack(side="left")
 
+        self.summary_snapshot_label = ctk.CTkLabel(header_frame, text="", text_color="gray")
+        self.summary_snapshot_label.pack(side="left", padx=10)
+
         # Buttons
         btn_frame = ctk.CTkFrame(header_frame, fg_color="transparent")
         btn_frame.pack(side="right")
@@ -2407,6 +3336,15 @@ class LoginApp(ctk.CTk):
             width=100
         ).pack(side="left", padx=5)
 
+        # Archived (settled) loans are left out unless asked for
+        self.include_archive_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(
+            btn_frame,
+            text="Include archived",
+            variable=self.include_archive_var,
+            command=self._load_summary_data
+        ).pack(side="left", padx=5)
+
         # Create scrollable frame
         self.summary_frame = ctk.CTkScrollableFrame(tab)
         self.summary_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
@@ -2416,12 +3354,22 @@ class LoginApp(ctk.CTk):
 
     def _load_summary_data(self):
         """Load payments summary data into the table"""
+        self.executor.submit(
+            self.user_system.generate_payments_summary_report,
+            include_archive=self.include_archive_var.get(),
+            key='payments_report',
+            owner=self.summary_frame,
+            on_done=self._show_summary_data,
+            on_error=lambda e: messagebox.showerror("Error", f"Could not load payments summary: {str(e)}")
+        )
+
+    def _show_summary_data(self, summary_data):
+        """Draw the payments summary table"""
         # Clear existing widgets
         for widget in self.summary_frame.winfo_children():
             widget.destroy()
 
-        # Get data from system
-        summary_data = self.user_system.generate_payments_summary_report()
+        self._show_snapshot_age(self.summary_snapshot_label)
 
         if summary_data.empty:
             ctk.CTkLabel(
@@ -2463,7 +3411,7 @@ class LoginApp(ctk.CTk):
             # Loan Amount
             ctk.CTkLabel(
                 self.summary_frame,
-                text=f"KES {float(loan['loan_amount']):,.2f}",
+                text=f"KES {Money(loan['loan_amount']):,.2f}",
                 width=120,
                 anchor="w"
             ).grid(row=row, column=2, padx=5, pady=2, sticky="w")
@@ -2471,16 +3419,16 @@ class LoginApp(ctk.CTk):
             # Total Paid
             ctk.CTkLabel(
                 self.summary_frame,
-                text=f"KES {float(loan['total_paid']):,.2f}",
+                text=f"KES {Money(loan['total_paid']):,.2f}",
                 width=120,
                 anchor="w"
             ).grid(row=row, column=3, padx=5, pady=2, sticky="w")
 
             # Remaining (color coded)
-            remaining_color = "#e74c3c" if float(loan['remaining']) > 0 else "#27ae60"
+            remaining_color = "#e74c3c" if Money(loan['remaining']) > 0 else "#27ae60"
             ctk.CTkLabel(
                 self.summary_frame,
-                text=f"KES {float(loan['remaining']):,.2f}",
+                text=f"KES {Money(loan['remaining']):,.2f}",
                 text_color=remaining_color,
                 width=120,
                 anchor="w"
@@ -2498,8 +3446,11 @@ class LoginApp(ctk.CTk):
 
     def _refresh_summary(self, tab):
         """Refresh summary data"""
-        self._load_summary_data()
-        messagebox.showinfo("Updated", "Payments summary data refreshed")
+        def on_done(_):
+            self._load_summary_data()
+            messagebox.showinfo("Updated", "Payments summary data refreshed")
+
+        self._refresh_report_snapshot(tab, on_done)
 
     def _print_summary_report(self):
         """Generate PDF of payments summary report"""
@@ -2507,7 +3458,9 @@ class LoginApp(ctk.CTk):
             from fpdf import FPDF
             import os
 
-            df = self.user_system.generate_payments_summary_report()
+            df = self.user_system.generate_payments_summary_report(
+                include_archive=self.include_archive_var.get()
+            )
             if df.empty:
                 messagebox.showwarning("No Data", "No payment data to print")
                 return
@@ -2523,6 +3476,7 @@ class LoginApp(ctk.CTk):
             # Date
             pdf.set_font("Arial", '', 12)
             pdf.cell(0, 10, f"Date: {datetime.now().strftime('%Y-%m-%d')}", 0, 1)
+            pdf.cell(0, 10, describe_snapshot(self.user_system.get_report_snapshot_info()), 0, 1)
             pdf.ln(5)
 
             # Table header
@@ -2540,9 +3494,9 @@ class LoginApp(ctk.CTk):
             for _, row in df.iterrows():
                 pdf.cell(25, 10, str(row['loan_id']), 1)
                 pdf.cell(45, 10, str(row['customer_name']), 1)
-                pdf.cell(30, 10, f"KES {float(row['loan_amount']):,.2f}", 1)
-                pdf.cell(30, 10, f"KES {float(row['total_paid']):,.2f}", 1)
-                pdf.cell(30, 10, f"KES {float(row['remaining']):,.2f}", 1)
+                pdf.cell(30, 10, f"KES {Money(row['loan_amount']):,.2f}", 1)
+                pdf.cell(30, 10, f"KES {Money(row['total_paid']):,.2f}", 1)
+                pdf.cell(30, 10, f"KES {Money(row['remaining']):,.2f}", 1)
                 pdf.cell(25, 10, str(row['status']), 1)
                 pdf.ln()
 
@@ -2564,7 +3518,7 @@ class LoginApp(ctk.CTk):
 
     def show_edit_loan_window(self, loan_id):
         """Show edit window with proper refresh handling"""
-        loan_data, _ = self.user_system.get_loan_details(loan_id)
+        loan_data, _ = self.user_system.get_loan_overview(loan_id)
         if not loan_data:
             messagebox.showerror("Error", "Loan not found")
             return
@@ -2630,28 +3584,19 @@ class LoginApp(ctk.CTk):
                     'phone_number': entries['phone_number'].get()
                 }
 
-                success, message, updated_loan = self.user_system.update_loan(loan_id, updated_data)
+                success, message, changes = self.user_system.update_loan(loan_id, updated_data)
                 if success:
                     messagebox.showinfo("Success", message)
                     edit_window.destroy()
 
-                    # Force complete refresh of all views
-                    loans_df = self.user_system.get_loans_data()
-
-                    # Refresh main loans list
-                    if hasattr(self, 'display_loans'):
-                        self.display_loans(loans_df)
+                    # Patch the edited row in the main loans list
+                    self.apply_loan_changes(changes)
 
                     # Refresh detail window if open
                     if hasattr(self, '_loan_detail_window') and self._loan_detail_window:
                         if self._loan_detail_window.winfo_exists() and str(self._loan_detail_window.loan_id) == str(
                                 loan_id):
-                            # Get fresh data including payments
-                            loan_data, payments_df = self.user_system.get_loan_details(loan_id)
-                            if loan_data:
-                                self._loan_detail_window.loan_data = loan_data
-                                self._loan_detail_window.payments_df = payments_df
-                                self._loan_detail_window.refresh_data(loan_data)
+                            self._loan_detail_window.refresh_data()
 
                     # Refresh reports/payments tabs
                     if hasattr(self, '_setup_loan_payments_tab'):
@@ -2680,7 +3625,7 @@ class LoginApp(ctk.CTk):
     def clear_search(self):
         """Clear search and show all loans"""
         self.search_entry.delete(0, 'end')
-        self.display_loans(self.user_system.get_loans_data())
+        self.filter_loans()
 
 
 if __name__ == "__main__":
@@ -16,7 +16,8 @@ data_dir = network_mgr.get_data_directory()
 def check_network_storage(self):
     """Periodically check network storage availability"""
     if self.user_system.shared_mode:
-        if not os.path.exists(self.user_system.data_folder):
+        # Cached by the share health monitor, so a hung share doesn't freeze the UI
+        if not self.user_system.network_manager.check_network_share():
             if messagebox.askyesno(
                     "Network Error",
                     "Network storage unavailable. Switch to local mode temporarily?"
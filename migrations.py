@@ -0,0 +1,370 @@
+import json
+import sqlite3
+import hashlib
+
+from portfolio import create_portfolio_tables, create_portfolio_triggers, rebuild_portfolio_totals
+from search_index import ensure_search_index, fts5_available, rebuild_search_index
+from eod import create_daily_runs_table, add_daily_run_sites
+from customers import create_customers_table, create_customer_triggers, backfill_customers
+from money import CENTS
+from day_numbers import add_day_columns
+from change_log import create_sync_tables, create_sync_triggers
+from ledger import (
+    create_ledger_tables, create_ledger_triggers, drop_ledger_triggers, backfill_ledger, take_balance_snapshots
+)
+from outbox import create_outbox_tables, create_outbox_triggers, upgrade_outbox
+
+
+def _create_base_schema(cursor):
+    """Create the core tables and the default admin user"""
+    # Users table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL
+        )
+    """)
+
+    # Loans table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS loans (
+            loan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name TEXT NOT NULL,
+            amount REAL NOT NULL,
+            payment_per_day REAL NOT NULL,
+            term_months INTEGER NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            total_to_repay REAL NOT NULL,
+            status TEXT NOT NULL,
+            created_by TEXT NOT NULL,
+            remaining_balance REAL NOT NULL,
+            physical_address TEXT,
+            national_id TEXT,
+            phone_number TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_updated TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Payments table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS payments (
+            payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            loan_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            amount REAL NOT NULL,
+            received_by TEXT NOT NULL,
+            notes TEXT,
+            FOREIGN KEY (loan_id) REFERENCES loans (loan_id)
+        )
+    """)
+
+    # Loan cycles table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS loan_cycles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name TEXT NOT NULL,
+            national_id TEXT,
+            phone_number TEXT,
+            loan_cycles INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+
+    # Default admin user
+    cursor.execute("SELECT COUNT(*) FROM users WHERE username = 'Kodongo'")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(
+            "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+            ('Kodongo', hashlib.sha256("Kodongo123".encode()).hexdigest(), 'Admin')
+        )
+
+
+def _add_query_indexes(cursor):
+    """Index the columns used by payment lookups, status filters and cycle lookups"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_loan_date ON payments (loan_id, date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_date ON payments (date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loans_status ON loans (status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loans_end_date ON loans (end_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loan_cycles_phone ON loan_cycles (phone_number)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loan_cycles_national_id ON loan_cycles (national_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loan_cycles_name ON loan_cycles (customer_name)")
+
+
+def _add_portfolio_counters(cursor):
+    """Add trigger-maintained portfolio totals and per-day collections"""
+    create_portfolio_tables(cursor)
+    rebuild_portfolio_totals(cursor)
+    create_portfolio_triggers(cursor)
+
+
+def _add_loan_search_indexes(cursor):
+    """Index customer name (case-insensitive) and phone for prefix lookups"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loans_name_nocase ON loans (customer_name COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loans_phone ON loans (phone_number)")
+
+
+def _add_customer_search(cursor):
+    """Add the full-text customer search index (skipped if FTS5 is unavailable)"""
+    ensure_search_index(cursor)
+
+
+def _add_daily_runs(cursor):
+    """Add the end-of-day run ledger"""
+    create_daily_runs_table(cursor)
+
+
+def _add_customers(cursor):
+    """Move customer identity into customers and link loans to it by customer_id"""
+    create_customers_table(cursor)
+    cursor.execute("ALTER TABLE loans ADD COLUMN customer_id INTEGER REFERENCES customers (customer_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_loans_customer ON loans (customer_id)")
+
+    backfill_customers(cursor)
+    create_customer_triggers(cursor)
+
+    # customers replaces loan_cycles (its indexes and triggers go with it)
+    cursor.execute("DROP TABLE loan_cycles")
+    if fts5_available(cursor):
+        rebuild_search_index(cursor)
+
+
+def _to_cents_sql(column):
+    return f"CAST(ROUND({column} * {CENTS}) AS INTEGER)"
+
+
+def _store_money_as_cents(cursor):
+    """
+    Rebuild loans, payments and the portfolio counters with INTEGER cents.
+
+    SQLite cannot change a column's type in place, so each table is copied
+    into a new one and renamed. Dropping the old table drops its indexes and
+    triggers, which are then recreated.
+    """
+    # Keep AUTOINCREMENT counters so IDs of deleted rows are never reused
+    cursor.execute("SELECT name, seq FROM sqlite_sequence WHERE name IN ('loans', 'payments')")
+    sequences = cursor.fetchall()
+
+    cursor.execute("""
+        CREATE TABLE loans_new (
+            loan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_name TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            payment_per_day INTEGER NOT NULL,
+            term_months INTEGER NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            total_to_repay INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            created_by TEXT NOT NULL,
+            remaining_balance INTEGER NOT NULL,
+            physical_address TEXT,
+            national_id TEXT,
+            phone_number TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_updated TEXT DEFAULT CURRENT_TIMESTAMP,
+            customer_id INTEGER REFERENCES customers (customer_id)
+        )
+    """)
+    cursor.execute(f"""
+        INSERT INTO loans_new
+        SELECT
+            loan_id, customer_name, {_to_cents_sql('amount')}, {_to_cents_sql('payment_per_day')},
+            term_months, start_date, end_date, {_to_cents_sql('total_to_repay')}, status,
+            created_by, {_to_cents_sql('remaining_balance')}, physical_address, national_id,
+            phone_number, created_at, last_updated, customer_id
+        FROM loans
+    """)
+    cursor.execute("DROP TABLE loans")
+    cursor.execute("ALTER TABLE loans_new RENAME TO loans")
+
+    cursor.execute("""
+        CREATE TABLE payments_new (
+            payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            loan_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            received_by TEXT NOT NULL,
+            notes TEXT,
+            FOREIGN KEY (loan_id) REFERENCES loans (loan_id)
+        )
+    """)
+    cursor.execute(f"""
+        INSERT INTO payments_new
+        SELECT payment_id, loan_id, date, {_to_cents_sql('amount')}, received_by, notes
+        FROM payments
+    """)
+    cursor.execute("DROP TABLE payments")
+    cursor.execute("ALTER TABLE payments_new RENAME TO payments")
+
+    for name, seq in sequences:
+        cursor.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {name}")
+        seq = max(seq, cursor.fetchone()[0])
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (name,))
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, seq))
+
+    cursor.execute("CREATE INDEX idx_payments_loan_date ON payments (loan_id, date)")
+    cursor.execute("CREATE INDEX idx_payments_date ON payments (date)")
+    cursor.execute("CREATE INDEX idx_loans_status ON loans (status)")
+    cursor.execute("CREATE INDEX idx_loans_end_date ON loans (end_date)")
+    cursor.execute("CREATE INDEX idx_loans_name_nocase ON loans (customer_name COLLATE NOCASE)")
+    cursor.execute("CREATE INDEX idx_loans_phone ON loans (phone_number)")
+    cursor.execute("CREATE INDEX idx_loans_customer ON loans (customer_id)")
+
+    # Counter tables switch to INTEGER columns as well
+    cursor.execute("DROP TABLE portfolio_totals")
+    cursor.execute("DROP TABLE daily_collections")
+    _add_portfolio_counters(cursor)
+    create_customer_triggers(cursor)
+    if fts5_available(cursor):
+        rebuild_search_index(cursor)
+
+    # End-of-day stats record collected amounts, now in cents
+    cursor.execute("SELECT business_date, stats FROM daily_runs")
+    for business_date, stats in cursor.fetchall():
+        stats = json.loads(stats or '{}')
+        if 'amount' in stats.get('payments', {}):
+            stats['payments']['amount'] = round(stats['payments']['amount'] * CENTS)
+            cursor.execute(
+                "UPDATE daily_runs SET stats = ? WHERE business_date = ?",
+                (json.dumps(stats), business_date)
+            )
+
+
+def _add_day_columns(cursor):
+    """Add indexed day-number columns for loan and payment dates"""
+    add_day_columns(cursor)
+
+
+def _add_balance_ledger(cursor):
+    """Add the balance ledger, seed it from existing loans and payments, and snapshot it"""
+    create_ledger_tables(cursor)
+    backfill_ledger(cursor)
+    create_ledger_triggers(cursor)
+    take_balance_snapshots(cursor)
+
+
+def _add_change_log(cursor):
+    """Record row changes so replicas can sync deltas instead of copying the whole file"""
+    create_sync_tables(cursor)
+    create_sync_triggers(cursor)
+
+
+def _add_outbox(cursor):
+    """Version every synced row and queue a replica's own changes for replay"""
+    create_outbox_tables(cursor)
+    create_outbox_triggers(cursor)
+    cursor.execute("ALTER TABLE sync_conflicts ADD COLUMN operations TEXT")
+
+
+def _date_ledger_entries(cursor):
+    """Date new ledger entries by the disbursement or payment they record"""
+    drop_ledger_triggers(cursor)
+    create_ledger_triggers(cursor)
+
+
+def _index_ledger_by_day(cursor):
+    """Index ledger entries by loan and day, so balance lookups read only a snapshot's tail"""
+    create_ledger_tables(cursor)
+    cursor.execute("DROP INDEX IF EXISTS idx_loan_ledger_loan")
+    drop_ledger_triggers(cursor)
+    create_ledger_triggers(cursor)
+    # Snapshots taken before backdated entries dropped them may have missed those entries
+    cursor.execute("DELETE FROM balance_snapshots")
+    take_balance_snapshots(cursor)
+
+
+def _fold_outbox(cursor):
+    """Keep one net change per row in the outbox, holding only the columns that changed"""
+    upgrade_outbox(cursor)
+
+
+def _add_daily_run_sites(cursor):
+    """Record which database runs each business date, so a sync never adds two runs together"""
+    add_daily_run_sites(cursor)
+
+
+# Ordered list of (version, description, function). Never edit or reorder an
+# entry once released - add a new one instead.
+MIGRATIONS = [
+    (1, "Base schema", _create_base_schema),
+    (2, "Indexes for hot queries", _add_query_indexes),
+    (3, "Portfolio counters", _add_portfolio_counters),
+    (4, "Loan search indexes", _add_loan_search_indexes),
+    (5, "Customer full-text search", _add_customer_search),
+    (6, "End-of-day run ledger", _add_daily_runs),
+    (7, "Customers table", _add_customers),
+    (8, "Money as integer cents", _store_money_as_cents),
+    (9, "Day-number date columns", _add_day_columns),
+    (10, "Balance ledger and snapshots", _add_balance_ledger),
+    (11, "Change log for delta sync", _add_change_log),
+    (12, "Offline outbox and row versions", _add_outbox),
+    (13, "Ledger entries dated by their event", _date_ledger_entries),
+    (14, "Ledger indexed by loan and day", _index_ledger_by_day),
+    (15, "Outbox keeps one net change per row", _fold_outbox),
+    (16, "End-of-day runs owned by one site", _add_daily_run_sites),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Read the schema version stored in the database header"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Bring a database up to SCHEMA_VERSION.
+
+    When the schema is already current this costs a single PRAGMA read.
+    Otherwise pending migrations are applied in order inside one write
+    transaction, so a failed migration leaves the database untouched.
+
+    Returns:
+        int: The schema version after migrating
+    """
+    version = get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    if conn.in_transaction:
+        conn.commit()
+
+    # Take the write lock up front so two clients cannot migrate at once
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another client may have migrated while we waited for the lock
+        version = get_schema_version(conn)
+        cursor = conn.cursor()
+
+        for target, description, apply in MIGRATIONS:
+            if target <= version:
+                continue
+            try:
+                apply(cursor)
+            except sqlite3.Error as e:
+                raise sqlite3.DatabaseError(
+                    f"Migration {target} ({description}) failed: {str(e)}"
+                ) from e
+            version = target
+
+        # PRAGMA does not accept bound parameters
+        cursor.execute(f"PRAGMA user_version = {int(version)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return version
+
+
+def migrate_database(db_path):
+    """Open a database file, migrate it and close it again"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
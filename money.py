@@ -0,0 +1,135 @@
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+import pandas as pd
+
+
+# Money is stored as integer cents
+CENTS = 100
+
+# Columns holding cents in the DataFrames returned by SQLiteUserSystem
+MONEY_COLUMNS = (
+    'amount', 'payment_per_day', 'total_to_repay', 'remaining_balance',
+    'loan_amount', 'total_paid', 'remaining', 'arrears', 'amount_paid',
+)
+
+
+def to_cents(value):
+    """
+    Convert an amount in currency units (e.g. "1,250.50", 1250.5) to integer cents.
+
+    Money values are already cents and pass through unchanged. Amounts are
+    rounded half-up to the nearest cent.
+
+    Raises:
+        ValueError: If the value is not a number
+    """
+    if isinstance(value, Money):
+        return int(value)
+    if isinstance(value, float):
+        # repr gives the shortest string that round-trips, so 0.1 stays 0.1
+        value = repr(value)
+
+    try:
+        units = Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not units.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+
+    return int((units * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class Money(int):
+    """
+    An amount of money held as integer cents.
+
+    It behaves as an int for storage and arithmetic, but float() and format
+    specs work in currency units, so f"KES {Money(125050):,.2f}" prints
+    "KES 1,250.50". Adding, subtracting or scaling Money by an int gives
+    Money; mixing in a float raises TypeError instead of silently treating
+    units as cents.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_units(cls, value):
+        """Build Money from an amount in currency units"""
+        return cls(to_cents(value))
+
+    @property
+    def units(self):
+        """The amount in currency units as an exact Decimal"""
+        return Decimal(int(self)) / CENTS
+
+    def __float__(self):
+        return int(self) / CENTS
+
+    def __format__(self, format_spec):
+        if not format_spec:
+            return str(self)
+        return format(self.units, format_spec)
+
+    def __str__(self):
+        return f"{self.units:.2f}"
+
+    def __repr__(self):
+        return f"Money({self.units:.2f})"
+
+    def _cents(self, other):
+        if isinstance(other, float):
+            raise TypeError("Cannot mix Money with float - convert with Money.from_units() first")
+        if not isinstance(other, int):
+            return None
+        return int(other)
+
+    def __add__(self, other):
+        other = self._cents(other)
+        return NotImplemented if other is None else Money(int(self) + other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        other = self._cents(other)
+        return NotImplemented if other is None else Money(int(self) - other)
+
+    def __rsub__(self, other):
+        other = self._cents(other)
+        return NotImplemented if other is None else Money(other - int(self))
+
+    def __mul__(self, other):
+        if isinstance(other, Money):
+            raise TypeError("Cannot multiply Money by Money")
+        other = self._cents(other)
+        return NotImplemented if other is None else Money(int(self) * other)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-int(self))
+
+    def __abs__(self):
+        return Money(abs(int(self)))
+
+
+def wrap_money(record):
+    """Return a copy of a row dict with its money fields as Money"""
+    if record is None:
+        return None
+    return {
+        key: Money(value) if key in MONEY_COLUMNS and value is not None else value
+        for key, value in record.items()
+    }
+
+
+def money_frame(rows, columns):
+    """Build a DataFrame whose money columns are int64 cents, even when empty"""
+    df = pd.DataFrame(rows, columns=columns)
+    for column in MONEY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].fillna(0).astype('int64')
+    return df
+
+
+def format_money(cents, prefix="KES "):
+    """Format cents as currency units, e.g. 125050 -> "KES 1,250.50\""""
+    return f"{prefix}{Money(cents):,.2f}"
@@ -1,12 +1,13 @@
 import os
 import sys
-import sqlite3
 import shutil
-import win32file
 import time
 from ping3 import ping
 import netifaces
 
+from migrations import migrate_database
+from file_locking import FileLock
+
 
 def is_network_available():
     try:
@@ -36,72 +37,7 @@ def get_network_share_path():
 
 
 def setup_database_schema(db_path):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Create loans table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS loans (
-        loan_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        customer_name TEXT NOT NULL,
-        national_id TEXT NOT NULL,
-        phone_number TEXT NOT NULL,
-        physical_address TEXT,
-        amount REAL NOT NULL,
-        payment_per_day REAL NOT NULL,
-        term_months INTEGER NOT NULL,
-        start_date TEXT NOT NULL,
-        end_date TEXT NOT NULL,
-        total_to_repay REAL NOT NULL,
-        remaining_balance REAL NOT NULL,
-        status TEXT NOT NULL,
-        created_by TEXT NOT NULL,
-        loan_file TEXT,
-        last_modified_by TEXT,
-        last_modified_date TEXT
-    )
-    ''')
-
-    # Create users table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        full_name TEXT NOT NULL,
-        role TEXT NOT NULL,
-        last_login TEXT,
-        is_active INTEGER DEFAULT 1
-    )
-    ''')
-
-    # Create transactions table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS transactions (
-        transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        loan_id INTEGER NOT NULL,
-        amount REAL NOT NULL,
-        payment_date TEXT NOT NULL,
-        received_by TEXT NOT NULL,
-        notes TEXT,
-        FOREIGN KEY (loan_id) REFERENCES loans (loan_id)
-    )
-    ''')
-
-    # Create system_log table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS system_log (
-        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        event_time TEXT NOT NULL,
-        user_id INTEGER,
-        action TEXT NOT NULL,
-        details TEXT,
-        ip_address TEXT,
-        FOREIGN KEY (user_id) REFERENCES users (user_id)
-    ''')
-
-    conn.commit()
-    conn.close()
+    migrate_database(db_path)
 
 
 def setup_data_directory():
@@ -130,61 +66,28 @@ def setup_data_directory():
     # Create lock file for network access
     LOCK_FILE = os.path.join(DATA_DIR, '.lock')
 
-    # Initialize database if it doesn't exist
-    if not os.path.exists(DB_FILE):
-        setup_database_schema(DB_FILE)
-
-        # Add default admin user if the database is new
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-            INSERT INTO users (username, password_hash, full_name, role)
-            VALUES (?, ?, ?, ?)
-            ''', ('admin', 'default_hash', 'Administrator', 'admin'))
-            conn.commit()
-        except sqlite3.IntegrityError:
-            pass  # Admin user already exists
-        finally:
-            conn.close()
+    # Create or upgrade the database schema (creates the default admin user)
+    setup_database_schema(DB_FILE)
 
     return DATA_DIR, IS_NETWORK, DB_FILE
 
 
-def acquire_lock(lockfile):
-    """Implement file locking for network share"""
+def acquire_lock(lockfile, timeout=None):
+    """Implement file locking for network share (byte-range locks on Windows and POSIX)"""
+    # FileLock adds the .lock suffix itself
+    base = lockfile[:-len('.lock')] if lockfile.endswith('.lock') else lockfile
+    lock = FileLock(base, timeout=timeout)
     try:
-        handle = win32file.CreateFile(
-            lockfile,
-            win32file.GENERIC_WRITE,
-            0,
-            None,
-            win32file.OPEN_ALWAYS,
-            win32file.FILE_ATTRIBUTE_NORMAL,
-            None
-        )
-        win32file.LockFileEx(
-            handle,
-            win32file.LOCKFILE_EXCLUSIVE_LOCK,
-            0, 0xFFFF0000, 0xFFFF0000,
-            None
-        )
-        return handle
-    except:
-        return None
+        if lock.acquire():
+            return lock
+    except OSError:
+        pass
+    return None
 
 
 def release_lock(handle):
     if handle:
-        try:
-            win32file.UnlockFileEx(
-                handle,
-                0, 0xFFFF0000, 0xFFFF0000,
-                None
-            )
-            handle.close()
-        except:
-            pass
+        handle.release()
 
 
 if __name__ == '__main__':
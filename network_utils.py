@@ -1,11 +1,13 @@
 import os
 import sqlite3
-import shutil
 import configparser
 import platform
-import time
 from pathlib import Path
 
+from migrations import migrate_database
+from delta_sync import DeltaSync
+from share_health import ShareHealthMonitor, load_share_health_config
+
 
 class DatabaseManager:
     def __init__(self, data_dir):
@@ -14,80 +16,8 @@ class DatabaseManager:
         self._initialize_database()
 
     def _initialize_database(self):
-        """Initialize the SQLite database with required tables"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-
-            # Create loans table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS loans (
-                loan_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                customer_name TEXT NOT NULL,
-                national_id TEXT NOT NULL,
-                phone_number TEXT NOT NULL,
-                physical_address TEXT,
-                amount REAL NOT NULL,
-                payment_per_day REAL NOT NULL,
-                term_months INTEGER NOT NULL,
-                start_date TEXT NOT NULL,
-                end_date TEXT NOT NULL,
-                total_to_repay REAL NOT NULL,
-                remaining_balance REAL NOT NULL,
-                status TEXT NOT NULL,
-                created_by TEXT NOT NULL,
-                last_modified_by TEXT,
-                last_modified_date TEXT
-            )
-            ''')
-
-            # Create users table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                full_name TEXT NOT NULL,
-                role TEXT NOT NULL,
-                last_login TEXT,
-                is_active INTEGER DEFAULT 1
-            )
-            ''')
-
-            # Create transactions table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                loan_id INTEGER NOT NULL,
-                amount REAL NOT NULL,
-                payment_date TEXT NOT NULL,
-                received_by TEXT NOT NULL,
-                notes TEXT,
-                FOREIGN KEY (loan_id) REFERENCES loans (loan_id)
-            )
-            ''')
-
-            # Create system_log table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_log (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event_time TEXT NOT NULL,
-                user_id INTEGER,
-                action TEXT NOT NULL,
-                details TEXT,
-                ip_address TEXT,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-            ''')
-
-            # Add default admin user if none exists
-            cursor.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'")
-            if cursor.fetchone()[0] == 0:
-                cursor.execute('''
-                INSERT INTO users (username, password_hash, full_name, role)
-                VALUES (?, ?, ?, ?)
-                ''', ('admin', 'default_hash', 'Administrator', 'admin'))
-
-            conn.commit()
+        """Bring the database schema up to date"""
+        migrate_database(self.db_path)
 
     def get_connection(self):
         """Get a new database connection"""
@@ -97,9 +27,7 @@ class DatabaseManager:
 class NetworkManager:
     def __init__(self):
         self.config = self._load_config()
-        self.network_available = False
-        self.last_checked = 0
-        self.check_interval = 300  # 5 minutes
+        self.health = ShareHealthMonitor(self.config['network_path'], **load_share_health_config())
         self.db_manager = None
 
     def _load_config(self):
@@ -111,38 +39,31 @@ class NetworkManager:
             'shared_mode': config.getboolean('Network', 'shared_mode', fallback=False),
             'network_path': config.get('Network', 'network_path', fallback=''),
             'fallback': config.getboolean('Network', 'fallback_to_local', fallback=True),
-            'retry_interval': config.getint('Network', 'retry_interval', fallback=5),
-            'max_retries': config.getint('Network', 'max_retries', fallback=3)
         }
 
+    @property
+    def network_available(self):
+        return bool(self.health.status()['available'])
+
     def verify_network_share(self):
-        """Verify if network share is accessible with retries"""
+        """
+        Check if the network share is accessible, without blocking.
+
+        Returns the cached result of the background probe (starting a new
+        probe when it is stale), so an unreachable share costs nothing here.
+        """
         if not self.config['shared_mode']:
             return False
-
-        if time.time() - self.last_checked < self.check_interval:
-            return self.network_available
-
-        retries = 0
-        while retries < self.config['max_retries']:
-            try:
-                test_file = os.path.join(self.config['network_path'], 'connection_test.tmp')
-                with open(test_file, 'w') as f:
-                    f.write(str(time.time()))
-                os.remove(test_file)
-                self.network_available = True
-                self.last_checked = time.time()
-                return True
-            except Exception as e:
-                retries += 1
-                time.sleep(self.config['retry_interval'])
-
-        self.network_available = False
-        return False
+        return self.health.is_available()
 
     def get_data_directory(self):
-        """Determine the appropriate data directory with fallback"""
-        if self.verify_network_share():
+        """
+        Determine the appropriate data directory with fallback.
+
+        Waits at most `startup_wait` seconds for the first probe; a share that
+        answers later is picked up by the sync scheduler.
+        """
+        if self.config['shared_mode'] and self.health.wait_for_first_probe():
             return self.config['network_path']
 
         if self.config['fallback']:
@@ -171,12 +92,10 @@ class NetworkManager:
             local_db = os.path.join(local_path, 'kodongo_loans.db')
             network_db = os.path.join(self.config['network_path'], 'kodongo_loans.db')
 
-            # Only sync if local database exists and is newer
+            # Push local changes and pull the network's, row by row
             if os.path.exists(local_db):
-                if not os.path.exists(network_db) or \
-                        os.path.getmtime(local_db) > os.path.getmtime(network_db):
-                    shutil.copy2(local_db, network_db)
-                    return True
+                stats = DeltaSync(network_db, local_db).sync()
+                return stats['pushed'] > 0 or stats['mode'] == 'publish'
             return False
         except Exception as e:
             print(f"Database sync failed: {str(e)}")
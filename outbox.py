@@ -0,0 +1,407 @@
+import json
+
+from change_log import SYNC_TABLES, TRACKED_UPDATE_COLUMNS, stored_columns
+
+
+def create_outbox_tables(cursor):
+    """
+    Create the per-row version vectors, the outbox and its state row.
+
+    row_versions holds a version vector for every synced row: a JSON object
+    counting, per site, the changes that site made to the row. outbox holds
+    the net change to each row made locally while this database is a
+    replica, one entry per row however often it changed: the row's vector
+    before the first change and after the last, the changed columns' values
+    before the first change and after the last (the whole row for inserts
+    and deletes), and the operations that made it (add_payment,
+    update_loan, ...). seq orders the writes, so a sync only clears what it
+    replayed. outbox_state names the operation in progress and switches
+    recording off on the shared database, which has no one to replay to.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS row_versions (
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            vector TEXT NOT NULL,
+            PRIMARY KEY (table_name, row_id)
+        ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            seq INTEGER NOT NULL,
+            operation_id INTEGER NOT NULL,
+            operation TEXT,
+            operations TEXT NOT NULL DEFAULT '[]',
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            base_vector TEXT,
+            vector TEXT NOT NULL,
+            before TEXT,
+            after TEXT,
+            created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            UNIQUE (table_name, row_id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS outbox_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            recording INTEGER NOT NULL DEFAULT 1,
+            operation_id INTEGER NOT NULL DEFAULT 0,
+            operation TEXT,
+            sequence INTEGER NOT NULL DEFAULT 0,
+            cleared_operation_id INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO outbox_state (id) VALUES (1)")
+
+
+def create_outbox_triggers(cursor):
+    """
+    Keep row versions current and fold local changes into the outbox.
+
+    The triggers capture every stored column by name, so a migration that
+    adds a column to a synced table must call this again to recreate them.
+    """
+    origin = "(SELECT origin FROM sync_state WHERE id = 1)"
+    path = f"'$.\"' || {origin} || '\"'"
+    # Changes made here, as opposed to ones a sync is applying (which sets the versions itself)
+    local = "(SELECT origin = site_id FROM sync_state WHERE id = 1)"
+    # ...and only queued on a replica
+    recording = f"s.id = 1 AND s.recording = 1 AND {local}"
+
+    def bumped(vector):
+        return f"json_set(COALESCE({vector}, '{{}}'), {path}, COALESCE(json_extract({vector}, {path}), 0) + 1)"
+
+    next_seq = f"UPDATE outbox_state SET sequence = sequence + 1 WHERE id = 1 AND recording = 1 AND {local};"
+    operations = "CASE WHEN s.operation IS NULL THEN '[]' ELSE json_array(s.operation) END"
+    merged_operations = """
+        CASE WHEN excluded.operation IS NULL
+                  OR EXISTS (SELECT 1 FROM json_each(outbox.operations) WHERE value = excluded.operation)
+             THEN outbox.operations
+             ELSE json_insert(outbox.operations, '$[#]', excluded.operation) END
+    """
+    # Set on every fold of a later write into a row's entry
+    latest = f"""
+        seq = excluded.seq,
+        operation_id = excluded.operation_id,
+        operation = excluded.operation,
+        operations = {merged_operations},
+        vector = excluded.vector
+    """
+
+    for table, key in SYNC_TABLES.items():
+        columns = stored_columns(cursor, table)
+        tracked = TRACKED_UPDATE_COLUMNS.get(table)
+        of_columns = f"OF {', '.join(tracked)} " if tracked else ""
+
+        def row_json(prefix):
+            pairs = ', '.join(f"'{column}', {prefix}.{column}" for column in columns)
+            return f"json_object({pairs})"
+
+        def set_columns(target, value, condition):
+            # json_set on each column meeting the condition; the rest write '$._', removed after
+            # (json_patch would drop columns whose value is NULL)
+            pairs = ', '.join(
+                f"CASE WHEN {condition(column)} THEN '$.{column}' ELSE '$._' END, {value(column)}"
+                for column in columns
+            )
+            return f"json_remove(json_set({target}, {pairs}), '$._')"
+
+        def changed(column):
+            return f"new.{column} IS NOT old.{column}"
+
+        def changed_json(prefix):
+            return set_columns("'{}'", lambda column: f"{prefix}.{column}", changed)
+
+        bump_version = f"""
+            INSERT INTO row_versions (table_name, row_id, vector)
+            SELECT '{table}', new.{key}, json_object({origin}, 1) WHERE {local}
+            ON CONFLICT(table_name, row_id) DO UPDATE SET vector = {bumped('vector')};
+        """
+
+        for event in ('insert', 'update', 'delete'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_outbox_{table}_{event}")
+
+        # A row deleted offline and inserted again is a change to it
+        cursor.execute(f"""
+            CREATE TRIGGER trg_outbox_{table}_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                {next_seq}
+                INSERT INTO outbox (seq, operation_id, operation, operations, table_name, row_id, kind, vector, after)
+                SELECT s.sequence, s.operation_id, s.operation, {operations}, '{table}', new.{key}, 'insert',
+                       {bumped('NULL')}, {row_json('new')}
+                FROM outbox_state s WHERE {recording}
+                ON CONFLICT(table_name, row_id) DO UPDATE SET
+                    {latest},
+                    kind = CASE WHEN outbox.kind = 'delete' THEN 'update' ELSE 'insert' END,
+                    after = excluded.after;
+                {bump_version}
+            END
+        """)
+
+        # Later values overwrite the entry's, base values are kept; a row
+        # inserted offline stays an insert of its latest values
+        cursor.execute(f"""
+            CREATE TRIGGER trg_outbox_{table}_update
+            AFTER UPDATE {of_columns}ON {table}
+            BEGIN
+                UPDATE row_versions SET row_id = new.{key}
+                WHERE table_name = '{table}' AND row_id = old.{key} AND new.{key} IS NOT old.{key};
+                {next_seq}
+                INSERT INTO outbox (seq, operation_id, operation, operations, table_name, row_id, kind,
+                                    base_vector, vector, before, after)
+                SELECT s.sequence, s.operation_id, s.operation, {operations}, '{table}', new.{key}, 'update',
+                       v.vector, {bumped('v.vector')}, {changed_json('old')}, {changed_json('new')}
+                FROM outbox_state s
+                LEFT JOIN row_versions v ON v.table_name = '{table}' AND v.row_id = new.{key}
+                WHERE {recording}
+                ON CONFLICT(table_name, row_id) DO UPDATE SET
+                    {latest},
+                    before = CASE WHEN outbox.kind = 'insert' THEN NULL ELSE {set_columns(
+                        "COALESCE(outbox.before, '{}')",
+                        lambda column: f"old.{column}",
+                        lambda column: f"{changed(column)} AND json_type(outbox.before, '$.{column}') IS NULL"
+                    )} END,
+                    after = {set_columns("COALESCE(outbox.after, '{}')", lambda column: f"new.{column}", changed)};
+                {bump_version}
+            END
+        """)
+
+        # A row inserted and deleted offline leaves nothing to replay
+        cursor.execute(f"""
+            CREATE TRIGGER trg_outbox_{table}_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                {next_seq}
+                INSERT INTO outbox (seq, operation_id, operation, operations, table_name, row_id, kind,
+                                    base_vector, vector, before)
+                SELECT s.sequence, s.operation_id, s.operation, {operations}, '{table}', old.{key}, 'delete',
+                       v.vector, {bumped('v.vector')}, {row_json('old')}
+                FROM outbox_state s
+                LEFT JOIN row_versions v ON v.table_name = '{table}' AND v.row_id = old.{key}
+                WHERE {recording} AND NOT EXISTS (
+                    SELECT 1 FROM outbox o WHERE o.table_name = '{table}' AND o.row_id = old.{key} AND o.kind = 'insert'
+                )
+                ON CONFLICT(table_name, row_id) DO UPDATE SET
+                    {latest},
+                    kind = 'delete',
+                    before = {set_columns(
+                        "excluded.before",
+                        lambda column: f"json_extract(outbox.before, '$.{column}')",
+                        lambda column: f"json_type(outbox.before, '$.{column}') IS NOT NULL"
+                    )},
+                    after = NULL;
+                DELETE FROM outbox
+                WHERE table_name = '{table}' AND row_id = old.{key} AND kind = 'insert'
+                  AND EXISTS (SELECT 1 FROM outbox_state s WHERE {recording});
+                DELETE FROM row_versions WHERE table_name = '{table}' AND row_id = old.{key};
+            END
+        """)
+
+
+def upgrade_outbox(cursor):
+    """
+    Fold an outbox of one entry per write into one net entry per row.
+
+    Each update keeps only the columns it changed, as the triggers now
+    record them; entry ids become the seq, so nothing replayed is lost.
+    """
+    cursor.execute("PRAGMA table_info(outbox_state)")
+    state_columns = {row[1] for row in cursor.fetchall()}
+    for column in ('sequence', 'cleared_operation_id'):
+        if column not in state_columns:
+            cursor.execute(f"ALTER TABLE outbox_state ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+
+    cursor.execute("PRAGMA table_info(outbox)")
+    if 'seq' in {row[1] for row in cursor.fetchall()}:
+        create_outbox_triggers(cursor)
+        return
+
+    cursor.execute("""
+        SELECT entry_id, operation_id, operation, table_name, row_id, kind,
+               base_vector, vector, before, after, created_at
+        FROM outbox
+        ORDER BY entry_id
+    """)
+    net = {}
+    for (entry_id, operation_id, operation, table, row_id, kind,
+         base_vector, vector, before, after, created_at) in cursor.fetchall():
+        before = json.loads(before) if before else None
+        after = json.loads(after) if after else None
+        entry = net.get((table, row_id))
+
+        if kind == 'delete' and entry is not None and entry['kind'] == 'insert':
+            del net[(table, row_id)]
+            continue
+        if entry is None:
+            entry = net[(table, row_id)] = {
+                'kind': kind, 'base_vector': base_vector, 'before': None, 'after': None,
+                'operations': [], 'created_at': created_at,
+            }
+            if kind == 'update':
+                entry['before'], entry['after'] = {}, {}
+
+        if kind == 'insert':
+            entry['kind'] = 'update' if entry['kind'] == 'delete' else 'insert'
+            entry['after'] = after
+        elif kind == 'update':
+            columns = [column for column in after if after[column] != before.get(column)]
+            if entry['kind'] != 'insert':
+                for column in columns:
+                    entry['before'].setdefault(column, before.get(column))
+            entry['after'].update((column, after[column]) for column in columns)
+        else:
+            entry['kind'] = 'delete'
+            entry['before'] = {**before, **(entry['before'] or {})}
+            entry['after'] = None
+
+        entry.update(seq=entry_id, operation_id=operation_id, operation=operation, vector=vector)
+        if operation and operation not in entry['operations']:
+            entry['operations'].append(operation)
+
+    cursor.execute("DROP TABLE outbox")
+    create_outbox_tables(cursor)
+    cursor.executemany("""
+        INSERT INTO outbox (seq, operation_id, operation, operations, table_name, row_id, kind,
+                            base_vector, vector, before, after, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (entry['seq'], entry['operation_id'], entry['operation'], json.dumps(entry['operations']),
+         table, row_id, entry['kind'], entry['base_vector'], entry['vector'],
+         json.dumps(entry['before']) if entry['before'] is not None else None,
+         json.dumps(entry['after']) if entry['after'] is not None else None,
+         entry['created_at'])
+        for (table, row_id), entry in sorted(net.items(), key=lambda item: item[1]['seq'])
+    ])
+    cursor.execute("""
+        UPDATE outbox_state SET sequence = MAX(sequence, (SELECT COALESCE(MAX(seq), 0) FROM outbox))
+        WHERE id = 1
+    """)
+    create_outbox_triggers(cursor)
+
+
+def begin_operation(cursor, name):
+    """
+    Name the operation the following writes belong to, e.g. 'add_payment'.
+
+    Call it inside the write transaction, before the first write. On the
+    shared database (not recording) this writes nothing.
+    """
+    cursor.execute("""
+        UPDATE outbox_state SET operation_id = operation_id + 1, operation = ?
+        WHERE id = 1 AND recording = 1
+    """, (name,))
+
+
+def is_recording(cursor):
+    cursor.execute("SELECT recording FROM outbox_state WHERE id = 1")
+    return bool(cursor.fetchone()[0])
+
+
+def set_recording(cursor, recording):
+    """Switch recording on (a replica) or off (the shared database, which also drops its outbox)"""
+    cursor.execute("UPDATE outbox_state SET recording = ? WHERE id = 1", (int(recording),))
+    if not recording:
+        cursor.execute("DELETE FROM outbox")
+        cursor.execute("UPDATE outbox_state SET cleared_operation_id = operation_id WHERE id = 1")
+
+
+def get_status(cursor):
+    """
+    Summarise what is waiting to be replayed.
+
+    Returns:
+        dict: operations, rows and oldest (created_at of the oldest entry, or None)
+    """
+    cursor.execute("SELECT COUNT(*), MIN(created_at) FROM outbox")
+    rows, oldest = cursor.fetchone()
+    cursor.execute("SELECT operation_id - cleared_operation_id FROM outbox_state WHERE id = 1")
+    # An operation cleared mid-way still has rows waiting
+    operations = max(cursor.fetchone()[0], 1) if rows else 0
+    return {'operations': operations, 'rows': rows, 'oldest': oldest}
+
+
+def pending_rows(cursor):
+    """
+    Read the net change to each row, oldest first.
+
+    The triggers fold every write into its row's entry, so each entry runs
+    from the values and base vector before the first change to the values
+    and vector after the last.
+
+    Returns:
+        tuple: (list of changes, last seq read). Each change has table,
+               row_id, kind ('insert', 'update' or 'delete'), base_vector and
+               vector (dicts), before and after (dicts or None; an update's
+               hold only the columns it changed) and the names of the
+               operations that made it.
+    """
+    cursor.execute("""
+        SELECT seq, operations, table_name, row_id, kind, base_vector, vector, before, after
+        FROM outbox
+        ORDER BY entry_id
+    """)
+
+    changes, last_seq = [], 0
+    for seq, operations, table, row_id, kind, base_vector, vector, before, after in cursor.fetchall():
+        last_seq = max(last_seq, seq)
+        changes.append({
+            'table': table,
+            'row_id': row_id,
+            'kind': kind,
+            'base_vector': json.loads(base_vector) if base_vector else {},
+            'vector': json.loads(vector),
+            'before': json.loads(before) if before else None,
+            'after': json.loads(after) if after else None,
+            'operations': json.loads(operations),
+        })
+
+    return changes, last_seq
+
+
+def clear(cursor, up_to_seq):
+    """Drop outbox entries that have been replayed; entries changed since keep their later seq"""
+    cursor.execute("""
+        UPDATE outbox_state
+        SET cleared_operation_id = MAX(cleared_operation_id, (
+            SELECT COALESCE(MAX(operation_id), 0) FROM outbox WHERE seq <= ?
+        ))
+        WHERE id = 1
+    """, (up_to_seq,))
+    cursor.execute("DELETE FROM outbox WHERE seq <= ?", (up_to_seq,))
+
+
+def dominates(vector, other):
+    """True if vector has seen every change other has"""
+    return all(vector.get(site, 0) >= count for site, count in other.items())
+
+
+def merge_vectors(vector, other):
+    return {site: max(vector.get(site, 0), other.get(site, 0)) for site in set(vector) | set(other)}
+
+
+def row_vectors(cursor, table, ids):
+    """Version vectors of rows by id (rows never changed since versioning began are left out)"""
+    vectors = {}
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        cursor.execute(
+            f"SELECT row_id, vector FROM row_versions WHERE table_name = ? AND row_id IN ({', '.join('?' * len(batch))})",
+            [table] + batch
+        )
+        vectors.update((row_id, json.loads(vector)) for row_id, vector in cursor.fetchall())
+    return vectors
+
+
+def set_row_vectors(cursor, table, vectors):
+    """Overwrite the version vectors of rows, e.g. with the ones a sync agreed on"""
+    cursor.executemany("""
+        INSERT INTO row_versions (table_name, row_id, vector) VALUES (?, ?, ?)
+        ON CONFLICT(table_name, row_id) DO UPDATE SET vector = excluded.vector
+    """, [(table, row_id, json.dumps(vector, separators=(',', ':'))) for row_id, vector in vectors.items()])
@@ -0,0 +1,224 @@
+# Fields of portfolio_totals that can be verified against the loans table
+TOTAL_FIELDS = (
+    'loan_count', 'amount_given', 'total_to_repay',
+    'outstanding', 'active_loans', 'paid_loans'
+)
+
+# Money is integer cents, so stored and recomputed totals must match exactly
+MONEY_TOLERANCE = 0
+
+_COMPUTE_TOTALS_SQL = """
+    SELECT
+        COUNT(*),
+        COALESCE(SUM(amount), 0),
+        COALESCE(SUM(total_to_repay), 0),
+        COALESCE(SUM(remaining_balance), 0),
+        COALESCE(SUM(status = 'Active'), 0),
+        COALESCE(SUM(status = 'Paid'), 0)
+    FROM loans
+"""
+
+
+def create_portfolio_tables(cursor):
+    """
+    Create the counter tables.
+
+    portfolio_totals holds a single row of running totals over loans and
+    daily_collections holds the sum of payments per day. Triggers keep both
+    current, so dashboard summaries are a primary-key read instead of
+    several full scans.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS portfolio_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            loan_count INTEGER NOT NULL DEFAULT 0,
+            amount_given INTEGER NOT NULL DEFAULT 0,
+            total_to_repay INTEGER NOT NULL DEFAULT 0,
+            outstanding INTEGER NOT NULL DEFAULT 0,
+            active_loans INTEGER NOT NULL DEFAULT 0,
+            paid_loans INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_collections (
+            date TEXT PRIMARY KEY,
+            amount INTEGER NOT NULL DEFAULT 0,
+            payment_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def create_portfolio_triggers(cursor):
+    """Create the triggers that keep the counters in step with loans and payments"""
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_portfolio_loan_insert
+        AFTER INSERT ON loans
+        BEGIN
+            UPDATE portfolio_totals SET
+                loan_count = loan_count + 1,
+                amount_given = amount_given + new.amount,
+                total_to_repay = total_to_repay + new.total_to_repay,
+                outstanding = outstanding + new.remaining_balance,
+                active_loans = active_loans + (new.status = 'Active'),
+                paid_loans = paid_loans + (new.status = 'Paid')
+            WHERE id = 1;
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_portfolio_loan_delete
+        AFTER DELETE ON loans
+        BEGIN
+            UPDATE portfolio_totals SET
+                loan_count = loan_count - 1,
+                amount_given = amount_given - old.amount,
+                total_to_repay = total_to_repay - old.total_to_repay,
+                outstanding = outstanding - old.remaining_balance,
+                active_loans = active_loans - (old.status = 'Active'),
+                paid_loans = paid_loans - (old.status = 'Paid')
+            WHERE id = 1;
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_portfolio_loan_update
+        AFTER UPDATE OF amount, total_to_repay, remaining_balance, status ON loans
+        BEGIN
+            UPDATE portfolio_totals SET
+                amount_given = amount_given + new.amount - old.amount,
+                total_to_repay = total_to_repay + new.total_to_repay - old.total_to_repay,
+                outstanding = outstanding + new.remaining_balance - old.remaining_balance,
+                active_loans = active_loans + (new.status = 'Active') - (old.status = 'Active'),
+                paid_loans = paid_loans + (new.status = 'Paid') - (old.status = 'Paid')
+            WHERE id = 1;
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_collections_payment_insert
+        AFTER INSERT ON payments
+        BEGIN
+            INSERT INTO daily_collections (date, amount, payment_count)
+            VALUES (new.date, new.amount, 1)
+            ON CONFLICT (date) DO UPDATE SET
+                amount = amount + excluded.amount,
+                payment_count = payment_count + 1;
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_collections_payment_delete
+        AFTER DELETE ON payments
+        BEGIN
+            UPDATE daily_collections SET
+                amount = amount - old.amount,
+                payment_count = payment_count - 1
+            WHERE date = old.date;
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_collections_payment_update
+        AFTER UPDATE OF date, amount ON payments
+        BEGIN
+            UPDATE daily_collections SET
+                amount = amount - old.amount,
+                payment_count = payment_count - 1
+            WHERE date = old.date;
+
+            INSERT INTO daily_collections (date, amount, payment_count)
+            VALUES (new.date, new.amount, 1)
+            ON CONFLICT (date) DO UPDATE SET
+                amount = amount + excluded.amount,
+                payment_count = payment_count + 1;
+        END
+    """)
+
+
+def rebuild_portfolio_totals(cursor):
+    """Recompute both counter tables from scratch in one pass each"""
+    cursor.execute("DELETE FROM portfolio_totals")
+    cursor.execute(f"""
+        INSERT INTO portfolio_totals (
+            id, loan_count, amount_given, total_to_repay,
+            outstanding, active_loans, paid_loans
+        )
+        SELECT 1, * FROM ({_COMPUTE_TOTALS_SQL})
+    """)
+
+    cursor.execute("DELETE FROM daily_collections")
+    cursor.execute("""
+        INSERT INTO daily_collections (date, amount, payment_count)
+        SELECT date, SUM(amount), COUNT(*)
+        FROM payments
+        GROUP BY date
+    """)
+
+
+def read_summary(cursor, date):
+    """
+    Read the portfolio totals plus the collections for one day.
+
+    Returns:
+        tuple: (amount_given, outstanding, total_interest, daily_paid,
+                active_loans, paid_loans, loan_count)
+    """
+    cursor.execute("""
+        SELECT
+            t.amount_given,
+            t.outstanding,
+            t.total_to_repay - t.amount_given,
+            COALESCE((SELECT amount FROM daily_collections WHERE date = ?), 0),
+            t.active_loans,
+            t.paid_loans,
+            t.loan_count
+        FROM portfolio_totals t
+        WHERE t.id = 1
+    """, (date,))
+    return cursor.fetchone() or (0, 0, 0, 0, 0, 0, 0)
+
+
+def verify_portfolio_totals(cursor, repair=False):
+    """
+    Compare the maintained counters with totals recomputed from scratch.
+
+    Args:
+        cursor: Database cursor
+        repair (bool): Rebuild the counter tables if any drift is found
+
+    Returns:
+        dict: {field: (stored, actual)} for every field that drifted.
+              Per-day collections are reported as 'collections:<date>'.
+    """
+    drift = {}
+
+    cursor.execute(f"SELECT {', '.join(TOTAL_FIELDS)} FROM portfolio_totals WHERE id = 1")
+    stored = cursor.fetchone() or (0,) * len(TOTAL_FIELDS)
+    cursor.execute(_COMPUTE_TOTALS_SQL)
+    actual = cursor.fetchone()
+
+    for field, stored_value, actual_value in zip(TOTAL_FIELDS, stored, actual):
+        if abs((stored_value or 0) - (actual_value or 0)) > MONEY_TOLERANCE:
+            drift[field] = (stored_value, actual_value)
+
+    # Full outer join of the stored and recomputed per-day collections
+    cursor.execute("""
+        WITH actual AS (
+            SELECT date, SUM(amount) AS amount FROM payments GROUP BY date
+        )
+        SELECT a.date, COALESCE(d.amount, 0), a.amount
+        FROM actual a LEFT JOIN daily_collections d ON d.date = a.date
+        UNION ALL
+        SELECT d.date, d.amount, 0
+        FROM daily_collections d
+        WHERE d.date NOT IN (SELECT date FROM actual)
+    """)
+    for date, stored_value, actual_value in cursor.fetchall():
+        if abs((stored_value or 0) - (actual_value or 0)) > MONEY_TOLERANCE:
+            drift[f'collections:{date}'] = (stored_value, actual_value)
+
+    if drift and repair:
+        rebuild_portfolio_totals(cursor)
+
+    return drift
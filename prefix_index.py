@@ -0,0 +1,184 @@
+import re
+import time
+import bisect
+import threading
+import configparser
+from collections import namedtuple
+
+
+def load_search_config(config_path='config.ini'):
+    """Load live search settings from the [Search] section of config.ini"""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    return {
+        'debounce_ms': config.getint('Search', 'debounce_ms', fallback=250),
+        'max_age': config.getfloat('Search', 'index_max_age', fallback=120.0),
+    }
+
+
+def tokenize(text):
+    """Lower-case word tokens, split the way the full-text index splits them"""
+    return re.findall(r"\w+", str(text or "").lower())
+
+
+def _loan_tokens(customer_name, phone_number, national_id):
+    return tuple(sorted(set(tokenize(customer_name) + tokenize(phone_number) + tokenize(national_id))))
+
+
+def _matches_words(tokens, words):
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+
+def matches(loan, term):
+    """
+    Whether a loan dict matches a search term the way PrefixIndex.search does.
+
+    Every word must start a word of the name, phone number or national ID;
+    a numeric term also matches the loan ID.
+    """
+    words = tokenize(term)
+    if not words:
+        return True
+    if term.strip().isdigit() and str(loan['loan_id']) == term.strip():
+        return True
+    tokens = _loan_tokens(loan['customer_name'], loan['phone_number'], loan['national_id'])
+    return _matches_words(tokens, words)
+
+
+# Result of a search: the term, the matching loan IDs (ascending) and the
+# index generation it was computed at, so a longer term can narrow it
+PrefixMatch = namedtuple('PrefixMatch', ['term', 'loan_ids', 'generation'])
+
+
+class PrefixIndex:
+    """
+    In-memory prefix index over loans' customer name, phone number and national ID.
+
+    Tokens are kept in one sorted list of (token, loan_id) pairs, so the
+    loans with a token starting with a prefix are a contiguous range found
+    by bisection. It is built from the database on first use and then kept
+    current by update() and remove() as loans change; invalidate() forces a
+    rebuild after changes it was not told about (a sync pull, end-of-day
+    archiving), as does reaching max_age.
+
+    A search for a term extending the previous one (typing another letter)
+    only re-checks the previous result instead of scanning the index again.
+    Any change to the index bumps `generation`, which stops older results
+    being narrowed.
+
+    Args:
+        load (callable): Returns (loan_id, customer_name, phone_number, national_id) rows
+        max_age (float): Seconds before the index is rebuilt from the database
+            on its next use (None or 0 for never)
+    """
+
+    def __init__(self, load, max_age=None):
+        self.load = load
+        self.max_age = max_age
+
+        self._lock = threading.RLock()
+        self._keys = []  # Sorted (token, loan_id) pairs
+        self._tokens = {}  # loan_id -> its tokens
+        self._built_at = None  # monotonic time of the last build, None when not built
+        self.generation = 0
+
+    def ensure_built(self):
+        """Build the index if it is missing or older than max_age"""
+        with self._lock:
+            if self._built_at is not None and not (
+                    self.max_age and time.monotonic() - self._built_at > self.max_age):
+                return
+
+            tokens = {row[0]: _loan_tokens(*row[1:]) for row in self.load()}
+            self._tokens = tokens
+            self._keys = sorted((token, loan_id) for loan_id, loan_tokens in tokens.items() for token in loan_tokens)
+            self._built_at = time.monotonic()
+            self.generation += 1
+
+    def invalidate(self):
+        """Drop the index; the next search rebuilds it"""
+        with self._lock:
+            self._keys = []
+            self._tokens = {}
+            self._built_at = None
+            self.generation += 1
+
+    def update(self, loan):
+        """Index a new or changed loan (a dict with loan_id, customer_name, phone_number and national_id)"""
+        with self._lock:
+            if self._built_at is None:
+                return  # Picked up by the next build
+            loan_id = loan['loan_id']
+            tokens = _loan_tokens(loan['customer_name'], loan['phone_number'], loan['national_id'])
+            if self._tokens.get(loan_id) == tokens:
+                return
+            self._remove_keys(loan_id)
+            for token in tokens:
+                bisect.insort(self._keys, (token, loan_id))
+            self._tokens[loan_id] = tokens
+            self.generation += 1
+
+    def remove(self, loan_id):
+        """Drop a deleted loan from the index"""
+        with self._lock:
+            if self._built_at is None or loan_id not in self._tokens:
+                return
+            self._remove_keys(loan_id)
+            del self._tokens[loan_id]
+            self.generation += 1
+
+    def _remove_keys(self, loan_id):
+        for token in self._tokens.get(loan_id, ()):
+            position = bisect.bisect_left(self._keys, (token, loan_id))
+            if position < len(self._keys) and self._keys[position] == (token, loan_id):
+                del self._keys[position]
+
+    def search(self, term, previous=None):
+        """
+        Find the loans matching a term (see matches()).
+
+        Args:
+            term (str): Search text
+            previous (PrefixMatch): An earlier result; narrowed instead of
+                searching the whole index when term extends its term and
+                the index has not changed since
+
+        Returns:
+            PrefixMatch: The matching loan IDs, or None if term has no words
+        """
+        words = tokenize(term)
+        if not words:
+            return None
+        term = term.strip()
+
+        with self._lock:
+            self.ensure_built()
+
+            if (previous is not None and previous.generation == self.generation
+                    and term.lower().startswith(previous.term.lower())):
+                if term == previous.term:
+                    return previous
+                candidates = previous.loan_ids
+            else:
+                # Walk the range for the longest word, the most selective one
+                word = max(words, key=len)
+                candidates = set()
+                position = bisect.bisect_left(self._keys, (word,))
+                while position < len(self._keys) and self._keys[position][0].startswith(word):
+                    candidates.add(self._keys[position][1])
+                    position += 1
+
+            found = {
+                loan_id for loan_id in candidates
+                if loan_id in self._tokens and _matches_words(self._tokens[loan_id], words)
+            }
+            if term.isdigit() and int(term) in self._tokens:
+                found.add(int(term))
+
+            return PrefixMatch(term, sorted(found), self.generation)
+
+    def stats(self):
+        """Loans and tokens indexed, and the current generation"""
+        with self._lock:
+            return {'loans': len(self._tokens), 'tokens': len(self._keys), 'generation': self.generation}
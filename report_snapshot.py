@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+import configparser
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.request import pathname2url
+
+import archive
+from sql_metrics import InstrumentedConnection
+
+
+REPORT_FILENAME = 'kodongo_report.db'
+REPORT_ARCHIVE_FILENAME = 'kodongo_report_archive.db'
+
+# 'wal' reads a pinned WAL snapshot of the live file, 'copy' reads a local
+# copy taken with the backup API, 'live' reads the pooled connection as before
+SNAPSHOT_MODES = ('auto', 'wal', 'copy', 'live')
+
+
+def load_report_config(config_path='config.ini'):
+    """Load report snapshot settings from the [Reports] section of config.ini"""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    mode = config.get('Reports', 'snapshot_mode', fallback='auto').strip().lower()
+    return {
+        'mode': mode if mode in SNAPSHOT_MODES else 'auto',
+        'max_age': config.getfloat('Reports', 'max_age', fallback=300),
+    }
+
+
+def _read_only_uri(path):
+    return f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+
+
+class ReportSnapshot:
+    """
+    Read-only, consistent connections for reports.
+
+    When the live database runs in WAL mode, each report opens a read-only
+    connection and holds one read transaction, so every query in the report
+    sees the same instant and writers are never blocked. Otherwise (DELETE
+    journal mode on a network share) reports read a local copy taken with
+    the online backup API, refreshed once it is older than max_age; tellers
+    only wait for the copy itself, never for a report query.
+
+    Args:
+        db_manager: DatabaseManager providing pooled connections
+        snapshot_dir (str): Local folder for the copied database
+        mode (str): 'auto', 'wal', 'copy' or 'live'
+        max_age (float): Seconds before a copied snapshot is refreshed
+    """
+
+    def __init__(self, db_manager, snapshot_dir, mode='auto', max_age=300):
+        self.db_manager = db_manager
+        self.snapshot_dir = snapshot_dir
+        self.requested_mode = mode
+        self.max_age = max_age
+        self.snapshot_path = os.path.join(snapshot_dir, REPORT_FILENAME)
+        self.archive_snapshot_path = os.path.join(snapshot_dir, REPORT_ARCHIVE_FILENAME)
+
+        self._lock = threading.Lock()
+        self._taken_at = None  # When the copy was last refreshed
+        self._last_read_at = None  # When the last WAL/live report started
+
+    @property
+    def mode(self):
+        """The mode in effect ('auto' resolves from the live journal mode)"""
+        if self.requested_mode != 'auto':
+            return self.requested_mode
+        journal_mode = self.db_manager.get_pool_stats().get('journal_mode') or ''
+        return 'wal' if journal_mode.lower() == 'wal' else 'copy'
+
+    @contextmanager
+    def connection(self):
+        """Yield a read-only connection holding one consistent view of the data"""
+        mode = self.mode
+
+        if mode == 'live':
+            self._last_read_at = datetime.now()
+            yield self.db_manager._get_connection()
+            return
+
+        if mode == 'wal':
+            conn = self._open_read_only(self.db_manager.db_path, self.db_manager.archive_path)
+            try:
+                # The first read pins the snapshot for the rest of the transaction
+                conn.execute("BEGIN")
+                self._last_read_at = datetime.now()
+                yield conn
+            finally:
+                conn.rollback()
+                conn.close()
+            return
+
+        with self._lock:
+            if self._is_stale():
+                self._refresh_copy()
+            conn = self._open_read_only(self.snapshot_path, self.archive_snapshot_path)
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+    def refresh(self):
+        """Take a fresh copy now (copy mode only)"""
+        if self.mode != 'copy':
+            return
+        with self._lock:
+            self._refresh_copy()
+
+    def info(self):
+        """
+        Describe the data reports are reading.
+
+        Returns:
+            dict: mode, taken_at (datetime or None) and age in seconds (None if no snapshot yet)
+        """
+        taken_at = self._taken_at if self.mode == 'copy' else self._last_read_at
+        age = (datetime.now() - taken_at).total_seconds() if taken_at else None
+        return {'mode': self.mode, 'taken_at': taken_at, 'age': age}
+
+    def _is_stale(self):
+        if self._taken_at is None or not os.path.exists(self.snapshot_path):
+            return True
+        return (datetime.now() - self._taken_at).total_seconds() >= self.max_age
+
+    def _refresh_copy(self):
+        """Copy the live and archive databases in one backup step each"""
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        source = self.db_manager._get_connection()
+        if source.in_transaction:
+            source.commit()
+
+        targets = [('main', self.snapshot_path)]
+        if archive.is_attached(source):
+            targets.append((archive.ARCHIVE_SCHEMA, self.archive_snapshot_path))
+
+        taken_at = datetime.now()
+        for name, path in targets:
+            target = sqlite3.connect(path)
+            try:
+                # pages=-1 copies everything under a single short read lock
+                source.backup(target, pages=-1, name=name)
+                # The copy is only ever read, so it needs no WAL or -shm file
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+        self._taken_at = taken_at
+
+    @staticmethod
+    def _open_read_only(path, archive_path):
+        """Open a read-only connection with the archive attached read-only, if present"""
+        conn = sqlite3.connect(_read_only_uri(path), uri=True, check_same_thread=False,
+                               factory=InstrumentedConnection)
+        if os.path.exists(archive_path):
+            try:
+                conn.execute(
+                    f"ATTACH DATABASE ? AS {archive.ARCHIVE_SCHEMA}",
+                    (_read_only_uri(archive_path),)
+                )
+            except sqlite3.Error as e:
+                print(f"Error attaching archive to report connection: {str(e)}")
+        return conn
+
+
+def describe_snapshot(info):
+    """Short text for the UI saying how current report data is, e.g. "Snapshot 14:02 (3 min old)\""""
+    if info['mode'] == 'live':
+        return "Live data"
+    if info['taken_at'] is None:
+        return "No snapshot yet"
+
+    taken = info['taken_at'].strftime("%H:%M:%S")
+    if info['mode'] == 'wal':
+        return f"Consistent as of {taken}"
+
+    minutes = int(info['age'] // 60)
+    age = "just now" if minutes < 1 else f"{minutes} min old"
+    return f"Snapshot {taken} ({age})"
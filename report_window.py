@@ -3,6 +3,9 @@ from tkinter import messagebox, ttk, filedialog
 import customtkinter as ctk
 import pandas as pd
 
+from money import Money
+from report_snapshot import describe_snapshot
+
 
 class ReportsWindow(ctk.CTkToplevel):
     def __init__(self, parent, user_system):
@@ -74,6 +77,10 @@ class ReportsWindow(ctk.CTkToplevel):
             width=120
         ).pack(side="left", padx=5)
 
+        # How current the report data is (reports read a snapshot, not the live file)
+        self.snapshot_label = ctk.CTkLabel(btn_frame, text="", text_color="gray")
+        self.snapshot_label.pack(side="left", padx=10)
+
         # Close button
         ctk.CTkButton(
             btn_frame,
@@ -365,6 +372,7 @@ class ReportsWindow(ctk.CTkToplevel):
         try:
             # Get data from system
             df = self.user_system.get_payment_compliance_report()
+            self._show_snapshot_age()
 
             if df.empty:
                 return
@@ -395,7 +403,7 @@ class ReportsWindow(ctk.CTkToplevel):
                     values=(
                         loan_id,
                         customer,
-                        f"KES {float(daily_payment):,.2f}",
+                        f"KES {Money(daily_payment):,.2f}",
                         paid_today,
                         last_payment,
                         status
@@ -415,6 +423,7 @@ class ReportsWindow(ctk.CTkToplevel):
         try:
             # Get data from system
             df = self.user_system.generate_payments_summary_report()
+            self._show_snapshot_age()
 
             if df.empty:
                 return
@@ -443,9 +452,9 @@ class ReportsWindow(ctk.CTkToplevel):
                     values=(
                         loan_id,
                         customer,
-                        f"KES {float(loan_amount):,.2f}",
-                        f"KES {float(total_paid):,.2f}",
-                        f"KES {float(remaining):,.2f}",
+                        f"KES {Money(loan_amount):,.2f}",
+                        f"KES {Money(total_paid):,.2f}",
+                        f"KES {Money(remaining):,.2f}",
                         status,
                         f"{completion:.1f}%"
                     ),
@@ -519,9 +528,14 @@ class ReportsWindow(ctk.CTkToplevel):
             # Set item visibility
             self.compliance_tree.item(item, open=visible)
 
+    def _show_snapshot_age(self):
+        """Show how current the report snapshot is"""
+        self.snapshot_label.configure(text=describe_snapshot(self.user_system.get_report_snapshot_info()))
+
     def _refresh_compliance(self):
         """Refresh compliance tab data"""
         try:
+            self.user_system.refresh_report_snapshot()
             self._load_compliance_data()
             self._last_refresh['compliance'] = datetime.now()
             messagebox.showinfo("Success", "Compliance data refreshed")
@@ -531,6 +545,7 @@ class ReportsWindow(ctk.CTkToplevel):
     def _refresh_summary(self):
         """Refresh summary tab data"""
         try:
+            self.user_system.refresh_report_snapshot()
             self._load_summary_data()
             self._last_refresh['summary'] = datetime.now()
             messagebox.showinfo("Success", "Summary data refreshed")
@@ -0,0 +1,159 @@
+import re
+import sqlite3
+
+
+SEARCH_TABLE = 'customer_search'
+
+# Loans are indexed under rowid = loan_id and customers under
+# rowid = -customer_id, so every source row maps to exactly one index row.
+_SOURCES = {
+    'loans': ('loan', 'loan_id', 'new.loan_id', 'old.loan_id'),
+    'customers': ('customer', 'customer_id', '-new.customer_id', '-old.customer_id'),
+}
+
+# Tables indexed by earlier schema versions, whose triggers may still exist
+_LEGACY_SOURCES = ('loan_cycles',)
+
+
+def search_index_exists(cursor):
+    """Check whether the full-text index table is present"""
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (SEARCH_TABLE,)
+    )
+    return cursor.fetchone() is not None
+
+
+def fts5_available(cursor):
+    """Check whether this SQLite build includes the FTS5 extension"""
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    return bool(cursor.fetchone()[0])
+
+
+def _present_sources(cursor):
+    """Source tables that exist yet (older schema versions lack customers)"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row[0] for row in cursor.fetchall()}
+    return {table: spec for table, spec in _SOURCES.items() if table in tables}
+
+
+def _drop_triggers(cursor):
+    for table in (*_SOURCES, *_LEGACY_SOURCES):
+        for event in ('insert', 'update', 'delete'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_search_{table}_{event}")
+
+
+def _create_triggers(cursor):
+    """Keep the index in step with loans and customers"""
+    for table, (source, key, new_rowid, old_rowid) in _present_sources(cursor).items():
+        insert_row = f"""
+            INSERT INTO {SEARCH_TABLE} (rowid, customer_name, phone_number, national_id, source, ref_id)
+            VALUES ({new_rowid}, new.customer_name, new.phone_number, new.national_id, '{source}', new.{key});
+        """
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_search_{table}_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                {insert_row}
+            END
+        """)
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_search_{table}_update
+            AFTER UPDATE OF customer_name, phone_number, national_id ON {table}
+            BEGIN
+                DELETE FROM {SEARCH_TABLE} WHERE rowid = {old_rowid};
+                {insert_row}
+            END
+        """)
+
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_search_{table}_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM {SEARCH_TABLE} WHERE rowid = {old_rowid};
+            END
+        """)
+
+
+def rebuild_search_index(cursor):
+    """Drop and rebuild the full-text index and its triggers from the source tables"""
+    _drop_triggers(cursor)
+    cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    # prefix='2 3 4' keeps short prefix queries on their own index b-trees
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+            customer_name, phone_number, national_id,
+            source UNINDEXED, ref_id UNINDEXED,
+            tokenize = 'unicode61', prefix = '2 3 4'
+        )
+    """)
+
+    for table, (source, key, _, _) in _present_sources(cursor).items():
+        rowid = key if source == 'loan' else f"-{key}"
+        cursor.execute(f"""
+            INSERT INTO {SEARCH_TABLE} (rowid, customer_name, phone_number, national_id, source, ref_id)
+            SELECT {rowid}, customer_name, phone_number, national_id, '{source}', {key}
+            FROM {table}
+        """)
+
+    _create_triggers(cursor)
+
+
+def ensure_search_index(cursor):
+    """
+    Make sure the full-text index exists, rebuilding it if it went missing.
+
+    Returns:
+        bool: True if full-text search is usable, False if FTS5 is unavailable
+    """
+    if search_index_exists(cursor):
+        return True
+
+    if not fts5_available(cursor):
+        # Triggers would fail every write against a missing table
+        _drop_triggers(cursor)
+        return False
+
+    rebuild_search_index(cursor)
+    return True
+
+
+def build_match_query(term):
+    """
+    Turn free text into an FTS5 prefix query.
+
+    Every word must match the start of a token in the name, phone number or
+    national ID, e.g. "mary 0712" becomes '"mary"* "0712"*'.
+    """
+    tokens = re.findall(r"\w+", term or "")
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search(cursor, term, limit=20):
+    """
+    Run a ranked prefix search.
+
+    Returns:
+        list: (source, ref_id, customer_name, phone_number, national_id, rank) rows,
+              best match first
+    """
+    match = build_match_query(term)
+    if not match:
+        return []
+
+    cursor.execute(f"""
+        SELECT source, ref_id, customer_name, phone_number, national_id, rank
+        FROM {SEARCH_TABLE}
+        WHERE {SEARCH_TABLE} MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    """, (match, limit))
+    return cursor.fetchall()
+
+
+def is_missing_index_error(error):
+    """Check whether an error means the index table is gone"""
+    return isinstance(error, sqlite3.OperationalError) and SEARCH_TABLE in str(error)
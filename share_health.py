@@ -0,0 +1,225 @@
+import os
+import time
+import uuid
+import threading
+import configparser
+from datetime import datetime
+
+
+def load_share_health_config(config_path='config.ini'):
+    """Load share probe settings from the [Network] section of config.ini"""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    return {
+        'timeout': config.getfloat('Network', 'probe_timeout', fallback=3.0),
+        'ttl': config.getfloat('Network', 'health_ttl', fallback=30.0),
+        'retry_interval': config.getfloat('Network', 'retry_interval', fallback=5.0),
+        'probe_bytes': config.getint('Network', 'probe_bytes', fallback=65536),
+        'startup_wait': config.getfloat('Network', 'startup_wait', fallback=1.0),
+    }
+
+
+class ShareHealthMonitor:
+    """
+    Cached, non-blocking health of the network share.
+
+    Probes run on a background thread: each one writes a test file of
+    `probe_bytes` to the share, reads it back and removes it, timing the
+    round trip. A probe that has not finished after `timeout` seconds counts
+    as a failure, so a hung UNC path never holds up the caller. Results are
+    cached for `ttl` seconds after a success and `retry_interval` seconds
+    after a failure; asking for a stale result starts a new probe and
+    returns the last known one meanwhile.
+
+    Args:
+        path (str): Directory on the share to probe
+        timeout (float): Seconds before a probe counts as failed
+        ttl (float): Seconds a successful result stays fresh
+        retry_interval (float): Seconds a failed result stays fresh
+        probe_bytes (int): Size of the test file used to measure throughput
+        startup_wait (float): Longest wait_for_first_probe() waits by default
+    """
+
+    def __init__(self, path, timeout=3.0, ttl=30.0, retry_interval=5.0, probe_bytes=65536, startup_wait=1.0):
+        self.path = path
+        self.timeout = timeout
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.probe_bytes = probe_bytes
+        self.startup_wait = startup_wait
+
+        self._lock = threading.Lock()
+        self._probed = threading.Event()
+        self._listeners = []
+        self._probe_thread = None  # The probe in flight, if any
+
+        # Guarded by _lock
+        self._available = None  # None until the first probe finishes
+        self._checked_at = None  # monotonic time of the last result
+        self._last_checked = None
+        self._last_success = None
+        self._last_error = None
+        self._latency_ms = None
+        self._write_mbps = None
+        self._read_mbps = None
+        self._probes = 0
+        self._timeouts = 0
+
+    def add_listener(self, callback):
+        """Call callback(available) from the probe thread whenever availability changes"""
+        self._listeners.append(callback)
+
+    def is_available(self):
+        """
+        Last known availability, without waiting.
+
+        Starts a probe if the result is stale. Returns False until the
+        first probe has finished.
+        """
+        self.refresh()
+        with self._lock:
+            return bool(self._available)
+
+    def refresh(self, force=False):
+        """Start a probe if the cached result is stale (or force is set) and none is running"""
+        with self._lock:
+            if self._probe_thread is not None:
+                return
+            if not force and self._checked_at is not None:
+                fresh_for = self.ttl if self._available else self.retry_interval
+                if time.monotonic() - self._checked_at < fresh_for:
+                    return
+            self._probe_thread = threading.Thread(target=self._probe, name="share-probe", daemon=True)
+        self._probe_thread.start()
+
+    def wait_for_first_probe(self, timeout=None):
+        """
+        Wait (at most `startup_wait` seconds by default) for the first probe.
+
+        Returns:
+            bool: True if the share answered within the wait
+        """
+        self.refresh()
+        self._probed.wait(self.startup_wait if timeout is None else timeout)
+        with self._lock:
+            return bool(self._available)
+
+    def status(self):
+        """
+        Describe the share's health.
+
+        Returns:
+            dict: available (None if not probed yet), last_checked and
+                  last_success (datetimes or None), last_error, latency_ms,
+                  write_mbps and read_mbps of the last successful probe,
+                  probes and timeouts (counts)
+        """
+        with self._lock:
+            return {
+                'path': self.path,
+                'available': self._available,
+                'last_checked': self._last_checked,
+                'last_success': self._last_success,
+                'last_error': self._last_error,
+                'latency_ms': self._latency_ms,
+                'write_mbps': self._write_mbps,
+                'read_mbps': self._read_mbps,
+                'probes': self._probes,
+                'timeouts': self._timeouts,
+            }
+
+    def _probe(self):
+        result = {}
+        worker = threading.Thread(target=self._measure, args=(result,), name="share-probe-io", daemon=True)
+        worker.start()
+        worker.join(self.timeout)
+
+        if worker.is_alive():
+            # The share is hanging; leave the worker to finish on its own and report a failure now
+            error = f"No answer from {self.path} within {self.timeout:g}s"
+            with self._lock:
+                self._timeouts += 1
+            self._record(False, error)
+            # Don't start another probe until the hung one has returned
+            worker.join()
+            with self._lock:
+                self._probe_thread = None
+            return
+
+        self._record(result.get('ok', False), result.get('error'), result)
+        with self._lock:
+            self._probe_thread = None
+
+    def _measure(self, result):
+        """Write, read back and remove a test file, timing each step"""
+        payload = os.urandom(self.probe_bytes)
+        test_file = os.path.join(self.path, f"connection_test_{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            started = time.perf_counter()
+            os.stat(self.path)
+            result['latency_ms'] = (time.perf_counter() - started) * 1000.0
+
+            started = time.perf_counter()
+            with open(test_file, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            write_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            with open(test_file, 'rb') as f:
+                data = f.read()
+            read_seconds = time.perf_counter() - started
+
+            if data != payload:
+                raise OSError("Test file read back differently")
+
+            megabytes = self.probe_bytes / 1048576.0
+            result['write_mbps'] = megabytes / write_seconds if write_seconds > 0 else None
+            result['read_mbps'] = megabytes / read_seconds if read_seconds > 0 else None
+            result['ok'] = True
+        except OSError as e:
+            result['error'] = str(e)
+        finally:
+            try:
+                os.remove(test_file)
+            except OSError:
+                pass
+
+    def _record(self, available, error, measurements=None):
+        with self._lock:
+            changed = self._available is not None and self._available != available
+            first = self._available is None
+            self._available = available
+            self._checked_at = time.monotonic()
+            self._last_checked = datetime.now()
+            self._probes += 1
+            self._last_error = error
+            if available:
+                self._last_success = self._last_checked
+                self._latency_ms = round(measurements['latency_ms'], 2)
+                self._write_mbps = round(measurements['write_mbps'], 2) if measurements['write_mbps'] else None
+                self._read_mbps = round(measurements['read_mbps'], 2) if measurements['read_mbps'] else None
+        self._probed.set()
+
+        if changed or (first and available):
+            for callback in list(self._listeners):
+                try:
+                    callback(available)
+                except Exception as e:
+                    print(f"Error in share health listener: {str(e)}")
+
+
+def describe_share_health(status):
+    """One line for the Diagnostics window, e.g. "reachable, 4.2 ms, write 12.5 MB/s, read 40.1 MB/s" """
+    if status['available'] is None:
+        return "not probed yet"
+    if not status['available']:
+        return f"unreachable ({status['last_error']})"
+    parts = ["reachable", f"{status['latency_ms']:g} ms"]
+    if status['write_mbps']:
+        parts.append(f"write {status['write_mbps']:g} MB/s")
+    if status['read_mbps']:
+        parts.append(f"read {status['read_mbps']:g} MB/s")
+    return ", ".join(parts)
@@ -0,0 +1,352 @@
+import os
+import re
+import sys
+import time
+import bisect
+import sqlite3
+import logging
+import threading
+import configparser
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+from db_pool import PooledConnection
+
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Statements are attributed to the innermost frame of one of these classes
+API_CLASSES = ('SQLiteUserSystem', 'EndOfDayEngine', 'ReportSnapshot', 'DatabaseManager')
+
+# Frames from these modules are the plumbing between a caller and SQLite
+_PLUMBING_MODULES = ('sql_metrics.py', 'db_pool.py', 'contextlib.py')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def load_metrics_config(config_path='config.ini'):
+    """Load slow-query log settings from the [Logging] section of config.ini"""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    return {
+        'level': config.get('Logging', 'level', fallback='INFO').upper(),
+        'max_size': config.getint('Logging', 'max_size', fallback=1048576),
+        'backup_count': config.getint('Logging', 'backup_count', fallback=3),
+        'slow_query_ms': config.getfloat('Logging', 'slow_query_ms', fallback=250),
+        'slow_query_file': config.get('Logging', 'slow_query_file', fallback='slow_queries.log'),
+    }
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """
+    Reduce a statement to its shape, so executions differing only in values group together.
+
+    Literals become ?, lists of placeholders become (...), and whitespace is collapsed.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+@lru_cache(maxsize=256)
+def _is_plumbing(filename):
+    return os.path.basename(filename) in _PLUMBING_MODULES
+
+
+def calling_method():
+    """
+    Name the method responsible for the statement being run.
+
+    Prefers the innermost method of an API class (e.g. "SQLiteUserSystem.add_payment"),
+    so work done by helper modules is charged to the call that asked for it.
+    """
+    frame = sys._getframe(1)
+    caller = None
+    while frame is not None:
+        code = frame.f_code
+        if not _is_plumbing(code.co_filename):
+            name = getattr(code, 'co_qualname', code.co_name)
+            if caller is None:
+                caller = name
+            if name.split('.', 1)[0] in API_CLASSES:
+                return name
+        frame = frame.f_back
+    return caller or '<unknown>'
+
+
+class LatencyHistogram:
+    """Counts of durations per bucket, plus count, total and max"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+
+    def add(self, ms, rows=0):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.rows += max(0, rows)
+
+    def percentile(self, fraction):
+        """
+        Estimated duration (ms) under which the given fraction of calls fell.
+
+        Interpolates linearly within the bucket holding that call, and never
+        reports more than the slowest call seen.
+        """
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            if count and seen + count >= target:
+                lower = float(BUCKET_BOUNDS_MS[index - 1]) if index else 0.0
+                upper = float(BUCKET_BOUNDS_MS[index]) if index < len(BUCKET_BOUNDS_MS) else self.max_ms
+                upper = min(upper, self.max_ms)
+                lower = min(lower, upper)
+                return round(lower + (upper - lower) * max(0.0, target - seen) / count, 3)
+            seen += count
+        return round(self.max_ms, 3)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+            'buckets': list(self.buckets),
+        }
+
+
+class SqlMetrics:
+    """
+    In-memory statement timings, per calling method and per statement shape.
+
+    Statements slower than slow_query_ms are also written to the slow-query log.
+    """
+
+    def __init__(self, slow_query_ms=250):
+        self.slow_query_ms = slow_query_ms
+        self.slow_log = logging.getLogger('kodongo.slow_sql')
+        self._lock = threading.Lock()
+        self._by_method = {}
+        self._by_statement = {}
+        self._started = time.time()
+
+    def configure(self, log_dir, level='INFO', max_size=1048576, backup_count=3,
+                  slow_query_ms=250, slow_query_file='slow_queries.log'):
+        """Point the slow-query log at a rotating file in log_dir"""
+        self.slow_query_ms = slow_query_ms
+
+        os.makedirs(log_dir, exist_ok=True)
+        for handler in list(self.slow_log.handlers):
+            self.slow_log.removeHandler(handler)
+            handler.close()
+
+        handler = RotatingFileHandler(
+            os.path.join(log_dir, slow_query_file),
+            maxBytes=max_size,
+            backupCount=backup_count,
+            encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        self.slow_log.addHandler(handler)
+        self.slow_log.setLevel(getattr(logging, level, logging.INFO))
+        self.slow_log.propagate = False
+
+    def record(self, sql, method, seconds, rows):
+        """Record one finished statement"""
+        ms = seconds * 1000.0
+        shape = normalize_sql(sql)
+
+        with self._lock:
+            self._by_method.setdefault(method, LatencyHistogram()).add(ms, rows)
+            self._by_statement.setdefault(shape, LatencyHistogram()).add(ms, rows)
+
+        if ms >= self.slow_query_ms:
+            self.slow_log.warning("%.1f ms | %s | rows=%d | %s", ms, method, rows, shape)
+
+    def snapshot(self):
+        """
+        Get the current statistics.
+
+        Returns:
+            dict: 'methods' and 'statements', each mapping a name to its summary
+                  (count, total/avg/p50/p95/max ms, rows, bucket counts), plus
+                  'since' (epoch seconds) and 'bucket_bounds_ms'
+        """
+        with self._lock:
+            return {
+                'since': self._started,
+                'bucket_bounds_ms': BUCKET_BOUNDS_MS,
+                'methods': {name: hist.summary() for name, hist in self._by_method.items()},
+                'statements': {name: hist.summary() for name, hist in self._by_statement.items()},
+            }
+
+    def reset(self):
+        """Forget all statistics collected so far"""
+        with self._lock:
+            self._by_method.clear()
+            self._by_statement.clear()
+            self._started = time.time()
+
+    def format_report(self, limit=20):
+        """Plain-text table of the slowest methods and statements by total time"""
+        stats = self.snapshot()
+        lines = [
+            f"SQL statistics since {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stats['since']))}",
+            f"Slow-query threshold: {self.slow_query_ms:g} ms",
+            "",
+        ]
+
+        for title, key in (("Methods", 'methods'), ("Statements", 'statements')):
+            ranked = sorted(stats[key].items(), key=lambda item: item[1]['total_ms'], reverse=True)
+            lines.append(f"{title} (by total time)")
+            lines.append(f"{'calls':>7} {'total ms':>10} {'avg':>8} {'p50':>7} {'p95':>7} {'max':>8} {'rows':>8}  name")
+            for name, s in ranked[:limit]:
+                if key == 'statements' and len(name) > 120:
+                    name = name[:117] + '...'
+                lines.append(
+                    f"{s['count']:>7} {s['total_ms']:>10.1f} {s['avg_ms']:>8.2f} {s['p50_ms']:>7g} "
+                    f"{s['p95_ms']:>7g} {s['max_ms']:>8.1f} {s['rows']:>8}  {name}"
+                )
+            lines.append("")
+
+        return "\n".join(lines)
+
+
+# Shared by every instrumented connection in the process
+metrics = SqlMetrics()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    A cursor that times each statement, including the time spent fetching its rows.
+
+    A statement is recorded when its rows are exhausted, when the cursor runs
+    the next statement, or when the cursor is closed or discarded.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._statement = None
+
+    def execute(self, sql, parameters=()):
+        self._finish_statement()
+        method = calling_method()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._statement = [sql, method, time.perf_counter() - started, 0]
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish_statement()
+        method = calling_method()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._statement = [sql, method, time.perf_counter() - started, 0]
+            self._finish_statement()
+
+    def executescript(self, sql_script):
+        self._finish_statement()
+        method = calling_method()
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._statement = [sql_script, method, time.perf_counter() - started, 0]
+            self._finish_statement()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add_fetch(time.perf_counter() - started, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add_fetch(time.perf_counter() - started, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add_fetch(time.perf_counter() - started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add_fetch(time.perf_counter() - started, 0, True)
+            raise
+        self._add_fetch(time.perf_counter() - started, 1, False)
+        return row
+
+    def close(self):
+        self._finish_statement()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish_statement()
+        except Exception:
+            # Interpreter shutdown or a closed connection - the timing is not worth an error
+            pass
+
+    def _add_fetch(self, seconds, rows, exhausted):
+        statement = self._statement
+        if statement is None:
+            return
+        statement[2] += seconds
+        statement[3] += rows
+        if exhausted:
+            self._finish_statement()
+
+    def _finish_statement(self):
+        statement = getattr(self, '_statement', None)
+        if statement is None:
+            return
+        self._statement = None
+
+        sql, method, seconds, rows = statement
+        if rows == 0 and self.rowcount > 0:
+            # INSERT/UPDATE/DELETE report the rows they changed
+            rows = self.rowcount
+        metrics.record(sql, method, seconds, rows)
+
+
+class InstrumentedConnection(PooledConnection):
+    """A connection whose cursors (including the execute() shortcuts) are instrumented"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
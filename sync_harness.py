@@ -0,0 +1,220 @@
+"""
+Two-database end-to-end check of delta_sync.DeltaSync.
+
+Builds a hub and a replica in two temporary directories, seeds the replica,
+then edits both sides concurrently: a payment on the same loan from each
+side, a new loan on each side under the same id, the same new customer
+added on both sides, and a column both sides set to different values. One
+sync must merge the balances so both payments count, give the replica's
+new rows the ids the hub chose, record the one real conflict in
+sync_conflicts, and leave both databases with the same rows and ledgers
+that add up.
+
+    python sync_harness.py
+    python sync_harness.py --dir /mnt/share   # hub on the share
+    python sync_harness.py --keep             # leave the databases for inspection
+"""
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import argparse
+import tempfile
+
+import ledger
+import customers
+from migrations import migrate
+from delta_sync import DeltaSync
+
+_LOAN_SQL = """
+    INSERT INTO loans (
+        customer_name, amount, payment_per_day, term_months, start_date, end_date,
+        total_to_repay, status, created_by, remaining_balance, customer_id
+    ) VALUES (?, ?, ?, 1, ?, ?, ?, 'Active', ?, ?, ?)
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _add_customer(conn, name, national_id):
+    return customers.resolve_or_create_customer(conn.cursor(), name, national_id, f"07{national_id}000")
+
+
+def _add_loan(conn, customer_id, name, amount, created_by, start_date='2026-09-01'):
+    total = amount * 3 // 2
+    cursor = conn.execute(
+        _LOAN_SQL,
+        (name, amount, amount // 20, start_date, '2026-10-01', total, created_by, total, customer_id)
+    )
+    return cursor.lastrowid
+
+
+def _add_payment(conn, loan_id, date, amount, received_by):
+    """Insert the payment before lowering the balance, as the app does"""
+    conn.execute(
+        "INSERT INTO payments (loan_id, date, amount, received_by) VALUES (?, ?, ?, ?)",
+        (loan_id, date, amount, received_by)
+    )
+    conn.execute(
+        "UPDATE loans SET remaining_balance = remaining_balance - ? WHERE loan_id = ?",
+        (amount, loan_id)
+    )
+
+
+def _rows(conn, sql, params=()):
+    return [tuple(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def run_harness(directory=None):
+    """
+    Run the scenario and check the outcome.
+
+    Args:
+        directory (str): Where to put the hub (default a temporary directory);
+            the replica always goes in a local temporary directory
+
+    Returns:
+        dict: the two directories, the sync stats, every check as
+              (passed, detail) and the failures (name: detail)
+    """
+    hub_dir = os.path.join(directory, 'syncharness_hub') if directory else tempfile.mkdtemp(prefix='syncharness_hub_')
+    replica_dir = tempfile.mkdtemp(prefix='syncharness_replica_')
+    os.makedirs(hub_dir, exist_ok=True)
+    hub_path = os.path.join(hub_dir, 'kodongo_loans.db')
+    replica_path = os.path.join(replica_dir, 'kodongo_loans.db')
+    if os.path.exists(hub_path):
+        raise FileExistsError(f"{hub_path} is left from an earlier run; remove it first")
+
+    # Hub with one customer and two loans, copied to the replica by the first sync
+    hub = _connect(hub_path)
+    migrate(hub)
+    ann = _add_customer(hub, 'Ann Wanjiru', '1001')
+    shared_loan = _add_loan(hub, ann, 'Ann Wanjiru', 100000, 'hub')
+    edited_loan = _add_loan(hub, ann, 'Ann Wanjiru', 40000, 'hub')
+    hub.commit()
+
+    sync = DeltaSync(hub_path, replica_path)
+    seeded = sync.sync()
+
+    replica = _connect(replica_path)
+
+    # Concurrent edits, hub first (nothing is pulled until the sync)
+    _add_payment(hub, shared_loan, '2026-09-05', 2000, 'hub')
+    grace_on_hub = _add_customer(hub, 'Grace Atieno', '2002')
+    hub_loan = _add_loan(hub, grace_on_hub, 'Grace Atieno', 30000, 'hub')
+    hub.execute("UPDATE loans SET payment_per_day = 2500 WHERE loan_id = ?", (edited_loan,))
+    hub.commit()
+
+    _add_payment(replica, shared_loan, '2026-09-06', 3000, 'replica')
+    grace_on_replica = _add_customer(replica, 'Grace Atieno', '2002')
+    replica_loan = _add_loan(replica, grace_on_replica, 'Grace Atieno', 50000, 'replica')
+    replica.execute("UPDATE loans SET payment_per_day = 3000 WHERE loan_id = ?", (edited_loan,))
+    replica.commit()
+
+    cursor = replica.execute("SELECT MAX(payment_id) FROM payments")
+    replica_payment = cursor.fetchone()[0]
+
+    stats = sync.sync()
+
+    checks = {}
+
+    def check(name, passed, detail):
+        checks[name] = (bool(passed), detail)
+
+    check('seeded', seeded['mode'] == 'seed', seeded['mode'])
+    check('delta mode', stats['mode'] == 'delta', stats['mode'])
+    check('same new ids on both sides', hub_loan == replica_loan, (hub_loan, replica_loan))
+
+    # Balances: both payments count on both sides
+    expected_balance = 150000 - 2000 - 3000
+    for label, conn in (('hub', hub), ('replica', replica)):
+        balance = conn.execute(
+            "SELECT remaining_balance FROM loans WHERE loan_id = ?", (shared_loan,)
+        ).fetchone()[0]
+        check(f'{label} merged balance', balance == expected_balance, balance)
+        payments = _rows(conn, "SELECT amount, received_by FROM payments WHERE loan_id = ? ORDER BY amount",
+                         (shared_loan,))
+        check(f'{label} both payments', payments == [(2000, 'hub'), (3000, 'replica')], payments)
+        drift = ledger.verify_ledger(conn.cursor())
+        check(f'{label} ledger adds up', not drift, drift)
+        between = ledger.balance_at(conn.cursor(), shared_loan, '2026-09-05')
+        check(f'{label} balance on a payment day', between == 148000, between)
+
+    # Re-keying: the replica's new loan and payment moved above the hub's ids
+    replica_loan_now = replica.execute(
+        "SELECT loan_id FROM loans WHERE created_by = 'replica'"
+    ).fetchone()
+    check('replica loan re-keyed', replica_loan_now is not None and replica_loan_now[0] > hub_loan,
+          replica_loan_now and replica_loan_now[0])
+    payment_ids = _rows(replica, "SELECT payment_id FROM payments WHERE received_by = 'replica'")
+    check('replica payment id kept or re-keyed above', len(payment_ids) == 1 and payment_ids[0][0] >= replica_payment,
+          payment_ids)
+    check('remapped rows reported', stats['remapped'] >= 2, stats['remapped'])
+
+    # The customer added on both sides is one customer, with both loans counted
+    for label, conn in (('hub', hub), ('replica', replica)):
+        found = _rows(conn, "SELECT customer_id, loan_cycles FROM customers WHERE national_id = '2002'")
+        check(f'{label} customer merged', len(found) == 1 and found[0][1] == 2, found)
+
+    # Same rows on both sides
+    for table, key in (('customers', 'customer_id'), ('loans', 'loan_id'), ('payments', 'payment_id')):
+        hub_rows = _rows(hub, f"SELECT * FROM {table} ORDER BY {key}")
+        replica_rows = _rows(replica, f"SELECT * FROM {table} ORDER BY {key}")
+        check(f'{table} identical', hub_rows == replica_rows, f"hub {len(hub_rows)} / replica {len(replica_rows)} rows")
+
+    # The one real conflict: payment_per_day set on both sides, the hub's value kept
+    conflicts = _rows(hub, "SELECT table_name, row_id, kind, kept, discarded FROM sync_conflicts")
+    check('one conflict reported', stats['conflicts'] == 1, stats['conflicts'])
+    expected = [('loans', edited_loan, 'update_update',
+                 json.dumps({'payment_per_day': 2500}), json.dumps({'payment_per_day': 3000}))]
+    normalised = [
+        (table, row_id, kind, json.dumps(json.loads(kept)), json.dumps(json.loads(discarded)))
+        for table, row_id, kind, kept, discarded in conflicts
+    ]
+    check('conflict recorded in sync_conflicts', normalised == expected, conflicts)
+    per_day = _rows(replica, "SELECT payment_per_day FROM loans WHERE loan_id = ?", (edited_loan,))
+    check('hub value kept on the replica', per_day == [(2500,)], per_day)
+
+    # Nothing left to exchange
+    again = sync.sync()
+    check('second sync pushes nothing', again['pushed'] == 0 and again['conflicts'] == 0, again)
+
+    hub.close()
+    replica.close()
+
+    return {
+        'directories': (hub_dir, replica_dir),
+        'stats': stats,
+        'checks': checks,
+        'failures': {name: detail for name, (passed, detail) in checks.items() if not passed},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Two-database DeltaSync merge, re-key and conflict check")
+    parser.add_argument('--dir', help="Directory for the hub database, e.g. on the network share")
+    parser.add_argument('--keep', action='store_true', help="Keep the databases after the run")
+    args = parser.parse_args(argv)
+
+    result = run_harness(args.dir)
+    for key, value in result['stats'].items():
+        print(f"{key:>15}: {value}")
+    for name, (passed, detail) in result['checks'].items():
+        print(f"{'ok' if passed else 'FAIL':>4}  {name}" + ("" if passed else f": {detail}"))
+
+    if args.keep:
+        print(f"Databases kept in {result['directories'][0]} and {result['directories'][1]}")
+    else:
+        for directory in result['directories']:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return 0 if not result['failures'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
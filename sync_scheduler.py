@@ -0,0 +1,257 @@
+import time
+import threading
+import configparser
+from datetime import datetime
+
+
+def load_sync_config(config_path='config.ini'):
+    """Load sync scheduler settings from the [Sync] section of config.ini"""
+    config = configparser.ConfigParser()
+    config.read(config_path)
+
+    return {
+        'debounce': config.getfloat('Sync', 'debounce', fallback=2.0),
+        'max_interval': config.getfloat('Sync', 'max_interval', fallback=300.0),
+        'probe_interval': config.getfloat('Sync', 'probe_interval', fallback=15.0),
+        'retry_delay': config.getfloat('Sync', 'retry_delay', fallback=5.0),
+        'max_backoff': config.getfloat('Sync', 'max_backoff', fallback=600.0),
+    }
+
+
+class SyncScheduler:
+    """
+    Run syncs on a background thread when there is a reason to.
+
+    A sync runs when local commits have settled (notify_change() was called
+    and nothing else was committed for `debounce` seconds), when the share
+    comes back after being unreachable, when sync_now() is called, or every
+    `max_interval` seconds to pick up other clients' changes. Reachability
+    is probed every `probe_interval` seconds. After a failure the next
+    attempt waits `retry_delay` seconds, doubling with each further failure
+    up to `max_backoff`.
+
+    Args:
+        sync (callable): Runs one sync and returns its stats dict
+        is_reachable (callable): True if the share can be reached
+        pending (callable): Number of local operations not yet synced
+        debounce (float): Quiet seconds after a commit before syncing
+        max_interval (float): Longest time between syncs while reachable
+        probe_interval (float): Seconds between reachability checks
+        retry_delay (float): First delay after a failed sync
+        max_backoff (float): Longest delay between retries
+    """
+
+    def __init__(self, sync, is_reachable, pending=None, debounce=2.0, max_interval=300.0,
+                 probe_interval=15.0, retry_delay=5.0, max_backoff=600.0):
+        self._sync = sync
+        self._is_reachable = is_reachable
+        self._pending = pending
+        self.debounce = debounce
+        self.max_interval = max_interval
+        self.probe_interval = probe_interval
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        # Guarded by _cond
+        self._changes = 0  # Commits notified so far
+        self._synced_changes = 0  # Commits covered by the last successful sync
+        self._last_change = None  # monotonic time of the latest commit
+        self._forced = False
+
+        self._reachable = None
+        self._next_probe = 0.0
+        self._next_periodic = 0.0
+        self._retry_at = 0.0
+        self._failures = 0
+
+        self._state = 'starting'
+        self._last_success = None
+        self._last_attempt = None
+        self._last_error = None
+        self._last_stats = None
+
+    def start(self):
+        """Start the scheduler thread (once)"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="sync-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """
+        Stop the scheduler, letting a sync in progress finish.
+
+        Returns:
+            bool: True if the thread ended within the timeout
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is None:
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def notify_change(self):
+        """Record a local commit; a sync follows once commits settle"""
+        with self._cond:
+            self._changes += 1
+            self._last_change = time.monotonic()
+            self._cond.notify_all()
+
+    def sync_now(self):
+        """Sync as soon as possible, skipping any backoff"""
+        with self._cond:
+            self._forced = True
+            self._retry_at = 0.0
+            self._next_probe = 0.0
+            self._cond.notify_all()
+
+    def status(self):
+        """
+        Describe the sync state.
+
+        Returns:
+            dict: state ('starting', 'idle', 'waiting', 'syncing', 'offline',
+                  'retrying' or 'stopped'), reachable, last_success and
+                  last_attempt (datetimes or None), last_error, failures,
+                  retry_in (seconds, or None), pending (local operations
+                  not yet synced, or None if unknown) and last_stats
+        """
+        with self._cond:
+            retry_in = self._retry_at - time.monotonic() if self._state == 'retrying' else None
+            status = {
+                'state': self._state,
+                'reachable': self._reachable,
+                'last_success': self._last_success,
+                'last_attempt': self._last_attempt,
+                'last_error': self._last_error,
+                'failures': self._failures,
+                'retry_in': max(0.0, retry_in) if retry_in is not None else None,
+                'last_stats': self._last_stats,
+            }
+
+        status['pending'] = None
+        if self._pending is not None:
+            try:
+                status['pending'] = self._pending()
+            except Exception as e:
+                print(f"Error counting pending changes: {str(e)}")
+        return status
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = time.monotonic()
+                    if now >= self._next_probe or self._sync_due(now):
+                        break
+                    self._cond.wait(self._wait_time(now))
+                if self._stopping:
+                    self._state = 'stopped'
+                    return
+
+            now = time.monotonic()
+            if now >= self._next_probe:
+                self._probe(now)
+
+            with self._cond:
+                due = self._sync_due(time.monotonic())
+                changes = self._changes
+            if due:
+                self._attempt(changes)
+
+    def _probe(self, now):
+        try:
+            reachable = bool(self._is_reachable())
+        except Exception:
+            reachable = False
+
+        with self._cond:
+            came_back = reachable and not self._reachable
+            self._reachable = reachable
+            self._next_probe = now + self.probe_interval
+            if came_back:
+                # Replay whatever queued up while the share was away, without waiting out a backoff
+                self._forced = True
+                self._retry_at = 0.0
+            if not reachable:
+                self._state = 'offline'
+            elif self._state in ('starting', 'offline'):
+                self._state = 'idle'
+
+    def _sync_due(self, now):
+        """Whether a sync should run now (called with _cond held)"""
+        if not self._reachable or now < self._retry_at:
+            return False
+        if self._forced or now >= self._next_periodic:
+            return True
+        return self._changes != self._synced_changes and now - self._last_change >= self.debounce
+
+    def _wait_time(self, now):
+        """Seconds until the next probe or sync could be due (called with _cond held)"""
+        deadlines = [self._next_probe]
+        if self._reachable:
+            deadlines.append(max(self._retry_at, self._next_periodic))
+            if self._changes != self._synced_changes:
+                deadlines.append(max(self._retry_at, self._last_change + self.debounce))
+        return max(0.05, min(deadlines) - now)
+
+    def _attempt(self, changes):
+        with self._cond:
+            self._forced = False
+            self._state = 'syncing'
+            self._last_attempt = datetime.now()
+
+        try:
+            stats = self._sync()
+        except Exception as e:
+            print(f"Sync error: {str(e)}")
+            with self._cond:
+                self._failures += 1
+                delay = min(self.max_backoff, self.retry_delay * 2 ** (self._failures - 1))
+                self._retry_at = time.monotonic() + delay
+                self._last_error = str(e)
+                self._state = 'retrying'
+                self._forced = True  # Whatever made this sync due still needs it
+                # A failure often means the share went away; check again before retrying
+                self._next_probe = min(self._next_probe, self._retry_at)
+            return
+
+        with self._cond:
+            now = time.monotonic()
+            self._failures = 0
+            self._retry_at = 0.0
+            self._last_error = None
+            self._last_success = datetime.now()
+            self._last_stats = stats
+            self._synced_changes = changes
+            self._next_periodic = now + self.max_interval
+            self._state = 'idle' if self._changes == changes else 'waiting'
+
+
+def describe_sync_status(status):
+    """Short text and colour for the status bar, e.g. ("Synced 14:02 - 3 changes pending", "orange")"""
+    pending = status.get('pending')
+    pending_text = f" - {pending} change{'s' if pending != 1 else ''} pending" if pending else ""
+    last = status['last_success'].strftime("%H:%M") if status['last_success'] else None
+
+    if status['state'] == 'offline':
+        return f"Network share unavailable - working locally{pending_text}", "orange"
+    if status['state'] == 'retrying':
+        retry = f", retrying in {int(status['retry_in'])}s" if status['retry_in'] is not None else ""
+        return f"Sync failed: {status['last_error']}{retry}{pending_text}", "red"
+    if status['state'] == 'syncing':
+        return f"Syncing...{pending_text}", "gray"
+    if status['state'] in ('starting', 'stopped'):
+        return f"Sync {status['state']}{pending_text}", "gray"
+    if last is None:
+        return f"Connected to network share{pending_text}", "green"
+    return f"Synced {last}{pending_text}", "green" if not pending else "orange"
@@ -0,0 +1,159 @@
+import queue
+import tkinter
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundExecutor:
+    """
+    Run data calls on worker threads and hand their results back to the Tk thread.
+
+    Tk is not thread-safe, so workers never touch widgets: finished calls
+    are queued, and a poll scheduled with after() runs their callbacks on
+    the Tk thread. The poll only runs while calls are in flight.
+
+    Submitting with a key supersedes the call still pending under that key
+    (a new search replacing the one before it): it is cancelled if it has
+    not started, and its result is dropped if it has. Callbacks are also
+    dropped when the owner widget has been destroyed in the meantime.
+
+    Args:
+        root: Tk widget whose after() drives the polling
+        max_workers (int): Worker threads (each gets its own pooled database connection)
+        poll_ms (int): Milliseconds between polls while calls are in flight
+        on_busy (callable): on_busy(count), on the Tk thread, whenever the
+            number of calls in flight changes
+    """
+
+    def __init__(self, root, max_workers=2, poll_ms=30, on_busy=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.on_busy = on_busy
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ui-worker")
+        self._finished = queue.Queue()
+        self._tasks = {}  # Future -> task dict, until its callbacks have run
+        self._latest = {}  # key -> the Future currently submitted under it
+        self._poll_id = None
+        self._busy = 0
+        self._closed = False
+
+    def submit(self, fn, *args, key=None, owner=None, on_done=None, on_error=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on a worker thread (call from the Tk thread).
+
+        Args:
+            key (str): Supersede the pending call submitted with the same key
+            owner: Widget the callbacks belong to; skipped once it is destroyed
+            on_done (callable): on_done(result) on the Tk thread
+            on_error (callable): on_error(exception) on the Tk thread
+                (otherwise the error is printed)
+
+        Returns:
+            Future: The submitted call
+        """
+        if self._closed:
+            return None
+
+        if key is not None:
+            self.cancel(key)
+
+        future = self._pool.submit(fn, *args, **kwargs)
+        self._tasks[future] = {
+            'key': key,
+            'owner': owner,
+            'on_done': on_done,
+            'on_error': on_error,
+            'stale': False,
+        }
+        if key is not None:
+            self._latest[key] = future
+        # Runs on the worker thread (or here, if already done): only queue it
+        future.add_done_callback(self._finished.put)
+
+        self._update_busy()
+        self._schedule_poll()
+        return future
+
+    def cancel(self, key):
+        """Cancel the pending call submitted under key, or drop its result if it is running"""
+        future = self._latest.pop(key, None)
+        if future is None or future not in self._tasks:
+            return
+        self._tasks[future]['stale'] = True
+        future.cancel()
+        self._update_busy()
+
+    def is_busy(self, key=None):
+        """Whether any call (or the call under key) is still in flight"""
+        if key is not None:
+            return key in self._latest
+        return self._busy > 0
+
+    def shutdown(self):
+        """Cancel queued calls and stop polling; running calls finish with their results dropped"""
+        self._closed = True
+        for task in self._tasks.values():
+            task['stale'] = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._poll_id is not None:
+            try:
+                self.root.after_cancel(self._poll_id)
+            except tkinter.TclError:
+                pass
+            self._poll_id = None
+
+    def _schedule_poll(self):
+        if self._poll_id is None and not self._closed:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                future = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(future)
+
+        if self._tasks:
+            self._schedule_poll()
+
+    def _deliver(self, future):
+        task = self._tasks.pop(future, None)
+        if task is None:
+            return
+        if task['key'] is not None and self._latest.get(task['key']) is future:
+            del self._latest[task['key']]
+        self._update_busy()
+
+        if task['stale'] or future.cancelled() or self._closed:
+            return
+        owner = task['owner']
+        if owner is not None:
+            try:
+                if not owner.winfo_exists():
+                    return
+            except tkinter.TclError:
+                return
+
+        error = future.exception()
+        try:
+            if error is not None:
+                if task['on_error'] is not None:
+                    task['on_error'](error)
+                else:
+                    print(f"Error in background task: {str(error)}")
+            elif task['on_done'] is not None:
+                task['on_done'](future.result())
+        except Exception as e:
+            print(f"Error in background task callback: {str(e)}")
+
+    def _update_busy(self):
+        busy = sum(1 for task in self._tasks.values() if not task['stale'])
+        if busy != self._busy:
+            self._busy = busy
+            if self.on_busy is not None:
+                try:
+                    self.on_busy(busy)
+                except Exception as e:
+                    print(f"Error showing busy state: {str(e)}")